@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class AgentRegistry:
+    """Creates agents on first use and tracks per-agent readiness.
+
+    Factories import their heavy modules (chromadb, googleapiclient, ollama, ...)
+    only when called, so constructing the registry is cheap. An agent whose
+    factory raises stays unavailable (get() returns None), like the eager
+    try/except wiring it replaces.
+    """
+
+    def __init__(self):
+        self.factories = {}
+        self.agents = {}
+        self.states = {}
+        self.locks = {}
+        self.labels = {}
+        self.warm_thread = None
+
+    def register(self, name, factory, label=None):
+        self.factories[name] = factory
+        self.labels[name] = label or name.capitalize()
+        self.locks[name] = threading.Lock()
+        self.states[name] = {"status": "pending"}
+
+    def get(self, name):
+        """Return the agent, creating it on first use (None if its creation failed)"""
+        if self.states[name]["status"] in ("ready", "failed"):
+            return self.agents.get(name)
+
+        with self.locks[name]:
+            if self.states[name]["status"] == "pending":
+                self._create(name)
+        return self.agents.get(name)
+
+    def peek(self, name):
+        """Return the agent only if it already exists; never triggers creation"""
+        return self.agents.get(name)
+
+    def set(self, name, agent):
+        """Install an already-built agent (or None to disable it)"""
+        with self.locks[name]:
+            self.agents[name] = agent
+            self.states[name] = {"status": "ready" if agent is not None else "failed", "error": None}
+
+    def _create(self, name):
+        self.states[name] = {"status": "initializing"}
+        start = time.perf_counter()
+        try:
+            agent = self.factories[name]()
+        except Exception as e:
+            print(f"✗ {self.labels[name]} agent failed: {e}")
+            self.agents[name] = None
+            self.states[name] = {"status": "failed", "error": str(e),
+                                 "init_ms": round((time.perf_counter() - start) * 1000, 1)}
+            return
+        self.agents[name] = agent
+        self.states[name] = {"status": "ready", "init_ms": round((time.perf_counter() - start) * 1000, 1)}
+        print(f"✓ {self.labels[name]} agent initialized")
+
+    def ready(self):
+        return all(state["status"] in ("ready", "failed") for state in self.states.values())
+
+    def status(self):
+        return {name: dict(state) for name, state in self.states.items()}
+
+    def warm_up(self, names=None, background=True):
+        """Create agents ahead of their first request, by default on a daemon thread"""
+        names = list(names or self.factories)
+        if not background:
+            for name in names:
+                self.get(name)
+            return None
+        if self.warm_thread is None:
+            self.warm_thread = threading.Thread(target=self.warm_up, args=(names, False),
+                                                name="agent-warmup", daemon=True)
+            self.warm_thread.start()
+        return self.warm_thread
@@ -0,0 +1,62 @@
+import os
+import re
+
+# Word pieces and single punctuation marks, a close stand-in for model tokens
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = {".", "!", "?"}
+
+
+def chunk_text(text: str, chunk_tokens=None, overlap=None):
+    """Split text into windows of about chunk_tokens tokens that overlap by overlap tokens.
+
+    Windows end on a sentence boundary when one falls in their last quarter, and
+    each chunk is sliced from the original text so whitespace and casing survive.
+    """
+    chunk_tokens = int(chunk_tokens or os.getenv("CHUNK_TOKENS", "256"))
+    overlap = int(overlap if overlap is not None else os.getenv("CHUNK_OVERLAP", "32"))
+    overlap = min(overlap, chunk_tokens // 2)
+
+    spans = [m.span() for m in _TOKEN.finditer(text)]
+    if not spans:
+        return []
+    if len(spans) <= chunk_tokens:
+        return [text[spans[0][0]:spans[-1][1]]]
+
+    chunks = []
+    start = 0
+    while start < len(spans):
+        end = min(start + chunk_tokens, len(spans))
+        if end < len(spans):
+            for i in range(end - 1, end - 1 - chunk_tokens // 4, -1):
+                if text[spans[i][0]:spans[i][1]] in _SENTENCE_END:
+                    end = i + 1
+                    break
+        chunks.append(text[spans[start][0]:spans[end - 1][1]])
+        if end >= len(spans):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def chunk_document(doc, chunk_tokens=None, overlap=None):
+    """Split an embedding doc into chunk docs linked to it by parent_id/chunk_index metadata"""
+    metadata = doc["metadata"]
+    title = metadata.get("title") or ""
+    body = doc["text"]
+    # The title is prepended to every chunk, so strip it from the body once
+    if title and body.startswith(title):
+        body = body[len(title):]
+
+    pieces = chunk_text(body, chunk_tokens, overlap) or [""]
+    chunks = [
+        {
+            "id": f"{doc['id']}#{i}",
+            "text": f"{title}\n{piece}".strip(),
+            "metadata": dict(metadata, parent_id=doc["id"], chunk_index=i, chunk_count=len(pieces))
+        }
+        for i, piece in enumerate(pieces)
+    ]
+    if doc.get("text_missing"):
+        for chunk in chunks:
+            chunk["text_missing"] = True
+    return chunks
@@ -1,50 +1,705 @@
 import chromadb
 from chromadb.config import Settings
+from chromadb.api.client import SharedSystemClient
 import numpy as np
-import ollama  # <-- use Ollama client
 import os
+import json
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embedding_cache import EmbeddingCache
+from resource_ids import content_hash, resource_id_for_metadata, is_stable_id
+from vector_index import VectorIndex
+from lru import LRUCache
+from lexical_index import LexicalIndex, is_keyword_query
+from embedding_backends import create_backend, collection_name
+from metrics import timed, span, count
+
+# Model that wrote the original, un-namespaced "resources" collection
+LEGACY_BACKEND = "ollama"
+LEGACY_MODEL = "llama3:instruct"
+LEGACY_DIM = 4096
+
+# New collections rank by cosine distance; Chroma's default (and older collections) is squared L2
+DISTANCE_SPACE = "cosine"
+
+# Bookkeeping fields kept on every row but not returned with search results
+INTERNAL_METADATA = ("parent_id", "chunk_count", "content_hash", "last_seen", "last_hit", "hit_count")
 
 class EmbeddingAgent:
-    def __init__(self, model_name="llama3:instruct"):
-        # Store Ollama model name (e.g., "llama2", "mistral", "nomic-embed-text")
-        self.model_name = model_name  
+    def __init__(self, model_name="llama3:instruct", persist_directory=None, batch_size=None, max_workers=None,
+                 cache=None, backend=None, sync_indexes=True):
+        # Texts that were embedded before (by this model) are served from the cache
+        self.cache = cache or EmbeddingCache()
+
+        # Texts are embedded in chunks of batch_size, spread over a small worker pool
+        self.batch_size = int(batch_size or os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(max_workers or os.getenv("EMBEDDING_MAX_WORKERS", "4")),
+            thread_name_prefix="embedding"
+        )
+
+        # Two-level search memo: query text -> embedding, and (embedding, n, filter, version) -> result.
+        # version is bumped on every write, so cached results never outlive a change to the collection.
+        self.query_embeddings = LRUCache(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+        self.search_results = LRUCache(os.getenv("SEARCH_RESULT_CACHE_SIZE", "1024"))
+        self.version = 0
+        # With several server processes only the writer changes the store and publishes a generation
+        # counter (None = this process is the only writer). Chroma keeps the vector index in process
+        # memory, so readers reopen the collection when the generation moves, at most every
+        # CHROMA_REFRESH_SECONDS.
+        self.store_generation = None
+        self.seen_generation = None
+        self.refresh_interval = float(os.getenv("CHROMA_REFRESH_SECONDS", "2"))
+        self.refreshed_at = 0.0
+        self.refresh_lock = threading.Lock()
+        # Readers must not rebuild the shared on-disk indexes while the writer is updating them
+        self.sync_indexes = sync_indexes
+
+        # Search over-fetches this many chunks per requested result before grouping by parent
+        self.chunk_fanout = int(os.getenv("SEARCH_CHUNK_FANOUT", "8"))
+
+        # Search hits per parent id since the last flush: {parent_id: [count, last hit time]}.
+        # apply_hits() writes them into the rows' hit_count/last_hit metadata, which retention reads;
+        # they are only tracked when a retention policy is set (track_hits).
+        self.track_hits = False
+        self.hits = {}
+        self.hits_lock = threading.Lock()
+        # Rows whose resource is fetched again unchanged get last_seen refreshed at most this often
+        self.touch_interval = float(os.getenv("RETENTION_TOUCH_SECONDS", "3600"))
+
+        self.search_mode = os.getenv("SEARCH_MODE", "hybrid")
+        self.rrf_k = int(os.getenv("SEARCH_RRF_K", "60"))
 
         # Initialize ChromaDB
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+        self.persist_directory = persist_directory or os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+        self.client = chromadb.PersistentClient(path=self.persist_directory)
+
+        # Embedding backend: EMBEDDING_BACKEND/EMBEDDING_MODEL win, then the model a finished
+        # migration switched to, then the Ollama chat model this agent was constructed with
+        if backend is None:
+            active = self._read_active_model()
+            if os.getenv("EMBEDDING_BACKEND") or os.getenv("EMBEDDING_MODEL") or not active:
+                active = {
+                    "backend": os.getenv("EMBEDDING_BACKEND", "ollama"),
+                    "model": os.getenv("EMBEDDING_MODEL", model_name)
+                }
+            backend = create_backend(active["backend"], active["model"])
+
+        # A running re-embedding migration; add() and delete() mirror writes into its target
+        self.migration = None
+        self.switch_lock = threading.Lock()
+        self.use_collection(backend, self.open_collection(backend))
+
+    @property
+    def model_name(self):
+        return self.backend.model_name
+
+    def open_collection(self, backend):
+        """Get or create the collection for a backend's model, namespaced by model and dimension"""
+        for name in self.client.list_collections():
+            collection = self.client.get_collection(getattr(name, "name", name))
+            metadata = collection.metadata or {}
+            if metadata.get("embedding_backend") == backend.name and metadata.get("embedding_model") == backend.model_name:
+                return collection
+
+        # Vectors in the original "resources" collection came from the legacy default model; label it
+        # with the dimension of its stored vectors, so opening it never needs the model to be up
+        if (backend.name, backend.model_name) == (LEGACY_BACKEND, LEGACY_MODEL):
+            try:
+                legacy = self.client.get_collection("resources")
+            except Exception:
+                legacy = None
+            if legacy is not None and not (legacy.metadata or {}).get("embedding_model"):
+                sample = legacy.get(limit=1, include=["embeddings"])
+                dim = len(sample["embeddings"][0]) if len(sample["ids"]) else LEGACY_DIM
+                legacy.modify(metadata={"embedding_backend": backend.name, "embedding_model": backend.model_name,
+                                        "embedding_dim": dim})
+                return legacy
+
+        dim = len(self.get_embeddings(["dimension probe"], backend=backend)[0])
+        metadata = {"embedding_backend": backend.name, "embedding_model": backend.model_name, "embedding_dim": dim,
+                    "hnsw:space": DISTANCE_SPACE}
+        return self.client.get_or_create_collection(collection_name(backend, dim), metadata=metadata)
+
+    @staticmethod
+    def distance_space(collection):
+        """The collection's HNSW distance function ("l2" unless it was created with another one)"""
+        space = (collection.metadata or {}).get("hnsw:space")
+        if space is None:
+            configuration = getattr(collection, "configuration", None) or {}
+            space = (configuration.get("hnsw") or {}).get("space")
+        return space or "l2"
+
+    def use_collection(self, backend, collection):
+        """Point the agent (searches, writes and indexes) at another backend and its collection"""
+        # Optional in-process vector index that answers searches instead of collection.query
+        index = None
+        if os.getenv("VECTOR_INDEX", "0") == "1":
+            index_path = os.getenv("VECTOR_INDEX_PATH", "./cache/vector_index")
+            index = VectorIndex(os.path.join(index_path, collection.name), space=self.distance_space(collection))
+
+        # BM25 index over the same chunk texts; "hybrid" fuses it with vector hits by reciprocal rank
+        lexical = None
+        if os.getenv("LEXICAL_INDEX", "1") == "1":
+            lexical_path = os.getenv("LEXICAL_INDEX_PATH", "./cache/lexical")
+            lexical = LexicalIndex(os.path.join(lexical_path, collection.name + ".sqlite3"))
+        if self.sync_indexes:
+            self._sync_indexes(collection, index, lexical)
+
+        # Swap everything at once so searches keep hitting a consistent collection/index pair
+        with self.switch_lock:
+            self.backend = backend
+            self.collection = collection
+            self.index = index
+            self.lexical = lexical
+            self.query_embeddings.clear()
+            self.version += 1
+
+    def refresh(self, force=False):
+        """Reader processes: reopen the collection if the writer changed the store since it was opened.
+
+        If the writer finished a migration meanwhile, switch to the model and collection it now uses.
+        """
+        if self.store_generation is None:
+            return
+        generation = self.store_generation()
+        if not force and (generation == self.seen_generation
+                          or time.monotonic() - self.refreshed_at < self.refresh_interval):
+            return
+        with self.refresh_lock:
+            if not force and generation == self.seen_generation:
+                return
+            # A new client on the same path reuses the cached Chroma system (and its stale index)
+            # unless the cache is cleared; searches still running keep the old client alive
+            SharedSystemClient.clear_system_cache()
+            client = chromadb.PersistentClient(path=self.persist_directory)
+            # EMBEDDING_BACKEND/EMBEDDING_MODEL pin the model, as they do at startup
+            pinned = os.getenv("EMBEDDING_BACKEND") or os.getenv("EMBEDDING_MODEL")
+            active = None if pinned else self._read_active_model()
+            if active and (active["backend"], active["model"]) != (self.backend.name, self.backend.model_name):
+                with self.switch_lock:
+                    self.client = client
+                backend = create_backend(active["backend"], active["model"])
+                self.use_collection(backend, self.open_collection(backend))
+                print(f"✓ Switched to the {backend.name}:{backend.model_name} collection written by the index writer")
+            else:
+                collection = client.get_collection(self.collection.name)
+                with self.switch_lock:
+                    self.client = client
+                    self.collection = collection
+                    self.version += 1
+            self.seen_generation = generation
+            self.refreshed_at = time.monotonic()
+
+    def embedding_info(self):
+        """Which backend, model and collection searches currently use"""
+        metadata = self.collection.metadata or {}
+        info = {
+            "backend": self.backend.name,
+            "model": self.backend.model_name,
+            "collection": self.collection.name,
+            "dim": metadata.get("embedding_dim"),
+            "rows": self.collection.count()
+        }
+        if self.migration is not None:
+            info["migration"] = self.migration.status()
+        return info
+
+    def _active_model_path(self):
+        return os.path.join(self.persist_directory, "embedding_model.json")
+
+    def _read_active_model(self):
         try:
-            self.collection = self.client.get_collection("resources")
-        except:
-            self.collection = self.client.create_collection("resources")
-
-    def get_embeddings(self, texts):
-        """Generate embeddings using Ollama's local model"""
-        embeddings = []
-        for text in texts:
-            response = ollama.embeddings(model=self.model_name, prompt=text)
-            embeddings.append(np.array(response["embedding"]))
-        return embeddings
+            with open(self._active_model_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_active_model(self):
+        """Remember the current backend/model so the next start opens the same collection"""
+        with open(self._active_model_path(), "w") as f:
+            json.dump({"backend": self.backend.name, "model": self.backend.model_name}, f)
+
+    def get_embeddings(self, texts, batch_size=None, backend=None):
+        """Generate embeddings as one float32 matrix (one row per text), skipping the model for cached texts"""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
 
+        backend = backend or self.backend
+        cached = self.cache.get_many(backend.key, texts)
+        count("cache_requests_total", len(cached), cache="embedding", result="hit")
+        count("cache_requests_total", len(texts) - len(cached), cache="embedding", result="miss")
+        missing = list(dict.fromkeys(text for i, text in enumerate(texts) if i not in cached))
+        if missing:
+            computed = self._compute_embeddings(missing, batch_size, backend)
+            self.cache.put_many(backend.key, missing, computed)
+            by_text = dict(zip(missing, computed))
+            for i, text in enumerate(texts):
+                if i not in cached:
+                    cached[i] = by_text[text]
+
+        return np.ascontiguousarray([cached[i] for i in range(len(texts))], dtype=np.float32)
+
+    @timed("embedding.compute")
+    def _compute_embeddings(self, texts, batch_size=None, backend=None):
+        """Embed texts with the backend's model, in chunks spread over the worker pool"""
+        backend = backend or self.backend
+        batch_size = max(1, batch_size or self.batch_size)
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        if len(batches) == 1:
+            rows = list(backend.embed(batches[0]))
+        else:
+            rows = []
+            for batch_rows in self.executor.map(backend.embed, batches):
+                rows.extend(batch_rows)
+
+        return np.ascontiguousarray(rows, dtype=np.float32)
+
+    def cache_stats(self):
+        """Embedding cache and search memo hit/miss counters"""
+        return dict(
+            self.cache.stats(),
+            query_embeddings=self.query_embeddings.stats(),
+            search_results=self.search_results.stats(),
+            version=self.version
+        )
+
+    @timed("index.write")
     def add(self, docs):
+        """Upsert docs by their stable id, skipping docs whose content hash has not changed.
+
+        Every written row gets last_seen = now and keeps the hit_count/last_hit
+        of the row it replaces; unchanged rows only have last_seen refreshed.
+        Docs flagged text_missing (their PDF could not be read) are only written
+        for resources that are not stored yet.
+        """
+        # Last occurrence wins when the same resource appears twice in one batch
+        docs = list({d["id"]: d for d in docs}.values())
+        docs = self._skip_missing_text(docs)
+        if not docs:
+            return 0
+
+        for d in docs:
+            d["metadata"] = dict(d["metadata"], content_hash=content_hash(d["text"], d["metadata"]))
+
+        existing = self.collection.get(ids=[d["id"] for d in docs], include=["metadatas"])
+        stored = {doc_id: metadata or {} for doc_id, metadata in zip(existing["ids"], existing["metadatas"])}
+        now = time.time()
+        unchanged = [d["id"] for d in docs if stored.get(d["id"], {}).get("content_hash") == d["metadata"]["content_hash"]]
+        self._touch([doc_id for doc_id in unchanged if now - stored[doc_id].get("last_seen", 0) >= self.touch_interval],
+                    stored, now)
+        docs = [d for d in docs if stored.get(d["id"], {}).get("content_hash") != d["metadata"]["content_hash"]]
+        if not docs:
+            return 0
+
+        for d in docs:
+            previous = stored.get(d["id"], {})
+            d["metadata"]["last_seen"] = now
+            for key in ("hit_count", "last_hit"):
+                if key in previous:
+                    d["metadata"][key] = previous[key]
+
         texts = [d["text"] for d in docs]
         ids = [d["id"] for d in docs]
         metadatas = [d["metadata"] for d in docs]
 
-        # Generate embeddings using Ollama
+        # Generate embeddings with the active backend
         embeddings = self.get_embeddings(texts)
 
-        # Add to ChromaDB
-        self.collection.add(
+        # Upsert into ChromaDB so a repeated resource replaces its row instead of duplicating it
+        self._begin_index_writes()
+        self.collection.upsert(
             documents=texts,
             ids=ids,
             metadatas=metadatas,
-            embeddings=embeddings
+            embeddings=embeddings.tolist()
         )
+        if self.index is not None:
+            self.index.upsert(ids, embeddings, metadatas)
+        if self.lexical is not None:
+            self.lexical.upsert(ids, texts, metadatas)
+        self.version += 1
+        migration = self.migration
+        if migration is not None:
+            migration.forward(ids, texts, metadatas)
+        self._delete_stale_chunks(docs)
+        return len(docs)
 
-    def search(self, query: str, n=5):
-        # Generate embedding for the query
-        query_embedding = self.get_embeddings([query])[0]
+    def _skip_missing_text(self, docs):
+        """Drop text_missing docs of stored resources, refreshing the stored rows' last_seen instead"""
+        parents = {d["metadata"].get("parent_id", d["id"]) for d in docs if d.get("text_missing")}
+        if not parents:
+            return docs
+        rows = self.rows_for_parents(parents)
+        stored = {}
+        for doc_id, metadata in zip(rows["ids"], rows["metadatas"]):
+            metadata = metadata or {}
+            stored.setdefault(metadata.get("parent_id", doc_id), {})[doc_id] = metadata
+        now = time.time()
+        touch = {doc_id: metadata for group in stored.values() for doc_id, metadata in group.items()
+                 if now - metadata.get("last_seen", 0) >= self.touch_interval}
+        self._touch(list(touch), touch, now)
+        return [d for d in docs if not (d.get("text_missing") and d["metadata"].get("parent_id", d["id"]) in stored)]
 
-        return self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=n
-        )
+    def _touch(self, ids, stored, now):
+        """Mark unchanged rows as seen now; their content, vectors and the search memo stay valid"""
+        if ids:
+            self.collection.update(ids=ids, metadatas=[dict(stored[doc_id], last_seen=now) for doc_id in ids])
+
+    def delete(self, ids):
+        """Delete rows by id from the collection and the vector index"""
+        ids = list(ids)
+        if not ids:
+            return
+        self._begin_index_writes()
+        self.collection.delete(ids=ids)
+        if self.index is not None:
+            self.index.remove(ids)
+        if self.lexical is not None:
+            self.lexical.remove(ids)
+        self.version += 1
+        migration = self.migration
+        if migration is not None:
+            migration.forward_delete(ids)
+
+    def rows_for_parents(self, parent_ids, include=("metadatas",)):
+        """Rows of the given parent resources: their chunks, or the resource's own row if it is not chunked"""
+        parent_ids = list(parent_ids)
+        if not parent_ids:
+            return {"ids": [], "metadatas": []}
+        include = list(include)
+        chunks = self.collection.get(where={"parent_id": {"$in": parent_ids}}, include=include)
+        direct = self.collection.get(ids=parent_ids, include=include)
+        rows = {key: list(chunks[key]) for key in ["ids"] + include}
+        seen = set(rows["ids"])
+        for i, doc_id in enumerate(direct["ids"]):
+            if doc_id not in seen:
+                for key in ["ids"] + include:
+                    rows[key].append(direct[key][i])
+        return rows
+
+    def delete_parents(self, parent_ids):
+        """Delete every row of the given parent resources; returns the number of rows deleted"""
+        ids = self.rows_for_parents(parent_ids, include=())["ids"]
+        self.delete(ids)
+        return len(ids)
+
+    def record_hits(self, parent_ids):
+        """Count search results towards their resources' hit statistics"""
+        if not self.track_hits:
+            return
+        now = time.time()
+        with self.hits_lock:
+            for parent_id in parent_ids:
+                entry = self.hits.setdefault(parent_id, [0, now])
+                entry[0] += 1
+                entry[1] = now
+
+    def take_hits(self):
+        """Hits recorded since the last call, {parent_id: [count, last hit time]}"""
+        with self.hits_lock:
+            hits, self.hits = self.hits, {}
+        return hits
+
+    def apply_hits(self, hits, page_size=500):
+        """Add hits (from take_hits) to the rows' hit_count and last_hit metadata; returns rows updated"""
+        parent_ids = list(hits)
+        updated = 0
+        for start in range(0, len(parent_ids), page_size):
+            rows = self.rows_for_parents(parent_ids[start:start + page_size])
+            ids, metadatas = [], []
+            for doc_id, metadata in zip(rows["ids"], rows["metadatas"]):
+                metadata = metadata or {}
+                hit = hits.get(metadata.get("parent_id", doc_id))
+                if hit is None:
+                    continue
+                ids.append(doc_id)
+                metadatas.append(dict(metadata, hit_count=metadata.get("hit_count", 0) + hit[0],
+                                      last_hit=max(hit[1], metadata.get("last_hit", 0))))
+            if ids:
+                self.collection.update(ids=ids, metadatas=metadatas)
+                updated += len(ids)
+        return updated
+
+    def become_writer(self):
+        """Called when this process takes over the writer lock: load the current store, then stop refreshing"""
+        self.refresh(force=True)
+        self.store_generation = None
+        self.sync_indexes = True
+        self.sync_index()
+
+    def _begin_index_writes(self):
+        """Mark the indexes as behind the store until the write that follows reaches them too"""
+        for index in (self.index, self.lexical):
+            if index is not None:
+                index.begin_write()
+
+    def sync_index(self, page_size=1000):
+        """Rebuild the vector and lexical indexes from the collection if they have drifted apart"""
+        self._sync_indexes(self.collection, self.index, self.lexical, page_size)
+
+    @staticmethod
+    def _sync_indexes(collection, index, lexical, page_size=1000):
+        # An index is stale if a store write never reached it (the process died in between) or its ids differ
+        stored = set()
+        offset = 0
+        while index is not None or lexical is not None:
+            page = collection.get(include=[], limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            stored.update(page["ids"])
+            offset += len(page["ids"])
+        rebuild_vectors = index is not None and (index.pending or index.doc_ids() != stored)
+        rebuild_lexical = lexical is not None and (lexical.pending or lexical.doc_ids() != stored)
+        if not (rebuild_vectors or rebuild_lexical):
+            return
+        count = len(stored)
+
+        print(f"Rebuilding search indexes from {count} stored rows")
+        include = ["metadatas"]
+        if rebuild_vectors:
+            index.clear()
+            include.append("embeddings")
+        if rebuild_lexical:
+            lexical.clear()
+            include.append("documents")
+        offset = 0
+        while True:
+            page = collection.get(include=include, limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            if rebuild_vectors:
+                index.upsert(page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["metadatas"])
+            if rebuild_lexical:
+                lexical.upsert(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+
+    def _delete_stale_chunks(self, docs):
+        """Remove chunks past a parent's new chunk_count and the parent's pre-chunking row"""
+        chunk_counts = {
+            d["metadata"]["parent_id"]: d["metadata"]["chunk_count"]
+            for d in docs if "parent_id" in d["metadata"]
+        }
+        if not chunk_counts:
+            return
+        stale = list(chunk_counts)
+        for parent_id, chunk_count in chunk_counts.items():
+            stale += self.collection.get(
+                where={"$and": [{"parent_id": parent_id}, {"chunk_index": {"$gte": chunk_count}}]},
+                include=[]
+            )["ids"]
+        self.delete(stale)
+
+    def compact(self, dry_run=False, page_size=1000):
+        """Collapse duplicate rows (e.g. legacy uuid4 ids) onto one row per stable resource id"""
+        # stable id -> [(doc_id, last_seen, document length)]
+        groups = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas", "documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                metadata = metadata or {}
+                if "parent_id" in metadata:
+                    continue  # chunk rows already have stable ids
+                # Rows written under a stable id keep it, even if their metadata would derive another one
+                stable_id = doc_id if is_stable_id(doc_id) else resource_id_for_metadata(metadata)
+                if stable_id:
+                    groups.setdefault(stable_id, []).append((doc_id, metadata.get("last_seen", 0), len(document or "")))
+            offset += len(page["ids"])
+
+        to_move = {}
+        to_delete = []
+        for stable_id, rows in groups.items():
+            doc_ids = [doc_id for doc_id, _, _ in rows]
+            if stable_id not in doc_ids:
+                # Keep the most recently seen copy (legacy rows have no last_seen: the longest one)
+                # and re-key it under the stable id
+                keep = max(rows, key=lambda row: (row[1], row[2]))[0]
+                to_move[keep] = stable_id
+            to_delete.extend(doc_id for doc_id in doc_ids if doc_id != stable_id)
+
+        stats = {"rows": offset, "resources": len(groups), "rekeyed": len(to_move), "deleted": len(to_delete)}
+        if dry_run:
+            return stats
+
+        move_ids = list(to_move)
+        for start in range(0, len(move_ids), page_size):
+            rows = self.collection.get(
+                ids=move_ids[start:start + page_size],
+                include=["documents", "metadatas", "embeddings"]
+            )
+            metadatas = [
+                dict(metadata or {}, content_hash=content_hash(document, metadata))
+                for document, metadata in zip(rows["documents"], rows["metadatas"])
+            ]
+            self._begin_index_writes()
+            self.collection.upsert(
+                ids=[to_move[doc_id] for doc_id in rows["ids"]],
+                documents=rows["documents"],
+                metadatas=metadatas,
+                embeddings=[list(map(float, e)) for e in rows["embeddings"]]
+            )
+            if self.index is not None:
+                self.index.upsert([to_move[doc_id] for doc_id in rows["ids"]], rows["embeddings"], metadatas)
+            if self.lexical is not None:
+                self.lexical.upsert([to_move[doc_id] for doc_id in rows["ids"]], rows["documents"], metadatas)
+            self.version += 1
+        for start in range(0, len(to_delete), page_size):
+            self.delete(to_delete[start:start + page_size])
+        return stats
+
+    def search(self, query: str, n=5, where=None, mode=None):
+        """Return the n best parent resources, ranked by their best-matching chunk.
+
+        mode is "vector", "keyword" or "hybrid" (reciprocal rank fusion of both).
+        Hybrid searches that look like exact-term queries run keyword-only and
+        never call the embedding model.
+        """
+        mode = mode or self.search_mode
+        if self.lexical is None or not self._lexical_filter_ok(where):
+            mode = "vector"
+        elif mode == "hybrid" and is_keyword_query(query):
+            mode = "keyword"
+
+        with span("search.semantic", mode=mode):
+            result = self._search(query, n, where, mode)
+        self.record_hits(result["ids"][0])
+        return result
+
+    def _search(self, query, n, where, mode):
+        self.refresh()
+        filter_key = json.dumps(where, sort_keys=True) if where else None
+        version = self.version
+        if mode == "keyword":
+            result_key = ("keyword", query, n, filter_key, version)
+            result = self.search_results.get(result_key)
+            if result is None:
+                result = self._search_keyword(query, n, where)
+                self.search_results.put(result_key, result)
+            return result
+
+        # Generate embedding for the query (memoized by query text)
+        query_embedding = self.query_embeddings.get(query)
+        if query_embedding is None:
+            query_embedding = self.get_embeddings([query])[0]
+            self.query_embeddings.put(query, query_embedding)
+
+        result_key = (mode, hashlib.sha1(query_embedding.tobytes()).hexdigest(), n, filter_key, version)
+        if mode == "hybrid":
+            result_key += (query,)
+        result = self.search_results.get(result_key)
+        if result is None:
+            if mode == "hybrid":
+                result = self._fuse(
+                    [self._search_embedding(query_embedding, n * 2, where), self._search_keyword(query, n * 2, where)], n
+                )
+            else:
+                result = self._search_embedding(query_embedding, n, where)
+            self.search_results.put(result_key, result)
+        return result
+
+    @staticmethod
+    def _lexical_filter_ok(where):
+        """The lexical index can only filter on resource type"""
+        return not where or (list(where) == ["type"] and not isinstance(where["type"], dict))
+
+    def _search_keyword(self, query, n, where=None):
+        """BM25 search over chunk texts, grouped by parent like the vector path"""
+        hits = self.lexical.search(query, n * self.chunk_fanout, (where or {}).get("type"))
+        ids = [doc_id for doc_id, _ in hits]
+        rows = {"ids": [], "documents": [], "metadatas": []}
+        if ids:
+            rows = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        found = {doc_id: (document, metadata) for doc_id, document, metadata in
+                 zip(rows["ids"], rows["documents"], rows["metadatas"])}
+        hits = [(doc_id, score) for doc_id, score in hits if doc_id in found]
+        return self._group_by_parent({
+            "ids": [[doc_id for doc_id, _ in hits]],
+            "documents": [[found[doc_id][0] for doc_id, _ in hits]],
+            "metadatas": [[found[doc_id][1] for doc_id, _ in hits]],
+            "distances": [[score for _, score in hits]]
+        }, n)
+
+    def _fuse(self, results, n):
+        """Reciprocal rank fusion of grouped result lists; each parent keeps its first-seen document"""
+        fused = {}
+        for result in results:
+            for rank, (parent_id, document, metadata) in enumerate(
+                zip(result["ids"][0], result["documents"][0], result["metadatas"][0])
+            ):
+                entry = fused.setdefault(parent_id, {"score": 0.0, "document": document, "metadata": metadata})
+                entry["score"] += 1.0 / (self.rrf_k + rank + 1)
+
+        ranked = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)[:n]
+        return {
+            "ids": [[parent_id for parent_id, _ in ranked]],
+            "documents": [[entry["document"] for _, entry in ranked]],
+            "metadatas": [[entry["metadata"] for _, entry in ranked]],
+            # Lower is better, like Chroma distances
+            "distances": [[-entry["score"] for _, entry in ranked]]
+        }
+
+    def _search_embedding(self, query_embedding, n, where=None):
+        # Over-fetch chunks so that n distinct parents survive grouping
+        if self.index is not None:
+            chunks = self._query_index(query_embedding, n * self.chunk_fanout, where)
+        else:
+            count = self.collection.count()
+            if count == 0:
+                return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+            chunks = self.collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=min(count, n * self.chunk_fanout),
+                where=where
+            )
+        return self._group_by_parent(chunks, n)
+
+    def _query_index(self, query_embedding, k, where=None):
+        """Top-k from the in-process index, shaped like a collection.query result"""
+        hits = self.index.search(query_embedding, k, where)
+        ids = [doc_id for doc_id, _, _ in hits]
+        documents = {}
+        if ids:
+            rows = self.collection.get(ids=ids, include=["documents"])
+            documents = dict(zip(rows["ids"], rows["documents"]))
+        return {
+            "ids": [ids],
+            "documents": [[documents.get(doc_id, "") for doc_id in ids]],
+            "metadatas": [[metadata for _, _, metadata in hits]],
+            "distances": [[distance for _, distance, _ in hits]]
+        }
+
+    @staticmethod
+    def _group_by_parent(chunks, n):
+        """Collapse chunk hits onto their parent resource, keeping each parent's best chunk"""
+        parents = {}
+        for doc_id, document, metadata, distance in zip(
+            chunks["ids"][0], chunks["documents"][0], chunks["metadatas"][0], chunks["distances"][0]
+        ):
+            metadata = metadata or {}
+            parent_id = metadata.get("parent_id", doc_id)
+            best = parents.get(parent_id)
+            if best is None:
+                parents[parent_id] = best = {"distance": distance, "document": document, "metadata": metadata, "hits": 0}
+            elif distance < best["distance"]:
+                best.update(distance=distance, document=document, metadata=metadata)
+            best["hits"] += 1
+
+        ranked = sorted(parents.items(), key=lambda item: item[1]["distance"])[:n]
+        metadatas = []
+        for _, best in ranked:
+            metadata = {k: v for k, v in best["metadata"].items() if k not in INTERNAL_METADATA}
+            metadata["matched_chunks"] = best["hits"]
+            metadatas.append(metadata)
+        return {
+            "ids": [[parent_id for parent_id, _ in ranked]],
+            "documents": [[best["document"] for _, best in ranked]],
+            "metadatas": [metadatas],
+            "distances": [[best["distance"] for _, best in ranked]]
+        }
@@ -0,0 +1,66 @@
+import re
+import threading
+
+import ollama
+
+class OllamaBackend:
+    """Embeddings from a model served by the local Ollama daemon"""
+
+    name = "ollama"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def key(self):
+        # Plain model name, so caches written before backends existed stay valid
+        return self.model_name
+
+    def embed(self, texts):
+        """Embed a list of texts, using Ollama's batch endpoint when the client has it"""
+        if hasattr(ollama, "embed"):
+            return ollama.embed(model=self.model_name, input=texts)["embeddings"]
+        return [ollama.embeddings(model=self.model_name, prompt=text)["embedding"] for text in texts]
+
+
+class SentenceTransformerBackend:
+    """Embeddings from a local sentence-transformers model (e.g. all-MiniLM-L6-v2)"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.lock = threading.Lock()
+
+    @property
+    def key(self):
+        return f"{self.name}:{self.model_name}"
+
+    def embed(self, texts):
+        # The model already batches internally; one encode call at a time keeps memory flat
+        with self.lock:
+            return self.model.encode(list(texts), batch_size=len(texts), convert_to_numpy=True,
+                                     normalize_embeddings=True)
+
+
+BACKENDS = {
+    OllamaBackend.name: OllamaBackend,
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    "st": SentenceTransformerBackend
+}
+
+
+def create_backend(name: str, model_name: str):
+    try:
+        return BACKENDS[name](model_name)
+    except KeyError:
+        raise ValueError(f"Unknown embedding backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+
+
+def collection_name(backend, dim: int) -> str:
+    """Chroma collection namespace for a backend/model/dimension, e.g. resources__ollama-nomic-embed-text__768"""
+    slug = re.sub(r"[^a-zA-Z0-9]+", "-", f"{backend.name}-{backend.model_name}").strip("-").lower()
+    return f"resources__{slug[:40].strip('-')}__{dim}"
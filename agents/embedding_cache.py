@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from lru import LRUCache
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: an in-memory LRU in front of a size-limited SQLite table.
+
+    Entries are keyed by sha256(model_name, text), so the same text embedded by
+    the same model is only ever sent to the model once.
+    """
+
+    def __init__(self, path=None, max_entries=None, memory_entries=None):
+        if path is None:
+            path = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3")
+        path = path or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.max_entries = int(max_entries or os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+        self.memory = LRUCache(memory_entries or os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "2048"))
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, texts):
+        """Return {index: vector} for every text that is already cached"""
+        found = {}
+        disk_lookups = {}
+        for i, text in enumerate(texts):
+            key = self.key(model_name, text)
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[i] = vector
+            else:
+                disk_lookups.setdefault(key, []).append(i)
+
+        if disk_lookups:
+            rows = self._load(list(disk_lookups))
+            for key, vector in rows.items():
+                self.memory.put(key, vector)
+                for i in disk_lookups[key]:
+                    found[i] = vector
+
+        with self.lock:
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, model_name: str, texts, vectors):
+        """Store one vector per text"""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            key = self.key(model_name, text)
+            self.memory.put(key, vector)
+            rows.append((key, vector.shape[0], vector.tobytes(), now))
+
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _load(self, keys):
+        vectors = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, dim, blob in self.conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ):
+                    vectors[key] = np.frombuffer(blob, dtype=np.float32, count=dim)
+            if vectors:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in vectors]
+                )
+                self.conn.commit()
+        return vectors
+
+    def _evict(self):
+        """Drop the least recently used rows once the table is over its size limit"""
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self.lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "memory": self.memory.stats()
+        }
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+
+
+class EmbeddingMigration:
+    """Re-embed an agent's collection with another backend/model in resumable batches.
+
+    Searches keep using the source collection until every row has been copied;
+    writes made meanwhile are mirrored into the target by EmbeddingAgent.add/delete,
+    so it must run in the process that writes the store. on_switch is called once
+    the agent uses the target (e.g. to make other processes reopen the store).
+    """
+
+    def __init__(self, agent, backend, batch_size=None, checkpoint_path=None, on_switch=None):
+        self.agent = agent
+        self.backend = backend
+        self.on_switch = on_switch
+        self.batch_size = int(batch_size or os.getenv("MIGRATION_BATCH_SIZE", "64"))
+        self.source = agent.collection
+        self.target = agent.open_collection(backend)
+        if self.target.name == self.source.name:
+            raise ValueError(f"Collection '{self.source.name}' already uses {backend.name}:{backend.model_name}")
+
+        self.checkpoint_path = checkpoint_path or os.path.join(
+            agent.persist_directory, "migrations", f"{self.source.name}__{self.target.name}.json"
+        )
+        self.state = self._load_checkpoint()
+        self.thread = None
+        self.error = None
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                state = json.load(f)
+            print(f"Resuming migration {self.source.name} -> {self.target.name} at row {state['offset']}")
+            return state
+        except (OSError, ValueError):
+            return {"source": self.source.name, "target": self.target.name, "offset": 0, "copied": 0,
+                    "done": False, "started_at": time.time()}
+
+    def _save_checkpoint(self):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def start(self, switch=True):
+        """Run the migration on a daemon thread"""
+        self.thread = threading.Thread(target=self.run, args=(switch,), name="embedding-migration", daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self, switch=True):
+        """Copy every source row into the target collection, then optionally switch the agent over"""
+        self.agent.migration = self
+        try:
+            while not self.state["done"]:
+                page = self.source.get(include=["documents", "metadatas"], limit=self.batch_size,
+                                       offset=self.state["offset"])
+                if not page["ids"]:
+                    break
+                self._copy(page["ids"], page["documents"], page["metadatas"])
+                self.state["offset"] += len(page["ids"])
+                self.state["copied"] += len(page["ids"])
+                self._save_checkpoint()
+
+            # Offsets shift when rows are deleted mid-migration, so reconcile ids before finishing
+            self._reconcile()
+            self.state.update(done=True, finished_at=time.time())
+            self._save_checkpoint()
+            if switch:
+                self.agent.use_collection(self.backend, self.target)
+                self.agent.save_active_model()
+                if self.on_switch is not None:
+                    self.on_switch()
+            print(f"✓ Migrated {self.source.name} -> {self.target.name} ({self.target.count()} rows)")
+        except Exception as e:
+            self.error = str(e)
+            print(f"✗ Embedding migration stopped at row {self.state['offset']}: {e}")
+            if self.thread is None:
+                raise
+        finally:
+            self.agent.migration = None
+        return self.status()
+
+    def forward(self, ids, documents, metadatas):
+        """Mirror rows written to the source while the migration runs"""
+        try:
+            self._copy(ids, documents, metadatas)
+        except Exception as e:
+            print(f"✗ Could not mirror {len(ids)} rows into {self.target.name}: {e}")
+
+    def forward_delete(self, ids):
+        try:
+            self.target.delete(ids=list(ids))
+        except Exception as e:
+            print(f"✗ Could not mirror deletes into {self.target.name}: {e}")
+
+    def _copy(self, ids, documents, metadatas):
+        embeddings = self.agent.get_embeddings(documents, backend=self.backend)
+        self.target.upsert(ids=list(ids), documents=list(documents), metadatas=list(metadatas),
+                           embeddings=embeddings.tolist())
+
+    def _hashes(self, collection):
+        """{id: content_hash} of every row"""
+        hashes = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=1000, offset=offset)
+            if not page["ids"]:
+                return hashes
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                hashes[doc_id] = (metadata or {}).get("content_hash")
+            offset += len(page["ids"])
+
+    def _reconcile(self):
+        """Copy rows missing from the target or whose content changed, and drop rows the source no longer has"""
+        source = self._hashes(self.source)
+        target = self._hashes(self.target)
+        source_ids, target_ids = set(source), set(target)
+        missing = [doc_id for doc_id in source if doc_id not in target or target[doc_id] != source[doc_id]]
+        for start in range(0, len(missing), self.batch_size):
+            rows = self.source.get(ids=missing[start:start + self.batch_size], include=["documents", "metadatas"])
+            self._copy(rows["ids"], rows["documents"], rows["metadatas"])
+            self.state["copied"] += len(rows["ids"])
+        extra = list(target_ids - source_ids)
+        for start in range(0, len(extra), 1000):
+            self.target.delete(ids=extra[start:start + 1000])
+
+    def status(self):
+        return dict(
+            self.state,
+            backend=self.backend.name,
+            model=self.backend.model_name,
+            running=self.thread is not None and self.thread.is_alive(),
+            error=self.error,
+            source_rows=self.source.count(),
+            target_rows=self.target.count()
+        )
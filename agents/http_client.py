@@ -0,0 +1,265 @@
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lru import LRUCache
+from metrics import span
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide HttpClient shared by all agents"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def _release_on_close(response, limit):
+    """Release limit once, when the response is closed (or garbage collected unclosed)"""
+    released = threading.Event()
+
+    def release():
+        if not released.is_set():
+            released.set()
+            limit.release()
+
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            release()
+
+    response.close = close_and_release
+    weakref.finalize(response, release)
+
+
+class HostMetrics:
+    """Request, error and latency counters for one upstream host"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.not_modified = 0
+        self.statuses = {}
+        self.latency_total = 0.0
+        self.latencies = deque(maxlen=1024)
+
+    def observe(self, status, latency, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.latency_total += latency
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def count(self, name):
+        """Increment the retries or not_modified counter"""
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self.lock:
+            ordered = sorted(self.latencies)
+            counts = (self.requests, self.errors, self.retries, self.not_modified, dict(self.statuses),
+                      self.latency_total)
+        requests_total, errors, retries, not_modified, statuses, latency_total = counts
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4) if ordered else 0.0
+
+        return {
+            "requests": requests_total,
+            "errors": errors,
+            "retries": retries,
+            "not_modified": not_modified,
+            "statuses": {str(k): v for k, v in statuses.items()},
+            "latency_avg": round(latency_total / requests_total, 4) if requests_total else 0.0,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99)
+        }
+
+
+class HttpClient:
+    """Connection-pooled HTTP client for the upstream agents.
+
+    One keep-alive requests.Session is shared across threads. Each host gets a
+    concurrency limit (a streamed response holds its slot until closed), 429/5xx and connection failures are retried with jittered
+    exponential backoff (honouring Retry-After) while the request's timeout has
+    not run out in total, and GETs made with revalidate=True are replayed from an
+    ETag/Last-Modified cache on 304. Read timeouts are not retried.
+    """
+
+    def __init__(self, pool_size=None, per_host_limit=None, retries=None, backoff=None, max_backoff=None,
+                 connect_timeout=None, revalidation_entries=None):
+        pool_size = int(pool_size or os.getenv("HTTP_POOL_SIZE", "32"))
+        self.per_host_limit = int(per_host_limit or os.getenv("HTTP_PER_HOST_LIMIT", "4"))
+        self.retries = int(retries if retries is not None else os.getenv("HTTP_RETRIES", "3"))
+        self.backoff = float(backoff or os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+        self.max_backoff = float(max_backoff or os.getenv("HTTP_MAX_BACKOFF_SECONDS", "8"))
+        self.connect_timeout = float(connect_timeout or os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.revalidation = LRUCache(revalidation_entries or os.getenv("HTTP_REVALIDATION_ENTRIES", "1024"))
+        self.lock = threading.Lock()
+        self.host_limits = {}
+        self.host_metrics = {}
+
+    def get(self, url: str, params=None, headers=None, timeout=20, stream=False, revalidate=False):
+        """GET with pooling, per-host limits and retries; returns a requests.Response"""
+        headers = dict(headers or {})
+        cache_key = requests.Request("GET", url, params=params).prepare().url if revalidate else None
+        cached = self.revalidation.get(cache_key) if revalidate else None
+        if cached:
+            if cached["etag"]:
+                headers.setdefault("If-None-Match", cached["etag"])
+            if cached["last_modified"]:
+                headers.setdefault("If-Modified-Since", cached["last_modified"])
+
+        with span("http.get", host=urlsplit(url).netloc):
+            response = self._request(url, params, headers, timeout, stream)
+
+        if cached and response.status_code == 304:
+            self._metrics(url).count("not_modified")
+            return self._replay(cached, response)
+        if revalidate and response.status_code == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.revalidation.put(cache_key, {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "content": response.content,
+                    "headers": dict(response.headers),
+                    "encoding": response.encoding
+                })
+        return response
+
+    def stats(self):
+        """Per-host request, error and latency metrics"""
+        with self.lock:
+            hosts = dict(self.host_metrics)
+        return {host: metrics.snapshot() for host, metrics in hosts.items()}
+
+    def _request(self, url, params, headers, timeout, stream):
+        host = urlsplit(url).netloc
+        metrics = self._metrics(url)
+        limit = self._limit(host)
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        # The timeout bounds all attempts together: no retry starts once it has run out
+        deadline = time.monotonic() + read_timeout
+
+        attempt = 0
+        while True:
+            # Waiting for a host slot counts against the same deadline as the request itself
+            if not limit.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                metrics.observe("error", 0.0, error=True)
+                raise requests.Timeout(f"no free {host} connection slot before the timeout")
+            start = time.perf_counter()
+            remaining = max(0.1, deadline - time.monotonic())
+            try:
+                response = self._send(limit, url, params, headers, stream, remaining)
+            except requests.ReadTimeout:
+                # The host accepted the request and is slow; another full wait would only add latency
+                metrics.observe("error", time.perf_counter() - start, error=True)
+                raise
+            except requests.ConnectionError as e:
+                metrics.observe("error", time.perf_counter() - start, error=True)
+                if attempt >= self.retries or not self._sleep(attempt, None, deadline):
+                    raise
+                print(f"{host} request failed ({e.__class__.__name__}), retrying")
+                attempt += 1
+                metrics.count("retries")
+                continue
+
+            metrics.observe(response.status_code, time.perf_counter() - start, error=response.status_code >= 400)
+            if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            if not self._sleep(attempt, retry_after, deadline, before=response.close):
+                return response
+
+            print(f"{host} returned {response.status_code}, retrying")
+            attempt += 1
+            metrics.count("retries")
+
+    def _send(self, limit, url, params, headers, stream, remaining):
+        """One GET in an acquired host slot; a streamed response keeps the slot until it is closed"""
+        try:
+            response = self.session.get(
+                url, params=params, headers=headers, stream=stream,
+                timeout=(min(self.connect_timeout, remaining), remaining)
+            )
+        except BaseException:
+            limit.release()
+            raise
+        if stream:
+            _release_on_close(response, limit)
+        else:
+            limit.release()
+        return response
+
+    def _sleep(self, attempt, retry_after, deadline, before=None):
+        """Full-jitter exponential backoff, or the server's Retry-After when it sends one.
+
+        Returns False (without sleeping) when the wait would end past the deadline.
+        """
+        delay = None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                delay = None
+        if delay is None:
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+        delay = min(delay, self.max_backoff)
+        if time.monotonic() + delay >= deadline:
+            return False
+        if before is not None:
+            before()
+        time.sleep(delay)
+        return True
+
+    def _replay(self, cached, not_modified):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = cached["content"]
+        response.headers.update(cached["headers"])
+        response.encoding = cached["encoding"]
+        response.url = not_modified.url
+        response.request = not_modified.request
+        return response
+
+    def _limit(self, host):
+        with self.lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self.host_limits[host]
+
+    def _metrics(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.host_metrics:
+                self.host_metrics[host] = HostMetrics()
+            return self.host_metrics[host]
@@ -0,0 +1,351 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from resource_ids import video_resource_id, paper_resource_id
+from chunker import chunk_document
+from metrics import timed
+
+_STOP = object()
+
+
+def video_doc(video):
+    """Embedding document for a YouTube video"""
+    return {
+        "id": video_resource_id(video["id"]),
+        "text": video["title"] + " " + video["description"],
+        "metadata": {"type": "video", "url": video["url"], "title": video["title"]}
+    }
+
+
+def paper_doc(paper, pdf_text=""):
+    """Embedding document for a paper, with whatever PDF text could be extracted.
+
+    Without PDF text the doc is flagged text_missing: it is indexed for a new paper,
+    but never replaces the full-text chunks of one that is already stored.
+    """
+    metadata = {"type": "pdf", "url": paper["pdf_url"], "title": paper["title"]}
+    if paper.get("doi"):
+        metadata["doi"] = paper["doi"]
+    # Kept so compaction derives the same id as paper_resource_id for papers without a DOI
+    if paper.get("arxiv_id"):
+        metadata["arxiv_id"] = paper["arxiv_id"]
+    doc = {
+        "id": paper_resource_id(paper),
+        "text": paper["title"] + " " + (paper["summary"] or "") + " " + pdf_text,
+        "metadata": metadata
+    }
+    if not pdf_text.strip():
+        doc["text_missing"] = True
+    return doc
+
+
+def extract_budget():
+    """Page/character budget for PDF text that gets indexed (unset = the whole paper)"""
+    max_pages = os.getenv("INDEX_PDF_MAX_PAGES")
+    max_chars = os.getenv("INDEX_PDF_MAX_CHARS")
+    return {
+        "max_pages": int(max_pages) if max_pages else None,
+        "max_chars": int(max_chars) if max_chars else None
+    }
+
+
+def summary_budget():
+    """Page/character budget for PDF text read for excerpts and LLM summaries"""
+    return {
+        "max_pages": int(os.getenv("SUMMARY_PDF_MAX_PAGES", "3")),
+        "max_chars": int(os.getenv("SUMMARY_PDF_MAX_CHARS", "4000"))
+    }
+
+
+class IngestionTicket:
+    """Tracks one submission; its future resolves to the number of items indexed once all are handled"""
+
+    def __init__(self, count):
+        self.remaining = count
+        self.indexed = 0
+        self.future = Future()
+        self.lock = threading.Lock()
+        if count == 0:
+            self.future.set_result(0)
+
+    def _done(self, items, indexed):
+        with self.lock:
+            self.remaining -= items
+            self.indexed += indexed
+            finished = self.remaining <= 0 and not self.future.done()
+        if finished:
+            self.future.set_result(self.indexed)
+
+
+class IngestionWorker:
+    """Background extract -> embed -> upsert pipeline fed by a bounded in-process queue.
+
+    Items are videos, papers (PDF text extracted by the worker) or ready-made docs;
+    every doc is split into overlapping chunks before it is embedded.
+    A full queue blocks submitters for up to put_timeout seconds, then drops the
+    item (back-pressure). A single writer thread batches items so Chroma sees one
+    upsert per batch.
+
+    With a shared_queue (several server processes), each process still extracts,
+    chunks and embeds its own items, then hands the docs to the shared queue. Only
+    the process holding writer_lock upserts them, so the store has a single writer;
+    if that process dies the lock is released and another worker takes over.
+    """
+
+    def __init__(self, pdf_agent, embedding_agent, max_queue=None, batch_size=None, batch_wait=None,
+                 put_timeout=None, extract_workers=None, shared_queue=None, writer_lock=None, on_writer=None):
+        self.pdf_agent = pdf_agent
+        self.embedding_agent = embedding_agent
+        self.queue = queue.Queue(maxsize=int(max_queue or os.getenv("INGESTION_QUEUE_SIZE", "1000")))
+        self.batch_size = int(batch_size or os.getenv("INGESTION_BATCH_SIZE", "32"))
+        self.batch_wait = float(batch_wait or os.getenv("INGESTION_BATCH_WAIT_SECONDS", "0.5"))
+        self.put_timeout = float(put_timeout or os.getenv("INGESTION_PUT_TIMEOUT_SECONDS", "1"))
+        self.extractor = ThreadPoolExecutor(
+            max_workers=int(extract_workers or os.getenv("INGESTION_EXTRACT_WORKERS", "4")),
+            thread_name_prefix="ingestion-extract"
+        )
+
+        # Cross-process mode: shared job queue, writer election and submitted jobs awaiting their result
+        self.shared = shared_queue
+        self.writer_lock = writer_lock
+        self.is_writer = False
+        # Called with the embedding agent once this process becomes the writer (starts writer-only jobs)
+        self.on_writer = on_writer
+        self.waiting = {}
+        self.poll_interval = float(os.getenv("INGESTION_POLL_SECONDS", "0.25"))
+        # Search hits of every process (tracked only when a retention policy is set) are written by the writer
+        self.hits_interval = float(os.getenv("RETENTION_HITS_FLUSH_SECONDS", "10"))
+        self.hits_flushed = time.monotonic()
+
+        self.lock = threading.Lock()
+        self.counts = {"submitted": 0, "rejected": 0, "processed": 0, "written": 0, "failed": 0, "batches": 0}
+        self.started_at = None
+        self.busy_seconds = 0.0
+        self.stopping = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self._loop, name="ingestion-writer", daemon=True)
+            self.thread.start()
+        return self
+
+    def submit_resources(self, videos=(), pdfs=()):
+        """Queue videos and papers for extraction and indexing"""
+        items = [("video", v) for v in videos] + [("pdf", p) for p in pdfs]
+        return self._submit(items)
+
+    def submit_docs(self, docs):
+        """Queue ready-made docs (text already extracted) for indexing"""
+        return self._submit([("doc", d) for d in docs])
+
+    def _submit(self, items):
+        ticket = IngestionTicket(len(items))
+        if self.stopping:
+            self._count("rejected", len(items))
+            ticket._done(len(items), 0)
+            return ticket
+
+        # One put_timeout for the whole submission, so a full queue delays a request by at most that much
+        deadline = time.monotonic() + self.put_timeout
+        dropped = 0
+        for kind, payload in items:
+            remaining = deadline - time.monotonic()
+            try:
+                self.queue.put((kind, payload, ticket), block=remaining > 0, timeout=max(remaining, 0.0) or None)
+                self._count("submitted")
+            except queue.Full:
+                dropped += 1
+                self._count("rejected")
+                ticket._done(1, 0)
+        if dropped:
+            print(f"Ingestion queue full, dropped {dropped} of {len(items)} items")
+        return ticket
+
+    def shutdown(self, timeout=None):
+        """Stop accepting work, drain what is queued, then stop the writer thread"""
+        if self.thread is None or self.stopping:
+            return
+        self.stopping = True
+        print(f"Draining ingestion queue ({self.queue.qsize()} items)")
+        try:
+            self.queue.put(_STOP, timeout=1)
+        except queue.Full:
+            pass  # the loop also stops once it finds the queue empty while stopping
+        self.thread.join(timeout if timeout is not None else float(os.getenv("INGESTION_DRAIN_SECONDS", "30")))
+        self.extractor.shutdown(wait=False)
+
+    def stats(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        with self.lock:
+            counts = dict(self.counts)
+            waiting = len(self.waiting)
+        shared = {}
+        if self.shared is not None:
+            shared = {"shared_queue": dict(self.shared.stats(), waiting=waiting), "writer": int(self.is_writer)}
+        return dict(
+            counts,
+            **shared,
+            queue_depth=self.queue.qsize(),
+            queue_capacity=self.queue.maxsize,
+            running=bool(self.thread and self.thread.is_alive()),
+            docs_per_second=round(counts["processed"] / elapsed, 3) if elapsed else 0.0,
+            busy_docs_per_second=round(counts["processed"] / self.busy_seconds, 3) if self.busy_seconds else 0.0
+        )
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def _loop(self):
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._process(batch)
+            if self.shared is not None:
+                self._sync_shared()
+            if stop or (self.stopping and not batch and self.queue.empty()):
+                return
+
+    def _next_batch(self):
+        """Block for the first item, then collect more until batch_size or batch_wait is reached"""
+        try:
+            # In shared mode (or while stopping) wake up regularly to apply jobs or notice the end
+            polling = self.shared is not None or self.stopping
+            item = self.queue.get(timeout=self.poll_interval if polling else None)
+        except queue.Empty:
+            return [], False
+        if item is _STOP:
+            return self._drain(), True
+
+        batch = [item]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch + self._drain(), True
+            batch.append(item)
+        return batch, False
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _STOP:
+                items.append(item)
+
+    def _process(self, batch):
+        start = time.perf_counter()
+        for offset in range(0, len(batch), self.batch_size):
+            chunk = batch[offset:offset + self.batch_size]
+            ok = True
+            try:
+                docs = self._build_docs(chunk)
+                if self.shared is not None:
+                    self._enqueue_shared(docs, [ticket for _, _, ticket in chunk])
+                    continue
+                self._count("written", self.embedding_agent.add(docs))
+            except Exception as e:
+                print(f"Ingestion batch error: {e}")
+                ok = False
+            self._finish([ticket for _, _, ticket in chunk], ok)
+        self.busy_seconds += time.perf_counter() - start
+
+    def _finish(self, tickets, ok):
+        if not ok:
+            self._count("failed", len(tickets))
+        self._count("processed", len(tickets))
+        self._count("batches")
+        for ticket in tickets:
+            ticket._done(1, 1 if ok else 0)
+
+    def _enqueue_shared(self, docs, tickets):
+        """Embed docs here (filling the shared embedding cache), then queue them for the writer"""
+        if docs:
+            self.embedding_agent.get_embeddings([d["text"] for d in docs])
+        job_id = self.shared.put(docs)
+        with self.lock:
+            self.waiting[job_id] = tickets
+
+    def _sync_shared(self):
+        """Apply queued jobs if this process is the writer, then resolve tickets of finished jobs"""
+        if self.writer_lock.acquire():
+            if not self.is_writer:
+                self.is_writer = True
+                print(f"✓ Process {os.getpid()} is the index writer")
+                # Reload what the previous writer stored; it may have died between the store and index writes
+                self.embedding_agent.become_writer()
+                if self.on_writer is not None:
+                    self.on_writer(self.embedding_agent)
+            self._apply_shared()
+        if time.monotonic() - self.hits_flushed >= self.hits_interval:
+            self._flush_hits()
+
+        with self.lock:
+            job_ids = list(self.waiting)
+        for job_id, written in self.shared.results(job_ids).items():
+            with self.lock:
+                tickets = self.waiting.pop(job_id)
+            self._finish(tickets, written >= 0)
+
+    def _flush_hits(self):
+        """Write this process's search hits into the store, through the shared queue unless it is the writer"""
+        self.hits_flushed = time.monotonic()
+        hits = self.embedding_agent.take_hits()
+        if not hits:
+            return
+        if self.is_writer:
+            self.embedding_agent.apply_hits(hits)
+        else:
+            self.shared.put({"hits": hits})
+
+    def _apply_shared(self):
+        for job_id, payload in self.shared.claim(self.batch_size):
+            try:
+                if isinstance(payload, dict):
+                    # Hit counts from another process; they do not change what searches return
+                    self.embedding_agent.apply_hits(payload["hits"])
+                    written = 0
+                else:
+                    written = self.embedding_agent.add(payload)
+                self._count("written", written)
+            except Exception as e:
+                print(f"Ingestion batch error: {e}")
+                written = -1
+            self.shared.ack(job_id, written)
+
+    @timed("ingestion.build_docs")
+    def _build_docs(self, items):
+        texts = {}
+        if self.pdf_agent and hasattr(self.pdf_agent, 'extract_text'):
+            budget = extract_budget()
+            futures = {
+                i: self.extractor.submit(self.pdf_agent.extract_text, payload["pdf_url"], **budget)
+                for i, (kind, payload, _) in enumerate(items) if kind == "pdf"
+            }
+            for i, future in futures.items():
+                try:
+                    texts[i] = future.result()
+                except Exception:
+                    texts[i] = ""
+
+        docs = []
+        for i, (kind, payload, _) in enumerate(items):
+            if kind == "video":
+                doc = video_doc(payload)
+            elif kind == "pdf":
+                doc = paper_doc(payload, texts.get(i, ""))
+            else:
+                doc = payload
+            docs.extend(chunk_document(doc))
+        return docs
@@ -0,0 +1,122 @@
+import os
+import re
+import sqlite3
+import threading
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_PHRASE = re.compile(r'"([^"]+)"')
+# A code or identifier: letters, digits and separators, with at least one digit (GPT-4, 1706.03762)
+_IDENTIFIER = re.compile(r"^(?=[^\d]*\d)\w[\w.\-:/]*$", re.UNICODE)
+
+
+def is_keyword_query(query: str) -> bool:
+    """Heuristic for queries better served by exact terms than by embeddings.
+
+    Only queries made entirely of quoted phrases, or of one or two codes and
+    identifiers containing a digit (e.g. "ResNet-50", "GPT-4", "1706.03762"),
+    count as keyword queries; everything else stays hybrid.
+    """
+    terms = _PHRASE.sub(" ", query).split()
+    if not terms:
+        return bool(_PHRASE.search(query))
+    return len(terms) <= 2 and all(_IDENTIFIER.match(t) for t in terms)
+
+
+def to_fts_query(query: str) -> str:
+    """Turn free text into an FTS5 MATCH expression: quoted phrases stay phrases, other words are OR-ed"""
+    phrases = ['"' + " ".join(_WORD.findall(p)) + '"' for p in _PHRASE.findall(query) if _WORD.search(p)]
+    words = ['"' + w + '"' for w in _WORD.findall(_PHRASE.sub(" ", query))]
+    return " OR ".join(phrases + words)
+
+
+class LexicalIndex:
+    """BM25 keyword index over the same chunk texts as the vector store, backed by SQLite FTS5"""
+
+    def __init__(self, path=None):
+        path = path or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, type TEXT)"
+        )
+        self.conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(title, text, tokenize='porter unicode61')"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def doc_ids(self):
+        with self.lock:
+            return {doc_id for (doc_id,) in self.conn.execute("SELECT id FROM docs")}
+
+    @property
+    def pending(self):
+        """True if a write to the store was announced by begin_write() but never reached the index"""
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM info WHERE key = 'pending'").fetchone() is not None
+
+    def begin_write(self):
+        """Call before writing the same rows to the store; the next upsert, remove or clear clears it"""
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('pending', '1')")
+            self.conn.commit()
+
+    def upsert(self, ids, texts, metadatas):
+        with self.lock:
+            self._remove(ids)
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                metadata = metadata or {}
+                cursor = self.conn.execute("INSERT INTO docs (id, type) VALUES (?, ?)", (doc_id, metadata.get("type")))
+                self.conn.execute(
+                    "INSERT INTO docs_fts (rowid, title, text) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, metadata.get("title") or "", text)
+                )
+            self._written()
+
+    def remove(self, ids):
+        with self.lock:
+            self._remove(ids)
+            self._written()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM docs")
+            self.conn.execute("DELETE FROM docs_fts")
+            self._written()
+
+    def _written(self):
+        self.conn.execute("DELETE FROM info WHERE key = 'pending'")
+        self.conn.commit()
+
+    def search(self, query: str, k=10, doc_type=None):
+        """Return [(id, bm25)] best first; bm25 is negative and lower means a better match"""
+        match = to_fts_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT docs.id, bm25(docs_fts, 2.0, 1.0) AS score FROM docs_fts "
+            "JOIN docs ON docs.rowid = docs_fts.rowid WHERE docs_fts MATCH ?"
+        )
+        params = [match]
+        if doc_type:
+            sql += " AND docs.type = ?"
+            params.append(doc_type)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k)
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _remove(self, ids):
+        for start in range(0, len(ids), 500):
+            chunk = list(ids[start:start + 500])
+            placeholders = ",".join("?" * len(chunk))
+            rowids = [(r,) for (r,) in self.conn.execute(f"SELECT rowid FROM docs WHERE id IN ({placeholders})", chunk)]
+            self.conn.executemany("DELETE FROM docs_fts WHERE rowid = ?", rowids)
+            self.conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", chunk)
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from lru import LRUCache
+
+class LLMCache:
+    """LLM response cache: an in-memory LRU in front of a SQLite table shared by all server processes.
+
+    Entries are keyed by sha256(model, prompt) and expire after ttl seconds, so a
+    prompt is only sent to the model again once its answer is that old.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None, memory_entries=None):
+        if path is None:
+            path = os.getenv("LLM_CACHE_PATH", "./cache/llm.sqlite3")
+        path = path or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.ttl = float(ttl or os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+        self.max_entries = int(max_entries or os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+        self.memory = LRUCache(memory_entries or os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_stored_at ON responses(stored_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(model_name: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name: str, prompt: str):
+        """Return the cached response text, or None"""
+        key = self.key(model_name, prompt)
+        entry = self.memory.get(key)
+        if entry is None:
+            with self.lock:
+                entry = self.conn.execute("SELECT text, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if entry is not None:
+                self.memory.put(key, entry)
+
+        fresh = entry is not None and time.time() - entry[1] < self.ttl
+        with self.lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry[0] if fresh else None
+
+    def put(self, model_name: str, prompt: str, text: str):
+        key = self.key(model_name, prompt)
+        entry = (text, time.time())
+        self.memory.put(key, entry)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses (key, text, stored_at) VALUES (?, ?, ?)", (key,) + entry)
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY stored_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self.lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "memory": self.memory.stats()
+        }
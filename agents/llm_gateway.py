@@ -0,0 +1,305 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+import ollama
+
+from llm_cache import LLMCache
+from metrics import registry, count, span
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+_ANSWER = re.compile(r"^\s*\[(\d+)\]\s*(.+)$")
+
+
+def get_gateway():
+    """Process-wide LLMGateway shared by all agents"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+def summary_prompt(text: str) -> str:
+    return f"Summarize this academic text in 2-3 sentences:\n\n{text[:1000]}"
+
+
+def batch_summary_prompt(texts) -> str:
+    sections = "\n\n".join(f"[{i}]\n{text[:1000]}" for i, text in enumerate(texts, start=1))
+    return (
+        f"Summarize each of the following {len(texts)} academic texts in 2-3 sentences. "
+        f"Answer with exactly one line per text, formatted as \"[number] summary\".\n\n{sections}"
+    )
+
+
+class LLMBusyError(TimeoutError):
+    """No model slot became free before the caller's deadline"""
+
+
+class LLMGateway:
+    """Single entry point for chat calls to the local Ollama model.
+
+    At most max_concurrency calls run at once; the rest wait for a slot, but no
+    longer than queue_timeout or the caller's deadline (then LLMBusyError).
+    Answers are cached by (model, prompt), identical concurrent prompts share one
+    call, and summaries (from summarize_many() or concurrent summarize() calls)
+    are combined up to batch_size per prompt, waiting at most batch_wait seconds
+    for others to join.
+    """
+
+    def __init__(self, max_concurrency=None, queue_timeout=None, request_timeout=None, cache=None, client=None,
+                 batch_size=None, batch_wait=None):
+        request_timeout = float(request_timeout or os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+        self.client = client or ollama.Client(timeout=request_timeout)
+        self.max_concurrency = int(max_concurrency or os.getenv("LLM_MAX_CONCURRENCY", "2"))
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.queue_timeout = float(queue_timeout or os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+        self.cache = cache or LLMCache()
+
+        # Micro-batching of summaries; batch_size 1 sends every text on its own
+        self.batch_size = int(batch_size or os.getenv("LLM_BATCH_SIZE", "1"))
+        self.batch_wait = float(batch_wait or os.getenv("LLM_BATCH_WAIT_SECONDS", "0.05"))
+        self.pending = []
+        self.batch_timer = None
+
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.queued = 0
+        self.active = 0
+        self.tokens_per_second = 0.0
+        self.counts = {"requests": 0, "cache_hits": 0, "coalesced": 0, "rejected": 0, "errors": 0,
+                       "batches": 0, "batched_prompts": 0, "batch_fallbacks": 0}
+
+    def chat(self, prompt: str, model: str, deadline=None, options=None) -> str:
+        """Answer one prompt (from the cache when possible); deadline is a time.monotonic() value"""
+        self._count("requests")
+        cached = self.cache.get(model, prompt)
+        if cached is not None:
+            self._count("cache_hits")
+            return cached
+
+        key = self.cache.key(model, prompt)
+        with self.lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+        if not owner:
+            self._count("coalesced")
+            try:
+                return future.result(timeout=_remaining(deadline))
+            except FutureTimeoutError:
+                raise LLMBusyError("identical prompt still running at the deadline")
+
+        try:
+            text = self._call(model, prompt, deadline, options)
+            self.cache.put(model, prompt, text)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def stream(self, prompt: str, model: str, deadline=None, options=None):
+        """Yield the answer in pieces as the model generates it; a cached answer is yielded whole"""
+        self._count("requests")
+        cached = self.cache.get(model, prompt)
+        if cached is not None:
+            self._count("cache_hits")
+            yield cached
+            return
+
+        parts = []
+        with self._slot(model, deadline), span("llm.stream", model=model):
+            start = time.perf_counter()
+            last = None
+            try:
+                for chunk in self.client.chat(model=model, messages=[{"role": "user", "content": prompt}],
+                                              stream=True, options=options):
+                    piece = chunk["message"]["content"]
+                    if piece:
+                        parts.append(piece)
+                        yield piece
+                    last = chunk
+            except Exception:
+                self._count("errors")
+                raise
+            self._record(model, last or {}, time.perf_counter() - start, len(parts))
+        self.cache.put(model, prompt, "".join(parts).strip())
+
+    def summarize(self, text: str, model: str, deadline=None) -> str:
+        """2-3 sentence summary of text, micro-batched with concurrent summaries when batch_size > 1"""
+        return self.summarize_many([text], model, deadline)[0]
+
+    def summarize_many(self, texts, model: str, deadline=None):
+        """Summaries of several texts, in order; uncached ones share prompts of up to batch_size texts.
+
+        A text whose summary fails comes back as the exception instance, so one bad
+        answer does not lose the others.
+        """
+        texts = list(texts)
+        if self.batch_size <= 1:
+            if len(texts) == 1:
+                return [self.chat(summary_prompt(texts[0]), model, deadline)]
+            results = []
+            for text in texts:
+                try:
+                    results.append(self.chat(summary_prompt(text), model, deadline))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        futures = []
+        batches = []
+        with self.lock:
+            for text in texts:
+                self.counts["requests"] += 1
+                future = Future()
+                futures.append(future)
+                cached = self.cache.get(model, summary_prompt(text))
+                if cached is not None:
+                    self.counts["cache_hits"] += 1
+                    future.set_result(cached)
+                    continue
+                self.pending.append((model, text, deadline, future))
+                if len(self.pending) >= self.batch_size:
+                    batches.append(self.pending[:self.batch_size])
+                    self.pending = self.pending[self.batch_size:]
+            if self.batch_timer is not None and (batches or not self.pending):
+                self.batch_timer.cancel()
+                self.batch_timer = None
+            if self.pending and self.batch_timer is None:
+                # Fewer texts than a batch: wait briefly for concurrent callers to fill it
+                self.batch_timer = threading.Timer(self.batch_wait, self._flush)
+                self.batch_timer.daemon = True
+                self.batch_timer.start()
+        for batch in batches:
+            self._run_batch(batch)
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=_remaining(deadline)))
+            except FutureTimeoutError:
+                results.append(LLMBusyError("summary not ready before the deadline"))
+            except Exception as e:
+                results.append(e)
+        if len(texts) == 1 and isinstance(results[0], Exception):
+            raise results[0]
+        return results
+
+    def _flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.batch_timer = None
+        if batch:
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        """Answer a batch of summaries with one prompt per model; unparsed answers fall back to single calls"""
+        by_model = {}
+        for item in batch:
+            by_model.setdefault(item[0], []).append(item)
+
+        for model, items in by_model.items():
+            answers = {}
+            if len(items) > 1:
+                deadlines = [deadline for _, _, deadline, _ in items if deadline is not None]
+                try:
+                    self._count("batches")
+                    self._count("batched_prompts", len(items))
+                    reply = self._call(model, batch_summary_prompt([text for _, text, _, _ in items]),
+                                       min(deadlines) if deadlines else None)
+                    for line in reply.splitlines():
+                        match = _ANSWER.match(line)
+                        if match and 1 <= int(match.group(1)) <= len(items):
+                            answers[int(match.group(1)) - 1] = match.group(2).strip()
+                except Exception as e:
+                    print(f"Batched summary error: {e}")
+
+            for i, (_, text, deadline, future) in enumerate(items):
+                if i in answers:
+                    self.cache.put(model, summary_prompt(text), answers[i])
+                    future.set_result(answers[i])
+                    continue
+                if len(items) > 1:
+                    self._count("batch_fallbacks")
+                try:
+                    future.set_result(self.chat(summary_prompt(text), model, deadline))
+                except Exception as e:
+                    future.set_exception(e)
+
+    def _call(self, model, prompt, deadline, options=None):
+        with self._slot(model, deadline), span("llm.chat", model=model):
+            start = time.perf_counter()
+            try:
+                response = self.client.chat(model=model, messages=[{"role": "user", "content": prompt}],
+                                            options=options)
+            except Exception:
+                self._count("errors")
+                raise
+            self._record(model, response, time.perf_counter() - start)
+        return response["message"]["content"].strip()
+
+    @contextmanager
+    def _slot(self, model, deadline):
+        """Hold one of the max_concurrency model slots, waiting at most until the deadline"""
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+        with self.lock:
+            self.queued += 1
+        start = time.perf_counter()
+        acquired = self.slots.acquire(timeout=timeout)
+        waited = time.perf_counter() - start
+        with self.lock:
+            self.queued -= 1
+            if acquired:
+                self.active += 1
+        registry.observe("llm_queue_wait_seconds", waited, model=model)
+        if not acquired:
+            self._count("rejected")
+            count("llm_rejected_total", model=model)
+            raise LLMBusyError(f"no LLM slot free after {waited:.1f}s")
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active -= 1
+            self.slots.release()
+
+    def _record(self, model, response, elapsed, pieces=0):
+        """Token counters and generation speed from Ollama's eval_count/eval_duration"""
+        tokens = response.get("eval_count") or pieces
+        seconds = (response.get("eval_duration") or 0) / 1e9 or elapsed
+        count("llm_tokens_total", tokens, model=model, kind="completion")
+        count("llm_tokens_total", response.get("prompt_eval_count") or 0, model=model, kind="prompt")
+        count("llm_generation_seconds_total", seconds, model=model)
+        if tokens and seconds:
+            with self.lock:
+                # Moving average, so the gauge follows the model host's current speed
+                rate = tokens / seconds
+                self.tokens_per_second = rate if not self.tokens_per_second else 0.8 * self.tokens_per_second + 0.2 * rate
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts, max_concurrency=self.max_concurrency, active=self.active, queued=self.queued,
+                         pending_batch=len(self.pending), tokens_per_second=round(self.tokens_per_second, 2))
+        stats["cache"] = self.cache.stats()
+        return stats
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
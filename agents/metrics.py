@@ -0,0 +1,185 @@
+import contextvars
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers cache hits (~ms) up to slow PDF downloads and LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans recorded for the current request, when a caller asked for a timing breakdown
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count for one label set"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide counters and histograms keyed by (name, sorted labels)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def totals(self, name):
+        """{label string: (count, sum)} for one histogram, e.g. per-stage call counts and seconds"""
+        with self.lock:
+            return {
+                ",".join(f"{k}={v}" for k, v in labels): (h.count, h.sum)
+                for (metric, labels), h in self.histograms.items() if metric == name
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self, gauges=()):
+        """Prometheus text exposition; gauges is an iterable of (name, labels, value)"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (name, labels), counts, total, count in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, bucket_count in zip(BUCKETS, counts):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {bucket_count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for name, labels, value in gauges:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+registry = Registry()
+
+
+def count(name, value=1, **labels):
+    """Increment a counter, e.g. count("cache_requests_total", cache="pdf_text", result="hit")"""
+    registry.inc(name, value, **labels)
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time a block into stage_duration_seconds and count its errors"""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e.__class__.__name__
+        registry.inc("stage_errors_total", stage=stage, error=error, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("stage_duration_seconds", elapsed, stage=stage, **labels)
+        spans = _request_spans.get()
+        if spans is not None:
+            entry = {"stage": stage, "start_ms": round((start - spans[0]) * 1000, 2),
+                     "duration_ms": round(elapsed * 1000, 2)}
+            if labels:
+                entry.update(labels)
+            if error:
+                entry["error"] = error
+            spans[1].append(entry)
+
+
+def timed(stage):
+    """Decorator form of span() for agent methods"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn):
+    """Carry the caller's context (and its request timings) into an executor thread"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+@contextmanager
+def request_timings():
+    """Collect every span finished in this context (and bound threads) into a breakdown dict"""
+    start = time.perf_counter()
+    spans = []
+    token = _request_spans.set((start, spans))
+    breakdown = {}
+    try:
+        yield breakdown
+    finally:
+        _request_spans.reset(token)
+        # Threads still running past the deadline may append later; report what finished in time
+        spans = list(spans)
+        stages = {}
+        for entry in spans:
+            stage = stages.setdefault(entry["stage"], {"count": 0, "total_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] = round(stage["total_ms"] + entry["duration_ms"], 2)
+        breakdown.update(total_ms=round((time.perf_counter() - start) * 1000, 2), stages=stages, spans=spans)
+
+
+def stats_gauges(prefix, stats, **labels):
+    """Flatten a component's stats() dict into (name, labels, value) gauges for render()"""
+    for key, value in stats.items():
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            yield from stats_gauges(name, value, **labels)
+        elif isinstance(value, (int, float)):
+            yield name, labels, float(value)
@@ -1,59 +1,206 @@
-import requests
 from PyPDF2 import PdfReader
 import io
-import ollama
+import os
+import time
+import hashlib
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from resource_ids import arxiv_id_from_url
+from pdf_text_cache import PDFTextCache
+from http_client import get_client
+from llm_gateway import get_gateway, summary_prompt
+from lru import LRUCache
+from metrics import timed, bind, count
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _page_pool():
+    """Process pool shared by all agents for page-parallel extraction of large PDFs"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.getenv("PDF_EXTRACT_PROCESSES", "0")) or None
+            # Forking a process that runs request and ingestion threads can copy locks held by them;
+            # worker processes are started from a clean forkserver (spawn where it is unavailable)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _extract_page_range(path: str, start: int, stop: int):
+    """Extract the text of pages [start, stop) of the PDF at path (runs in a worker process)"""
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
 
 class PDFAgent:
-    def __init__(self, model_name="llama3:instruct"):
+    def __init__(self, model_name="llama3:instruct", text_cache=None, http=None):
         self.model_name = model_name
 
+        # Pooled keep-alive client with retries, shared with the other agents
+        self.http = http or get_client()
+        # Overridable so benchmarks can point the agent at local stand-ins
+        self.semantic_scholar_url = os.getenv(
+            "SEMANTIC_SCHOLAR_API_URL", "https://api.semanticscholar.org/graph/v1/paper/search"
+        )
+        self.arxiv_url = os.getenv("ARXIV_API_URL", "http://export.arxiv.org/api/query")
+
+        # "hedged" races Semantic Scholar against arXiv; "sequential" tries them strictly in order
+        self.fetch_mode = os.getenv("PDF_FETCH_MODE", "hedged")
+        self.hedge_delay = float(os.getenv("PDF_HEDGE_DELAY_SECONDS", "1.5"))
+        self.merge_policy = os.getenv("PDF_MERGE_POLICY", "first")
+        self.merge_timeout = float(os.getenv("PDF_MERGE_TIMEOUT_SECONDS", "20"))
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pdf-fetch")
+        # Winning source per query, for diagnostics
+        self.sources = LRUCache(1024)
+
+        # Extracted text is cached on disk by PDF content hash and URL
+        self.text_cache = text_cache or PDFTextCache()
+        self.revalidate_after = float(os.getenv("PDF_TEXT_REVALIDATE_SECONDS", str(7 * 24 * 3600)))
+        self.max_pdf_bytes = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+        # Documents with at least this many pages to read are split across the process pool
+        self.parallel_page_threshold = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "24"))
+        self.pages_per_task = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+    @timed("papers.fetch")
     def fetch(self, query: str, max_results: int = 10):
         """Search for research papers using Semantic Scholar Graph API with fallback strategies"""
-        papers = []
-        
+        if self.fetch_mode == "hedged":
+            papers, source = self._fetch_hedged(query, max_results)
+        else:
+            papers, source = self._fetch_sequential(query, max_results)
+
+        self.sources.put(query, source)
+        if not papers:
+            print(f"No papers found for query: {query}")
+        return papers
+
+    def source_for(self, query: str):
+        """Which strategy answered the most recent fetch for query (None if unknown)"""
+        return self.sources.get(query)
+
+    def _fetch_sequential(self, query: str, max_results: int):
+        """Try Semantic Scholar, then the broadened query, then arXiv, strictly in order"""
+        papers, source = self._search_semantic_scholar_strategies(query, max_results)
+        if papers:
+            return papers, source
+        return self._search_arxiv_strategy(query, max_results)
+
+    def _fetch_hedged(self, query: str, max_results: int):
+        """Race Semantic Scholar against arXiv, starting arXiv after hedge_delay seconds.
+
+        With merge_policy "first" the first non-empty result set wins and the
+        other search is cancelled; with "merge" both are awaited (up to
+        merge_timeout) and deduplicated by DOI, arXiv id and title.
+        """
+        primary = self.executor.submit(bind(self._search_semantic_scholar_strategies), query, max_results)
+        pending = {primary}
+        done, _ = wait(pending, timeout=self.hedge_delay)
+        if primary in done and self.merge_policy == "first":
+            papers, source = primary.result()
+            if papers:
+                return papers, source
+
+        pending.add(self.executor.submit(bind(self._search_arxiv_strategy), query, max_results))
+
+        if self.merge_policy == "merge":
+            done, not_done = wait(pending, timeout=self.merge_timeout)
+            for future in not_done:
+                future.cancel()
+            results = [f.result() for f in (primary, *pending - {primary}) if f in done]
+            merged = self._dedupe_papers([p for papers, _ in results for p in papers])[:max_results]
+            sources = [source for papers, source in results if papers]
+            return merged, "+".join(sources) if sources else None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                papers, source = future.result()
+                if papers:
+                    for loser in pending:
+                        loser.cancel()
+                    print(f"Hedged fetch won by {source}")
+                    return papers, source
+        return [], None
+
+    def _search_semantic_scholar_strategies(self, query: str, max_results: int):
+        """Strategies 1 and 2: direct, then broadened Semantic Scholar search; returns (papers, source)"""
         # Strategy 1: Direct search
         try:
             papers = self._search_semantic_scholar(query, max_results)
             if papers:
                 print(f"Found {len(papers)} papers using direct search")
-                return papers
+                return self._tag(papers, "semantic_scholar"), "semantic_scholar"
         except Exception as e:
             print(f"Direct search failed: {e}")
-        
+
         # Strategy 2: Try with broader search terms
-        if not papers:
-            try:
-                broader_query = f"{query} research OR {query} survey OR {query} review"
-                papers = self._search_semantic_scholar(broader_query, max_results)
-                if papers:
-                    print(f"Found {len(papers)} papers using broader search")
-                    return papers
-            except Exception as e:
-                print(f"Broader search failed: {e}")
-        
-        # Strategy 3: Try arXiv as fallback
-        if not papers:
-            try:
-                papers = self._search_arxiv(query, max_results)
-                if papers:
-                    print(f"Found {len(papers)} papers using arXiv fallback")
-                    return papers
-            except Exception as e:
-                print(f"arXiv fallback failed: {e}")
-        
-        print(f"No papers found for query: {query}")
-        return []
-    
+        try:
+            broader_query = f"{query} research OR {query} survey OR {query} review"
+            papers = self._search_semantic_scholar(broader_query, max_results)
+            if papers:
+                print(f"Found {len(papers)} papers using broader search")
+                return self._tag(papers, "semantic_scholar_broad"), "semantic_scholar_broad"
+        except Exception as e:
+            print(f"Broader search failed: {e}")
+        return [], None
+
+    def _search_arxiv_strategy(self, query: str, max_results: int):
+        """Strategy 3: arXiv; returns (papers, source)"""
+        try:
+            papers = self._search_arxiv(query, max_results)
+            if papers:
+                print(f"Found {len(papers)} papers using arXiv fallback")
+                return self._tag(papers, "arxiv"), "arxiv"
+        except Exception as e:
+            print(f"arXiv fallback failed: {e}")
+        return [], None
+
+    @staticmethod
+    def _tag(papers, source):
+        for paper in papers:
+            paper["source"] = source
+        return papers
+
+    @staticmethod
+    def _dedupe_papers(papers):
+        """Drop papers already seen under the same DOI, arXiv id, normalized title or PDF URL (first one wins)"""
+        seen = set()
+        unique = []
+        for paper in papers:
+            keys = set()
+            title = " ".join((paper.get("title") or "").lower().split())
+            if title:
+                keys.add("title:" + title)
+            if paper.get("pdf_url"):
+                keys.add("url:" + paper["pdf_url"])
+            if paper.get("doi"):
+                keys.add("doi:" + paper["doi"].lower())
+            arxiv_id = paper.get("arxiv_id") or arxiv_id_from_url(paper.get("pdf_url") or "")
+            if arxiv_id:
+                keys.add("arxiv:" + arxiv_id.lower())
+            if keys & seen:
+                continue
+            seen |= keys
+            unique.append(paper)
+        return unique
+
+    @timed("papers.semantic_scholar")
     def _search_semantic_scholar(self, query: str, max_results: int):
         """Search Semantic Scholar API"""
-        url = "https://api.semanticscholar.org/graph/v1/paper/search"
+        url = self.semantic_scholar_url
         params = {
             "query": query,
             "limit": max_results,
-            "fields": "title,url,abstract,authors,year,citationCount,openAccessPdf"
+            "fields": "title,url,abstract,authors,year,citationCount,openAccessPdf,externalIds"
         }
         
-        resp = requests.get(url, params=params, timeout=20)
+        resp = self.http.get(url, params=params, timeout=20, revalidate=True)
         resp.raise_for_status()
         data = resp.json() or {}
         items = data.get("data", []) or data.get("papers", [])
@@ -72,40 +219,47 @@ class PDFAgent:
                 if name:
                     authors.append(name)
 
+            external_ids = item.get("externalIds") or {}
+
             papers.append({
                 "title": item.get("title", ""),
                 "summary": item.get("abstract", ""),
                 "pdf_url": open_pdf or item.get("url", ""),
                 "authors": authors,
                 "year": item.get("year"),
-                "citationCount": item.get("citationCount", 0)
+                "citationCount": item.get("citationCount", 0),
+                "doi": external_ids.get("DOI"),
+                "arxiv_id": external_ids.get("ArXiv")
             })
 
         return papers
     
+    @timed("papers.arxiv")
     def _search_arxiv(self, query: str, max_results: int):
         """Fallback to arXiv API"""
         import urllib.parse
         
-        base_url = "http://export.arxiv.org/api/query"
+        base_url = self.arxiv_url
         search_query = urllib.parse.quote(query)
         url = f"{base_url}?search_query=all:{search_query}&start=0&max_results={max_results}&sortBy=relevance&sortOrder=descending"
         
-        resp = requests.get(url, timeout=20)
+        resp = self.http.get(url, timeout=20, revalidate=True)
         resp.raise_for_status()
         
         # Parse XML response
         import xml.etree.ElementTree as ET
         root = ET.fromstring(resp.content)
         
-        # Define namespace
-        ns = {'atom': 'http://www.w3.org/2005/Atom'}
+        # Define namespaces
+        ns = {'atom': 'http://www.w3.org/2005/Atom', 'arxiv': 'http://arxiv.org/schemas/atom'}
         
         papers = []
         for entry in root.findall('atom:entry', ns):
             title = entry.find('atom:title', ns)
             summary = entry.find('atom:summary', ns)
             published = entry.find('atom:published', ns)
+            entry_id = entry.find('atom:id', ns)
+            doi = entry.find('arxiv:doi', ns)
             
             # Get PDF link
             pdf_url = None
@@ -132,40 +286,147 @@ class PDFAgent:
                 "pdf_url": pdf_url or "",
                 "authors": authors,
                 "year": year,
-                "citationCount": 0  # arXiv doesn't provide citation count
+                "citationCount": 0,  # arXiv doesn't provide citation count
+                "doi": doi.text.strip() if doi is not None and doi.text else None,
+                "arxiv_id": arxiv_id_from_url(entry_id.text) if entry_id is not None and entry_id.text else None
             })
         
         return papers
 
-    def extract_text(self, pdf_url: str, max_pages: int = 3):
-        """Extract text from PDF URL"""
+    @timed("pdf.extract")
+    def extract_text(self, pdf_url: str, max_pages: int = 3, max_chars: int = 2000):
+        """Extract text from PDF URL, stopping once max_pages or max_chars is reached (None = no limit)"""
         try:
+            # Serve from the text cache, revalidating old entries with a conditional request
+            cached = self.text_cache.lookup_url(pdf_url)
+            cached_text = None
+            headers = {}
+            if cached:
+                cached_text = self.text_cache.lookup_text(cached["content_sha"], max_pages, max_chars)
+                if cached_text is not None:
+                    if time.time() - cached["checked_at"] < self.revalidate_after:
+                        count("cache_requests_total", cache="pdf_text", result="hit")
+                        return cached_text
+                    if cached["etag"]:
+                        headers["If-None-Match"] = cached["etag"]
+                    if cached["last_modified"]:
+                        headers["If-Modified-Since"] = cached["last_modified"]
+
             # Download PDF
-            response = requests.get(pdf_url, timeout=30)
-            response.raise_for_status()
-            
-            # Read PDF
-            pdf_file = io.BytesIO(response.content)
-            reader = PdfReader(pdf_file)
-            
-            # Extract text from first few pages
-            text = ""
-            for i, page in enumerate(reader.pages[:max_pages]):
-                text += page.extract_text() + "\n"
-            
-            return text[:2000]  # Limit text length
+            with self.http.get(pdf_url, headers=headers, timeout=30, stream=True) as response:
+                if response.status_code == 304 and cached_text is not None:
+                    self.text_cache.touch(pdf_url)
+                    count("cache_requests_total", cache="pdf_text", result="revalidated")
+                    return cached_text
+                response.raise_for_status()
+                data, content_sha = self._download(response)
+                validators = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")
+                }
+
+            # The same PDF may already have been parsed under another URL
+            text = self.text_cache.lookup_text(content_sha, max_pages, max_chars)
+            if text is not None:
+                self.text_cache.store(pdf_url, content_sha, **validators)
+                count("cache_requests_total", cache="pdf_text", result="content_hit")
+                return text
+
+            count("cache_requests_total", cache="pdf_text", result="miss")
+            text, page_ends, complete = self._extract_pages(data, max_pages, max_chars)
+            self.text_cache.store(pdf_url, content_sha, text=text, page_ends=page_ends, complete=complete, **validators)
+            return text[:max_chars] if max_chars is not None else text
         except Exception as e:
             print(f"Error extracting PDF text: {e}")
             return ""
 
+    @timed("pdf.download")
+    def _download(self, response):
+        """Read a streamed response into memory, hashing as we go and refusing oversized files"""
+        digest = hashlib.sha256()
+        buf = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            buf.extend(chunk)
+            digest.update(chunk)
+            if len(buf) > self.max_pdf_bytes:
+                raise ValueError(f"PDF larger than {self.max_pdf_bytes} bytes")
+        return bytes(buf), digest.hexdigest()
+
+    @timed("pdf.parse")
+    def _extract_pages(self, data: bytes, max_pages=None, max_chars=None):
+        """Extract page text in order until the budget is met; returns (text, page end offsets, complete)"""
+        reader = PdfReader(io.BytesIO(data))
+        total = len(reader.pages)
+        page_count = total if max_pages is None else min(max_pages, total)
+
+        if page_count >= self.parallel_page_threshold:
+            page_texts = self._extract_pages_parallel(data, page_count, max_chars)
+        else:
+            page_texts = []
+            length = 0
+            for page in reader.pages[:page_count]:
+                page_texts.append(page.extract_text() or "")
+                length += len(page_texts[-1]) + 1
+                if max_chars is not None and length >= max_chars:
+                    break
+
+        page_ends = []
+        length = 0
+        for page_text in page_texts:
+            length += len(page_text) + 1
+            page_ends.append(length)
+        text = "".join(page_text + "\n" for page_text in page_texts)
+        return text, page_ends, len(page_texts) == total
+
+    def _extract_pages_parallel(self, data: bytes, page_count: int, max_chars=None):
+        """Extract page ranges in the process pool, consuming them in order and cancelling the rest once over budget"""
+        # Tasks get the path of a temporary copy rather than pickling the whole PDF into each one
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+            f.write(data)
+            f.flush()
+            step = self.pages_per_task
+            futures = [
+                _page_pool().submit(_extract_page_range, f.name, start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
+            page_texts = []
+            length = 0
+            try:
+                for future in futures:
+                    for page_text in future.result():
+                        page_texts.append(page_text)
+                        length += len(page_text) + 1
+                        if max_chars is not None and length >= max_chars:
+                            return page_texts
+                return page_texts
+            finally:
+                for pending in futures:
+                    pending.cancel()
+                # Ranges already running still read the file; let them finish before it is removed
+                for pending in futures:
+                    if not pending.cancelled():
+                        pending.exception()
+
+    @timed("llm.summarize")
     def summarize_with_llm(self, text: str):
         """Summarize text using Ollama LLM"""
         try:
-            prompt = f"Summarize this academic text in 2-3 sentences:\n\n{text[:1000]}"
-            response = ollama.chat(model=self.model_name, messages=[
-                {"role": "user", "content": prompt}
-            ])
-            return response["message"]["content"].strip()
+            return get_gateway().summarize(text, self.model_name)
         except Exception as e:
             print(f"Error summarizing with LLM: {e}")
-            return text[:200] + "..." if len(text) > 200 else text
\ No newline at end of file
+            return text[:200] + "..." if len(text) > 200 else text
+
+    def summarize_many_with_llm(self, texts):
+        """Summarize several texts, batched into shared prompts; a failed summary falls back to the text's start"""
+        summaries = get_gateway().summarize_many(texts, self.model_name)
+        fallbacks = []
+        for text, summary in zip(texts, summaries):
+            if isinstance(summary, Exception):
+                print(f"Error summarizing with LLM: {summary}")
+                summary = text[:200] + "..." if len(text) > 200 else text
+            fallbacks.append(summary)
+        return fallbacks
+
+    def stream_summary(self, text: str, deadline=None):
+        """Yield summary text as the model generates it"""
+        return get_gateway().stream(summary_prompt(text), self.model_name, deadline)
\ No newline at end of file
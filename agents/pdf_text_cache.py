@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class PDFTextCache:
+    """On-disk cache of extracted PDF text.
+
+    Text is content-addressed by the sha256 of the PDF bytes, so the same paper
+    served from several URLs is parsed once. A second table maps each URL to its
+    content hash plus the ETag/Last-Modified validators used to revalidate it.
+    Each text keeps the offset where every page ends, so a longer extraction
+    can serve a request for fewer pages.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.getenv("PDF_TEXT_CACHE_PATH", "./cache/pdf_text.sqlite3")
+        path = path or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdf_urls ("
+            "url TEXT PRIMARY KEY, content_sha TEXT NOT NULL, etag TEXT, last_modified TEXT, checked_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdf_texts ("
+            "content_sha TEXT PRIMARY KEY, text TEXT NOT NULL, pages_read INTEGER NOT NULL, complete INTEGER NOT NULL, "
+            "page_ends TEXT)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pdf_texts)")]
+        if "page_ends" not in columns:
+            self.conn.execute("ALTER TABLE pdf_texts ADD COLUMN page_ends TEXT")
+        self.conn.commit()
+
+    def lookup_url(self, url: str):
+        """Return {content_sha, etag, last_modified, checked_at} for a URL, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT content_sha, etag, last_modified, checked_at FROM pdf_urls WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"content_sha": row[0], "etag": row[1], "last_modified": row[2], "checked_at": row[3]}
+
+    def lookup_text(self, content_sha: str, max_pages=None, max_chars=None):
+        """Return cached text if it covers the requested page/character budget, else None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text, pages_read, complete, page_ends FROM pdf_texts WHERE content_sha = ?", (content_sha,)
+            ).fetchone()
+        if not row:
+            return None
+
+        text, pages_read, complete, page_ends = row
+        if max_pages is not None and pages_read > max_pages:
+            if not page_ends:
+                # Written before page offsets were kept: the page budget cannot be applied
+                return None
+            text = text[:json.loads(page_ends)[max_pages - 1]] if max_pages > 0 else ""
+            pages_read, complete = max_pages, False
+        enough_chars = max_chars is not None and len(text) >= max_chars
+        enough_pages = max_pages is not None and pages_read >= max_pages
+        if complete or enough_chars or enough_pages:
+            return text[:max_chars] if max_chars is not None else text
+        return None
+
+    def store(self, url: str, content_sha: str, etag=None, last_modified=None, text=None, page_ends=(), complete=False):
+        """Record the URL validators and, when given, the extracted text (keeping the longest extraction).
+
+        page_ends[i] is the offset in text where page i ends.
+        """
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pdf_urls (url, content_sha, etag, last_modified, checked_at) VALUES (?, ?, ?, ?, ?)",
+                (url, content_sha, etag, last_modified, time.time())
+            )
+            if text is not None:
+                self.conn.execute(
+                    "INSERT INTO pdf_texts (content_sha, text, pages_read, complete, page_ends) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(content_sha) DO UPDATE SET text = excluded.text, pages_read = excluded.pages_read, "
+                    "complete = excluded.complete, page_ends = excluded.page_ends "
+                    "WHERE length(excluded.text) > length(pdf_texts.text) "
+                    "OR excluded.complete > pdf_texts.complete OR pdf_texts.page_ends IS NULL",
+                    (content_sha, text, len(page_ends), int(complete), json.dumps(list(page_ends)))
+                )
+            self.conn.commit()
+
+    def touch(self, url: str):
+        """Mark a URL as revalidated (e.g. after a 304 Not Modified)"""
+        with self.lock:
+            self.conn.execute("UPDATE pdf_urls SET checked_at = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
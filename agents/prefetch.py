@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import span
+from topic_cache import TopicCache
+
+
+class CountMinSketch:
+    """Approximate counts per key in fixed memory (depth x width counters); estimates never undercount"""
+
+    def __init__(self, width=None, depth=None):
+        self.width = int(width or os.getenv("PREFETCH_SKETCH_WIDTH", "4096"))
+        self.depth = int(depth or os.getenv("PREFETCH_SKETCH_DEPTH", "4"))
+        self.table = np.zeros((self.depth, self.width), dtype=np.uint32)
+        self.rows = np.arange(self.depth)
+        self.lock = threading.Lock()
+
+    def _cells(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[8 * i:8 * i + 8], "little") % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Count key (conservative update) and return its new estimate"""
+        cells = self._cells(key)
+        with self.lock:
+            current = self.table[self.rows, cells]
+            estimate = int(current.min()) + count
+            self.table[self.rows, cells] = np.maximum(current, estimate)
+        return estimate
+
+    def estimate(self, key):
+        with self.lock:
+            return int(self.table[self.rows, self._cells(key)].min())
+
+    def decay(self):
+        """Halve every counter, so old popularity fades"""
+        with self.lock:
+            self.table >>= 1
+
+
+class TopK:
+    """The k keys with the highest estimates offered so far"""
+
+    def __init__(self, k):
+        self.k = k
+        self.counts = {}
+
+    def offer(self, key, estimate):
+        if key in self.counts or len(self.counts) < self.k:
+            self.counts[key] = estimate
+            return
+        lowest = min(self.counts, key=self.counts.get)
+        if estimate > self.counts[lowest]:
+            del self.counts[lowest]
+            self.counts[key] = estimate
+
+    def items(self):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+
+    def decay(self):
+        self.counts = {key: count // 2 for key, count in self.counts.items() if count // 2}
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class PrefetchScheduler:
+    """Tracks topic popularity and re-runs the search pipeline for hot topics while traffic is low.
+
+    Every search is counted in a count-min sketch; the most frequent topics form
+    the hot set. A background thread refreshes hot topics whose cached result is
+    missing or close to expiry, at most topics_per_minute of them, only while
+    user traffic is below offpeak_rpm, and backs off when upstreams fail. Runs
+    also hand their resources to the ingestion worker, so the index stays warm.
+    The hot set is saved to disk and warmed first thing after a restart.
+
+    With a shared queue (several server processes) searches are logged there
+    instead: every process reads the hot set and request rate of the whole
+    server from it, and only the index writer runs the background thread.
+    """
+
+    def __init__(self, orchestrator, path=None, shared=None):
+        self.orchestrator = orchestrator
+        self.shared = shared
+        self.last_search_id = 0
+        self.cache = orchestrator.topic_cache
+        self.sketch = CountMinSketch()
+        self.top = TopK(int(os.getenv("PREFETCH_TRACK_TOPICS", "500")))
+        self.hot_size = int(os.getenv("PREFETCH_HOT_TOPICS", "50"))
+        self.min_count = int(os.getenv("PREFETCH_MIN_COUNT", "3"))
+        self.interval = float(os.getenv("PREFETCH_INTERVAL_SECONDS", "60"))
+        self.topics_per_minute = float(os.getenv("PREFETCH_TOPICS_PER_MINUTE", "4"))
+        self.offpeak_rpm = float(os.getenv("PREFETCH_OFFPEAK_MAX_RPM", "30"))
+        # Refresh a cached topic once it is this far into its ttl
+        self.refresh_after = float(os.getenv("PREFETCH_REFRESH_FRACTION", "0.8"))
+        self.decay_every = float(os.getenv("PREFETCH_DECAY_SECONDS", "3600"))
+        if path is None:
+            path = os.getenv("PREFETCH_STATE_PATH", "./cache/hot_topics.json")
+        self.path = path
+
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.prefetched = {}
+        self.counts = {"searches": 0, "prefetch_hits": 0, "prefetches": 0, "prefetch_errors": 0, "skipped_busy": 0}
+        self.backoff = 1
+        self.last_prefetch = 0.0
+        self.last_decay = time.monotonic()
+        self.stopping = threading.Event()
+        self.thread = None
+        self._load()
+
+    def record(self, topic: str):
+        """Count a user search; call before the topic cache is consulted"""
+        key = TopicCache.normalize(topic)
+        if not key:
+            return
+        now = time.time()
+        age = self.cache.age(key)
+        if self.shared is not None:
+            self.shared.record_search(key)
+        else:
+            self._add(key)
+        with self.lock:
+            self.counts["searches"] += 1
+            # A hit: the entry about to be served is fresh and was written by a prefetch
+            prefetched_at = self.prefetched.get(key)
+            if prefetched_at is not None and age is not None and age < self.cache.ttl and now - age <= prefetched_at + 1:
+                self.counts["prefetch_hits"] += 1
+            if self.shared is None:
+                self.recent.append(now)
+
+    def _add(self, key):
+        estimate = self.sketch.add(key)
+        with self.lock:
+            self.top.offer(key, estimate)
+
+    def _read_shared(self):
+        """Count the searches other processes (and this one) logged since the last read"""
+        if self.shared is None:
+            return
+        with self.lock:
+            rows = self.shared.searches_since(self.last_search_id)
+            if rows:
+                self.last_search_id = rows[-1][0]
+        for _, key in rows:
+            self._add(key)
+
+    def hot(self):
+        """[(topic, estimated count)] of the hot set, most frequent first"""
+        self._read_shared()
+        with self.lock:
+            items = self.top.items()
+        return [(topic, count) for topic, count in items if count >= self.min_count][:self.hot_size]
+
+    def requests_per_minute(self):
+        if self.shared is not None:
+            return self.shared.searches_per_minute()
+        cutoff = time.time() - 60
+        with self.lock:
+            while self.recent and self.recent[0] < cutoff:
+                self.recent.popleft()
+            return len(self.recent)
+
+    def off_peak(self):
+        return self.requests_per_minute() < self.offpeak_rpm
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+                self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.save()
+
+    def _loop(self):
+        # Warm the hot set saved by the previous process, whatever the current load
+        self._pass(warm=True)
+        while not self.stopping.wait(self.interval * self.backoff):
+            if time.monotonic() - self.last_decay >= self.decay_every:
+                self.last_decay = time.monotonic()
+                self.sketch.decay()
+                with self.lock:
+                    self.top.decay()
+            self._pass()
+            self.save()
+
+    def _pass(self, warm=False):
+        for topic, _ in self.hot():
+            if not self._needs_refresh(topic):
+                continue
+            if not warm and not self._can_run():
+                self._count("skipped_busy")
+                return
+            # Space prefetches out to topics_per_minute; the rest waits for the next pass
+            wait = self.last_prefetch + 60 / self.topics_per_minute - time.monotonic()
+            if self.stopping.wait(max(0.0, wait)):
+                return
+            if not self._prefetch(topic):
+                return
+
+    def _can_run(self):
+        """Off-peak, and the ingestion worker is not backed up"""
+        ingestion = self.orchestrator.agents.peek("ingestion")
+        if ingestion is not None:
+            stats = ingestion.stats()
+            if stats["queue_depth"] > stats["queue_capacity"] // 2:
+                return False
+        return self.off_peak()
+
+    def _needs_refresh(self, topic):
+        age = self.cache.age(topic)
+        return age is None or age >= self.cache.ttl * self.refresh_after
+
+    def _prefetch(self, topic):
+        self.last_prefetch = time.monotonic()
+        with span("prefetch.run"):
+            result = self.orchestrator.run(topic)
+        if result.get("error") or result.get("partial"):
+            # Upstreams are failing or slow: stop this pass and wait longer before the next one
+            self._count("prefetch_errors")
+            self.backoff = min(self.backoff * 2, 8)
+            return False
+        self.cache.put(topic, result)
+        with self.lock:
+            self.prefetched[TopicCache.normalize(topic)] = time.time()
+            self.counts["prefetches"] += 1
+        self.backoff = 1
+        return True
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def save(self):
+        """Write the tracked topics and their counts so the next process starts with them"""
+        if not self.path:
+            return
+        with self.lock:
+            topics = [{"topic": topic, "count": count} for topic, count in self.top.items()]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"saved_at": time.time(), "topics": topics}, f)
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                topics = json.load(f).get("topics", [])
+        except (OSError, ValueError) as e:
+            print(f"Could not read hot topics from {self.path}: {e}")
+            return
+        for entry in topics:
+            estimate = self.sketch.add(entry["topic"], int(entry["count"]))
+            self.top.offer(entry["topic"], estimate)
+        print(f"✓ Loaded {len(topics)} tracked topics for prefetching")
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+            tracked = len(self.top)
+        return dict(
+            counts,
+            hit_ratio=round(counts["prefetch_hits"] / counts["searches"], 4) if counts["searches"] else 0.0,
+            tracked=tracked,
+            hot=len(self.hot()),
+            requests_per_minute=self.requests_per_minute(),
+            backoff=self.backoff,
+            running=int(bool(self.thread and self.thread.is_alive()))
+        )
+
+    def status(self):
+        """Stats plus the hot set with each topic's cache age and last prefetch time"""
+        with self.lock:
+            prefetched = dict(self.prefetched)
+        hot = []
+        for topic, count in self.hot():
+            age = self.cache.age(topic)
+            hot.append({"topic": topic, "count": count,
+                        "cache_age_seconds": round(age, 1) if age is not None else None,
+                        "prefetched_at": prefetched.get(topic)})
+        return dict(self.stats(), off_peak=self.off_peak(), hot_topics=hot)
@@ -1,10 +1,12 @@
-import ollama
+from llm_gateway import get_gateway
+from metrics import timed
 
 class QueryAgent:
     def __init__(self, model_name="llama3:instruct"):
         # Use Ollama model instead of HuggingFace
         self.model_name = model_name
 
+    @timed("query.refine")
     def process(self, topic: str) -> str:
         """Clean and normalize topic using LLaMA (Ollama)."""
         # Prompt for topic refinement
@@ -13,12 +15,8 @@ Refine and expand this learning topic to make it more specific and searchable: '
 
 Refined topic:
 """
-        # Call Ollama
-        response = ollama.chat(model=self.model_name, messages=[
-            {"role": "user", "content": prompt}
-        ])
-        
-        refined_text = response["message"]["content"].strip()
+        # Call Ollama through the shared gateway (concurrency limit, response cache)
+        refined_text = get_gateway().chat(prompt, self.model_name)
 
         # Extract the refined topic (everything after "Refined topic:")
         if "Refined topic:" in refined_text:
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import re
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+# arXiv ids in abs/pdf URLs, e.g. arxiv.org/pdf/1706.03762v5.pdf or arxiv.org/abs/cs/0112017
+_ARXIV_URL = re.compile(r"arxiv\.org/(?:abs|pdf)/([a-z\-\.]+/\d{7}|\d{4}\.\d{4,5})(?:v\d+)?(?:\.pdf)?$", re.IGNORECASE)
+_ARXIV_VERSION = re.compile(r"v\d+$")
+# Query parameters that never change which document a URL points to
+_TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "ref", "fbclid", "gclid"}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL: no scheme, lowercase host, no www/fragment/tracking params/trailing slash"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    query = {k: v for k, v in parse_qs(parts.query).items() if k.lower() not in _TRACKING_PARAMS}
+    normalized = host + path
+    if query:
+        normalized += "?" + urlencode(sorted(query.items()), doseq=True)
+    return normalized
+
+
+def arxiv_id_from_url(url: str):
+    """The version-less arXiv id of an arxiv.org abs/pdf URL, or None"""
+    match = _ARXIV_URL.search(normalize_url(url)) if url else None
+    return match.group(1).lower() if match else None
+
+
+def video_resource_id(video_id: str) -> str:
+    return f"video:{video_id}"
+
+
+def paper_resource_id(paper) -> str:
+    """Stable id for a paper: DOI, then arXiv id, then normalized URL, then title"""
+    doi = (paper.get("doi") or "").strip().lower()
+    if doi:
+        return f"doi:{doi}"
+
+    arxiv_id = paper.get("arxiv_id") or arxiv_id_from_url(paper.get("pdf_url") or paper.get("url") or "")
+    if arxiv_id:
+        return f"arxiv:{_ARXIV_VERSION.sub('', arxiv_id.strip().lower())}"
+
+    url = paper.get("pdf_url") or paper.get("url") or ""
+    if url:
+        return "url:" + hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()[:32]
+
+    title = " ".join((paper.get("title") or "").lower().split())
+    return "title:" + hashlib.sha256(title.encode("utf-8")).hexdigest()[:32]
+
+
+_STABLE_PREFIXES = ("video:", "doi:", "arxiv:", "url:", "title:")
+
+
+def is_stable_id(doc_id: str) -> bool:
+    """Whether a row id was built by video_resource_id/paper_resource_id (rather than a legacy uuid4)"""
+    return doc_id.startswith(_STABLE_PREFIXES)
+
+
+def resource_id_for_metadata(metadata) -> str | None:
+    """Derive the stable id of a stored row from its metadata (used to compact legacy uuid4 rows)"""
+    url = metadata.get("url") or ""
+    if metadata.get("type") == "video":
+        video_id = (parse_qs(urlsplit(url).query).get("v") or [None])[0]
+        return video_resource_id(video_id) if video_id else None
+    if metadata.get("type") == "pdf":
+        return paper_resource_id({"doi": metadata.get("doi"), "arxiv_id": metadata.get("arxiv_id"),
+                                  "pdf_url": url, "title": metadata.get("title")})
+    return None
+
+
+# Row bookkeeping that changes without the resource changing
+UNHASHED_METADATA = ("content_hash", "last_seen", "last_hit", "hit_count")
+
+
+def content_hash(text: str, metadata=None) -> str:
+    """Hash of a document's text and metadata, used to skip re-embedding unchanged resources"""
+    metadata = {k: v for k, v in (metadata or {}).items() if k not in UNHASHED_METADATA}
+    payload = text + "\0" + json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
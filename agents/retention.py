@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+
+from metrics import span
+
+DAY = 24 * 3600
+
+
+def retention_configured():
+    """Whether any retention policy is set; without one there is no job and no hit tracking"""
+    return any(float(os.getenv(name, "0") or 0) > 0
+               for name in ("RETENTION_MAX_AGE_DAYS", "RETENTION_MIN_HITS", "RETENTION_MAX_ROWS"))
+
+
+class RetentionJob:
+    """Keeps the vector store bounded: expires rows by age or hit count and caps the total row count.
+
+    Rows carry last_seen (last time their resource was fetched), and hit_count /
+    last_hit (how often and when it was returned by a search). A background
+    thread walks the collection one page at a time, pausing between pages, and
+    deletes whole resources whose last activity is older than max_age, that
+    were not seen for min_hits_grace and got fewer than min_hits hits, and,
+    once a pass is done, the least recently active resources beyond max_rows.
+    Each step also writes the agent's pending search hits into the rows.
+    Every policy is off (0) by default, and the job is only created once one is
+    set; only the index writer runs it.
+    """
+
+    def __init__(self, agent, max_age_days=None, min_hits=None, min_hits_grace_days=None, max_rows=None,
+                 page_size=None, interval=None, step_pause=None):
+        self.agent = agent
+        self.max_age = float(max_age_days or os.getenv("RETENTION_MAX_AGE_DAYS", "0")) * DAY
+        self.min_hits = int(min_hits or os.getenv("RETENTION_MIN_HITS", "0"))
+        self.min_hits_grace = float(min_hits_grace_days or os.getenv("RETENTION_MIN_HITS_GRACE_DAYS", "30")) * DAY
+        self.max_rows = int(max_rows or os.getenv("RETENTION_MAX_ROWS", "0"))
+        self.page_size = int(page_size or os.getenv("RETENTION_PAGE_SIZE", "500"))
+        self.interval = float(interval or os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+        self.step_pause = float(step_pause if step_pause is not None else os.getenv("RETENTION_STEP_SECONDS", "1"))
+
+        self.lock = threading.Lock()
+        self.counts = {"passes": 0, "scanned": 0, "backfilled": 0, "hit_rows_updated": 0,
+                       "deleted_age": 0, "deleted_hits": 0, "deleted_rows": 0}
+        self.last_pass = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.flush_hits()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_pass()
+            except Exception as e:
+                print(f"Retention pass failed: {e}")
+            # Between passes, keep writing search hits so they are not lost on shutdown
+            deadline = time.monotonic() + self.interval
+            while time.monotonic() < deadline:
+                if self.stopping.wait(min(60.0, self.interval)):
+                    return
+                self.flush_hits()
+
+    def flush_hits(self):
+        """Write the agent's pending search hits into the rows' metadata"""
+        hits = self.agent.take_hits()
+        if hits:
+            updated = self.agent.apply_hits(hits)
+            self._count("hit_rows_updated", updated)
+
+    def run_pass(self, dry_run=False):
+        """One sweep over the collection, page by page; returns a summary of what was (or would be) deleted"""
+        start = time.monotonic()
+        now = time.time()
+        deleted = {"age": 0, "hits": 0, "rows": 0}
+        # parent id -> [last activity, hit count, rows]; feeds the max_rows cut at the end
+        resources = {}
+        scanned = 0
+        offset = 0
+        while not self.stopping.is_set():
+            if not dry_run:
+                self.flush_hits()
+            with span("retention.step"):
+                page = self.agent.collection.get(include=["metadatas"], limit=self.page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                expired, backfill = [], []
+                for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                    metadata = metadata or {}
+                    if "last_seen" not in metadata:
+                        # Rows written before retention existed start ageing now
+                        backfill.append((doc_id, dict(metadata, last_seen=now)))
+                        metadata = backfill[-1][1]
+                    reason = self._expired(metadata, now)
+                    if reason:
+                        expired.append(doc_id)
+                        deleted[reason] += 1
+                        continue
+                    entry = resources.setdefault(metadata.get("parent_id", doc_id), [0.0, 0, 0])
+                    entry[0] = max(entry[0], metadata["last_seen"], metadata.get("last_hit", 0))
+                    entry[1] = max(entry[1], metadata.get("hit_count", 0))
+                    entry[2] += 1
+                scanned += len(page["ids"])
+                if not dry_run:
+                    if backfill:
+                        self.agent.collection.update(ids=[doc_id for doc_id, _ in backfill],
+                                                     metadatas=[metadata for _, metadata in backfill])
+                        self._count("backfilled", len(backfill))
+                    self.agent.delete(expired)
+                    # Deleted rows no longer occupy positions before the next page
+                    offset -= len(expired)
+                offset += len(page["ids"])
+            if self.stopping.wait(self.step_pause):
+                break
+
+        rows = sum(entry[2] for entry in resources.values())
+        if self.max_rows and rows > self.max_rows and not self.stopping.is_set():
+            # Evict whole resources, least recently active (then least hit) first
+            evict, excess = [], rows - self.max_rows
+            for parent_id, (_, _, parent_rows) in sorted(resources.items(), key=lambda item: item[1][:2]):
+                if excess <= 0:
+                    break
+                evict.append(parent_id)
+                excess -= parent_rows
+                deleted["rows"] += parent_rows
+            if not dry_run:
+                for i in range(0, len(evict), self.page_size):
+                    self.agent.delete_parents(evict[i:i + self.page_size])
+
+        summary = {"finished_at": time.time(), "seconds": round(time.monotonic() - start, 3), "scanned": scanned,
+                   "rows_left": rows - deleted["rows"], "deleted": deleted, "dry_run": dry_run}
+        if not dry_run:
+            with self.lock:
+                self.counts["passes"] += 1
+                self.counts["scanned"] += scanned
+                for reason, rows_deleted in deleted.items():
+                    self.counts["deleted_" + reason] += rows_deleted
+                self.last_pass = summary
+            if any(deleted.values()):
+                print(f"✓ Retention removed {sum(deleted.values())} rows ({deleted}), {summary['rows_left']} left")
+        return summary
+
+    def _expired(self, metadata, now):
+        """Why a row should go ("age" or "hits"), or None to keep it"""
+        last_seen = metadata["last_seen"]
+        if self.max_age and now - max(last_seen, metadata.get("last_hit", 0)) > self.max_age:
+            return "age"
+        if self.min_hits and now - last_seen > self.min_hits_grace and metadata.get("hit_count", 0) < self.min_hits:
+            return "hits"
+        return None
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+            last_pass = self.last_pass
+        return dict(
+            counts,
+            max_age_days=self.max_age / DAY,
+            min_hits=self.min_hits,
+            max_rows=self.max_rows,
+            last_pass_seconds=last_pass["seconds"] if last_pass else None,
+            rows=last_pass["rows_left"] if last_pass else None,
+            running=int(bool(self.thread and self.thread.is_alive()))
+        )
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SharedQueue:
+    """SQLite job queue shared by every worker process on the host.
+
+    Any process can put() a job; only the process holding the writer lock
+    claims and acknowledges them. Acknowledged results stay readable for
+    result_ttl seconds so the submitting process can resolve its tickets, and
+    every acknowledgement bumps a generation counter that readers use to
+    invalidate what they cached from the store. A log of recent searches gives
+    the writer's prefetch scheduler the traffic of every process.
+    """
+
+    def __init__(self, path=None, claim_timeout=None, result_ttl=None):
+        path = path or os.getenv("SHARED_QUEUE_PATH", "./cache/ingestion_queue.sqlite3")
+        # A claim older than this belonged to a writer that died mid-batch
+        self.claim_timeout = float(claim_timeout or os.getenv("SHARED_QUEUE_CLAIM_TIMEOUT_SECONDS", "300"))
+        self.result_ttl = float(result_ttl or os.getenv("SHARED_QUEUE_RESULT_TTL_SECONDS", "600"))
+        self.search_ttl = float(os.getenv("SHARED_QUEUE_SEARCH_TTL_SECONDS", "600"))
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                claimed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, written INTEGER NOT NULL, finished_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS searches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                searched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS searches_at ON searches (searched_at);
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+        """)
+        self.conn.commit()
+
+    def put(self, payload):
+        """Enqueue a JSON-serializable payload; returns its job id"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (payload, enqueued_at) VALUES (?, ?)", (json.dumps(payload), time.time())
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def claim(self, limit):
+        """Take up to limit unclaimed (or abandoned) jobs, oldest first; returns [(id, payload)]"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT id, payload FROM jobs WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                    (now - self.claim_timeout, limit)
+                ).fetchall()
+                self.conn.executemany("UPDATE jobs SET claimed_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return [(job_id, json.loads(payload)) for job_id, payload in rows]
+
+    def ack(self, job_id, written):
+        """Finish a job; written is the number of rows it wrote, or -1 if it failed"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.conn.execute("INSERT OR REPLACE INTO results (id, written, finished_at) VALUES (?, ?, ?)",
+                              (job_id, written, now))
+            self.conn.execute("DELETE FROM results WHERE finished_at < ?", (now - self.result_ttl,))
+            if written > 0:
+                self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            self.conn.commit()
+
+    def results(self, job_ids):
+        """{job id: written} for the given jobs that have finished"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, written FROM results WHERE id IN ({','.join('?' * len(job_ids))})", job_ids
+            ).fetchall()
+        return dict(rows)
+
+    def bump_generation(self):
+        """Make every reader reopen the store (e.g. after the writer switched collections)"""
+        with self.lock:
+            self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            self.conn.commit()
+
+    def generation(self):
+        """Incremented after every job that changed the store"""
+        with self.lock:
+            return self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def record_search(self, topic):
+        """Log a user search; searches older than search_ttl are dropped"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT INTO searches (topic, searched_at) VALUES (?, ?)", (topic, now))
+            self.conn.execute("DELETE FROM searches WHERE searched_at < ?", (now - self.search_ttl,))
+            self.conn.commit()
+
+    def searches_since(self, after_id):
+        """[(id, topic)] of logged searches after after_id, oldest first"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, topic FROM searches WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+
+    def searches_per_minute(self):
+        """Searches logged by all processes in the last minute"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM searches WHERE searched_at >= ?", (time.time() - 60,)
+            ).fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            depth, claimed = self.conn.execute(
+                "SELECT COUNT(*), COUNT(claimed_at) FROM jobs"
+            ).fetchone()
+            generation = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+        return {"depth": depth, "claimed": claimed, "generation": generation}
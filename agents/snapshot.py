@@ -0,0 +1,172 @@
+import json
+import os
+import time
+
+import numpy as np
+
+# Snapshot layout (a directory):
+#   manifest.json  collection name/metadata, row count, dim and the metadata columns
+#   vectors.npy    float32 [rows, dim], row i belongs to ids[i]
+#   metadata.npz   columnar ids, documents and metadata fields (no pickled objects)
+FORMAT_VERSION = 1
+
+
+def _encode_strings(values):
+    """UTF-8 bytes of all values back to back, plus int64 offsets (len(values) + 1)"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(data, offsets):
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _column_type(values):
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, bool) for value in present):
+        return "bool"
+    if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return "int"
+    if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return "float"
+    return "str"
+
+
+def _encode_metadata(metadatas):
+    """One column per metadata key: values plus a presence mask; returns (arrays, column specs)"""
+    keys = sorted({key for metadata in metadatas for key in metadata})
+    arrays, columns = {}, []
+    for i, key in enumerate(keys):
+        values = [metadata.get(key) for metadata in metadatas]
+        kind = _column_type(values)
+        arrays[f"m{i}_present"] = np.array([value is not None for value in values], dtype=bool)
+        if kind == "str":
+            arrays[f"m{i}_data"], arrays[f"m{i}_offsets"] = _encode_strings(
+                ["" if value is None else str(value) for value in values])
+        else:
+            dtype = {"bool": bool, "int": np.int64, "float": np.float64}[kind]
+            arrays[f"m{i}_values"] = np.array([0 if value is None else value for value in values], dtype=dtype)
+        columns.append({"name": key, "type": kind})
+    return arrays, columns
+
+
+def _decode_metadata(arrays, columns, rows):
+    metadatas = [{} for _ in range(rows)]
+    for i, column in enumerate(columns):
+        present = arrays[f"m{i}_present"]
+        if column["type"] == "str":
+            values = _decode_strings(arrays[f"m{i}_data"], arrays[f"m{i}_offsets"])
+        else:
+            values = arrays[f"m{i}_values"].tolist()
+        for row in np.flatnonzero(present):
+            metadatas[row][column["name"]] = values[row]
+    return metadatas
+
+
+def _truncate_rows(path, rows, dim):
+    """Shrink a float32 [n, dim] .npy file to its first rows"""
+    vectors = np.load(path, mmap_mode="r")
+    tmp = path + ".tmp.npy"
+    kept = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(rows, dim))
+    kept[:] = vectors[:rows]
+    kept.flush()
+    del kept, vectors
+    os.replace(tmp, path)
+
+
+def export_snapshot(collection, path, page_size=1000):
+    """Write every row of a collection to a snapshot directory; returns its manifest"""
+    start = time.perf_counter()
+    os.makedirs(path, exist_ok=True)
+    # The rows present now are exported by id, so concurrent writes cannot shift pages
+    all_ids = []
+    while True:
+        page = collection.get(include=[], limit=page_size, offset=len(all_ids))
+        if not len(page["ids"]):
+            break
+        all_ids += page["ids"]
+    all_ids = list(dict.fromkeys(all_ids))
+    total = len(all_ids)
+    metadata = collection.metadata or {}
+    dim = metadata.get("embedding_dim")
+    if dim is None:
+        sample = collection.get(include=["embeddings"], limit=1)
+        dim = len(sample["embeddings"][0]) if len(sample["ids"]) else 0
+
+    # Vectors go straight to disk page by page; only ids, texts and metadata are held in memory
+    vectors = np.lib.format.open_memmap(os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float32,
+                                        shape=(total, dim))
+    ids, documents, metadatas = [], [], []
+    offset = 0
+    for batch_start in range(0, total, page_size):
+        # Rows deleted since the id list was read are simply missing from the page
+        page = collection.get(ids=all_ids[batch_start:batch_start + page_size],
+                              include=["embeddings", "documents", "metadatas"])
+        rows = len(page["ids"])
+        if not rows:
+            continue
+        vectors[offset:offset + rows] = np.asarray(page["embeddings"], dtype=np.float32)
+        ids += page["ids"]
+        documents += [document or "" for document in page["documents"]]
+        metadatas += [row_metadata or {} for row_metadata in page["metadatas"]]
+        offset += rows
+    vectors.flush()
+    del vectors
+    if offset < total:
+        _truncate_rows(os.path.join(path, "vectors.npy"), offset, dim)
+
+    arrays, columns = _encode_metadata(metadatas)
+    arrays["ids_data"], arrays["ids_offsets"] = _encode_strings(ids)
+    arrays["documents_data"], arrays["documents_offsets"] = _encode_strings(documents)
+    np.savez(os.path.join(path, "metadata.npz"), **arrays)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "collection": collection.name,
+        "collection_metadata": metadata,
+        # Rows added after the export started are not included, nor rows deleted before their batch was read
+        "rows": offset,
+        "dim": dim,
+        "columns": columns,
+        "exported_at": time.time(),
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_snapshot(client, path, replace=False, batch_size=5000):
+    """Create a snapshot's collection in a Chroma client and bulk-add its rows; returns (collection, manifest)"""
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"unsupported snapshot format {manifest.get('format')}")
+
+    name = manifest["collection"]
+    existing = [getattr(c, "name", c) for c in client.list_collections()]
+    if name in existing:
+        if client.get_collection(name).count() and not replace:
+            raise RuntimeError(f"collection {name} already has rows (use --replace to overwrite it)")
+        client.delete_collection(name)
+    collection = client.create_collection(name, metadata=manifest["collection_metadata"] or None)
+
+    rows = manifest["rows"]
+    vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    with np.load(os.path.join(path, "metadata.npz")) as arrays:
+        ids = _decode_strings(arrays["ids_data"], arrays["ids_offsets"])
+        documents = _decode_strings(arrays["documents_data"], arrays["documents_offsets"])
+        metadatas = _decode_metadata(arrays, manifest["columns"], rows)
+
+    # Vectors are stored already computed: no embedding model is involved
+    max_batch = getattr(client, "get_max_batch_size", lambda: batch_size)()
+    batch_size = max(1, min(batch_size, max_batch))
+    for start in range(0, rows, batch_size):
+        end = min(start + batch_size, rows)
+        collection.add(ids=ids[start:end], embeddings=np.asarray(vectors[start:end]).tolist(),
+                       documents=documents[start:end],
+                       metadatas=[metadata or None for metadata in metadatas[start:end]])
+    return collection, manifest
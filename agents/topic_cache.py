@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from lru import LRUCache
+
+class TopicCache:
+    """Result cache for /api/search keyed by normalized topic.
+
+    Fresh entries (younger than ttl) are served directly. Stale entries (up to
+    ttl + stale_ttl) are served immediately while one background refresh runs.
+    Concurrent misses for the same topic share a single upstream fetch.
+    """
+
+    def __init__(self, ttl=None, stale_ttl=None, max_entries=None, path=None):
+        self.ttl = float(ttl or os.getenv("TOPIC_CACHE_TTL_SECONDS", "900"))
+        self.stale_ttl = float(stale_ttl or os.getenv("TOPIC_CACHE_STALE_SECONDS", "3600"))
+        self.memory = LRUCache(max_entries or os.getenv("TOPIC_CACHE_MAX_ENTRIES", "512"))
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.counts = {"fresh": 0, "stale": 0, "miss": 0, "coalesced": 0, "refreshes": 0}
+
+        if path is None:
+            path = os.getenv("TOPIC_CACHE_PATH", "./cache/topics.sqlite3")
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS topics (key TEXT PRIMARY KEY, result TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    @staticmethod
+    def normalize(topic: str) -> str:
+        return " ".join(topic.lower().split())
+
+    def get(self, topic: str, compute=None):
+        """Return a fresh or stale cached result, or None; stale hits start a refresh when compute is given"""
+        key = self.normalize(topic)
+        entry = self._lookup(key)
+        if not entry:
+            return None
+
+        result, stored_at = entry
+        age = time.time() - stored_at
+        if age < self.ttl:
+            self._count("fresh")
+            return result
+        if age < self.ttl + self.stale_ttl:
+            self._count("stale")
+            if compute:
+                self._refresh_in_background(key, topic, compute)
+            return result
+        return None
+
+    def get_or_compute(self, topic: str, compute):
+        """Return the cached result for topic, calling compute(topic) on a miss"""
+        result = self.get(topic, compute)
+        if result is not None:
+            return result
+
+        key = self.normalize(topic)
+        self._count("miss")
+        future, leader = self._join(key)
+        if leader:
+            self._compute(key, topic, compute, future)
+        else:
+            self._count("coalesced")
+        return future.result()
+
+    def put(self, topic: str, result):
+        """Store a result computed outside get_or_compute (e.g. by the prefetcher)"""
+        self._store(self.normalize(topic), result)
+
+    def begin(self, topic: str):
+        """Register a miss computed outside get_or_compute (e.g. by the streaming endpoint).
+
+        Returns (future, leader). The leader computes the result and passes it to
+        finish(); everyone else waits on the future, as get_or_compute callers do.
+        """
+        self._count("miss")
+        future, leader = self._join(self.normalize(topic))
+        if not leader:
+            self._count("coalesced")
+        return future, leader
+
+    def finish(self, topic: str, future, result=None, error=None):
+        """Store the leader's result (or error) and release everyone waiting on it"""
+        self._settle(self.normalize(topic), future, result, error)
+
+    def age(self, topic: str):
+        """Seconds since topic's result was stored, or None if it is not cached"""
+        entry = self._lookup(self.normalize(topic))
+        return time.time() - entry[1] if entry else None
+
+    def invalidate(self, topic: str):
+        key = self.normalize(topic)
+        self.memory.pop(key)
+        if self.conn:
+            with self.lock:
+                self.conn.execute("DELETE FROM topics WHERE key = ?", (key,))
+                self.conn.commit()
+
+    def stats(self):
+        return dict(self.counts, entries=len(self.memory), inflight=len(self.inflight),
+                    ttl=self.ttl, stale_ttl=self.stale_ttl)
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _join(self, key):
+        """Return (future, is_leader); only the leader runs the upstream fetch"""
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self.inflight[key] = future
+            return future, True
+
+    def _refresh_in_background(self, key, topic, compute):
+        future, leader = self._join(key)
+        if leader:
+            self._count("refreshes")
+            threading.Thread(
+                target=self._compute, args=(key, topic, compute, future),
+                name=f"topic-refresh-{key[:32]}", daemon=True
+            ).start()
+
+    def _compute(self, key, topic, compute, future):
+        try:
+            result = compute(topic)
+        except Exception as e:
+            print(f"Topic cache refresh error for '{key}': {e}")
+            self._settle(key, future, error=e)
+        else:
+            self._settle(key, future, result)
+
+    def _settle(self, key, future, result=None, error=None):
+        try:
+            if error is None:
+                self._store(key, result)
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _lookup(self, key):
+        entry = self.memory.get(key)
+        if entry is not None or not self.conn:
+            return entry
+        with self.lock:
+            row = self.conn.execute("SELECT result, stored_at FROM topics WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        self.memory.put(key, entry)
+        return entry
+
+    def _store(self, key, result):
+        if result.get("error"):
+            return
+        stored_at = time.time()
+        if result.get("partial"):
+            # Serve partial results but refresh them on the next request
+            stored_at -= self.ttl
+        self.memory.put(key, (result, stored_at))
+        if self.conn:
+            with self.lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO topics (key, result, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(result), stored_at)
+                )
+                self.conn.commit()
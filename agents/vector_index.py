@@ -0,0 +1,321 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+class VectorIndex:
+    """In-process top-k index over L2-normalized float32 embeddings.
+
+    Vectors live in one contiguous memory-mapped file (vectors.f32) that grows by
+    doubling; ids and metadata live in a small SQLite sidecar. Queries are a
+    single matrix-vector product plus argpartition. In "ivf" mode a k-means
+    coarse quantizer restricts the scan to the nprobe closest lists.
+    Distances use the same space as the Chroma collection: "cosine"
+    (1 - cosine similarity) or "l2" (squared euclidean, from the stored norms).
+    """
+
+    def __init__(self, path, space="cosine", mode=None, nlist=None, nprobe=None, ivf_min_rows=None):
+        if space not in ("cosine", "l2"):
+            raise ValueError(f"Unsupported distance space: {space}")
+        self.path = path
+        self.space = space
+        self.mode = mode or os.getenv("VECTOR_INDEX_MODE", "exact")
+        self.nlist = int(nlist or os.getenv("VECTOR_INDEX_NLIST", "0"))
+        self.nprobe = int(nprobe or os.getenv("VECTOR_INDEX_NPROBE", "8"))
+        self.ivf_min_rows = int(ivf_min_rows or os.getenv("VECTOR_INDEX_IVF_MIN_ROWS", "50000"))
+        os.makedirs(path, exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.dim = None
+        self.capacity = 0
+        self.size = 0
+        self.vectors = None
+        self.ids = []
+        self.metadatas = []
+        self.rows = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.free_rows = []
+        self._columns = {}
+        self.centroids = None
+        self.assignments = None
+        self.trained_size = 0
+
+        self.db = sqlite3.connect(os.path.join(path, "rows.sqlite3"), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, id TEXT UNIQUE, metadata TEXT, "
+                        "norm REAL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        if "norm" not in [row[1] for row in self.db.execute("PRAGMA table_info(rows)")]:
+            self.db.execute("ALTER TABLE rows ADD COLUMN norm REAL")
+        self.db.commit()
+        self._load()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def doc_ids(self):
+        with self.lock:
+            return set(self.rows)
+
+    @property
+    def pending(self):
+        """True if a write to the store was announced by begin_write() but never reached the index"""
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM info WHERE key = 'pending'").fetchone() is not None
+
+    def begin_write(self):
+        """Call before writing the same rows to the store; the next upsert or remove clears it"""
+        with self.lock:
+            self._set_info("pending", 1)
+            self.db.commit()
+
+    def upsert(self, ids, embeddings, metadatas=None):
+        """Insert or replace vectors by id"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or not len(ids):
+            return
+        norms = np.linalg.norm(embeddings, axis=-1)
+        embeddings = self._normalize(embeddings)
+        metadatas = metadatas or [{}] * len(ids)
+        with self.lock:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+                self._set_info("dim", self.dim)
+            if embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match index dimension {self.dim}")
+
+            new_rows = sum(1 for doc_id in ids if doc_id not in self.rows)
+            self._reserve(self.size + max(0, new_rows - len(self.free_rows)))
+
+            rows = []
+            for doc_id, metadata in zip(ids, metadatas):
+                row = self.rows.get(doc_id)
+                if row is None:
+                    row = self.free_rows.pop() if self.free_rows else self._append_row()
+                    self.rows[doc_id] = row
+                self.ids[row] = doc_id
+                self.metadatas[row] = metadata or {}
+                self.alive[row] = True
+                rows.append(row)
+
+            rows = np.asarray(rows)
+            self.vectors[rows] = embeddings
+            self.vectors.flush()
+            self.norms[rows] = norms
+            if self.centroids is not None:
+                self.assignments[rows] = self._assign(embeddings)
+            self._columns.clear()
+
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rows (row, id, metadata, norm) VALUES (?, ?, ?, ?)",
+                [(int(row), doc_id, json.dumps(metadata or {}), float(norm))
+                 for row, doc_id, metadata, norm in zip(rows, ids, metadatas, norms)]
+            )
+            self._set_info("size", self.size)
+            self.db.execute("DELETE FROM info WHERE key = 'pending'")
+            self.db.commit()
+            self._maybe_train()
+
+    def remove(self, ids):
+        """Delete vectors by id; their rows are reused by later inserts"""
+        with self.lock:
+            removed = [self.rows.pop(doc_id) for doc_id in ids if doc_id in self.rows]
+            self.db.execute("DELETE FROM info WHERE key = 'pending'")
+            if not removed:
+                self.db.commit()
+                return
+            for row in removed:
+                self.alive[row] = False
+                self.ids[row] = None
+                self.metadatas[row] = {}
+            self.free_rows.extend(removed)
+            self._columns.clear()
+            self.db.executemany("DELETE FROM rows WHERE row = ?", [(int(row),) for row in removed])
+            self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.remove(list(self.rows))
+
+    def search(self, query_embedding, k=10, where=None):
+        """Return [(id, distance, metadata)] for the k nearest live vectors matching the where filter"""
+        with self.lock:
+            if not self.rows:
+                return []
+            query = self._normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+
+            mask = self.alive[:self.size].copy()
+            if where:
+                mask &= self._filter_mask(where)
+            if self.centroids is not None and self.mode == "ivf":
+                probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+                mask &= np.isin(self.assignments[:self.size], probes)
+
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return []
+            everything = len(candidates) == self.size
+            scores = self.vectors[:self.size] @ query if everything else self.vectors[candidates] @ query
+            if self.space == "l2":
+                # |a - b|^2 = |a|^2 + |b|^2 - 2 |a| |b| cos(a, b), as Chroma's l2 space reports it
+                norms = self.norms[:self.size] if everything else self.norms[candidates]
+                query_norm = float(np.linalg.norm(query_embedding))
+                distances = norms * norms + query_norm * query_norm - 2 * norms * query_norm * scores
+            else:
+                distances = 1.0 - scores
+
+            k = min(k, len(candidates))
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.argsort(distances[top])]
+            rows = top if everything else candidates[top]
+            return [(self.ids[row], float(distances[i]), self.metadatas[row]) for i, row in zip(top, rows)]
+
+    def stats(self):
+        return {"rows": len(self.rows), "capacity": self.capacity, "dim": self.dim, "mode": self.mode,
+                "space": self.space,
+                "lists": 0 if self.centroids is None else len(self.centroids)}
+
+    def _filter_mask(self, where):
+        """Vectorized evaluation of a Chroma-style where filter over the metadata columns"""
+        if "$and" in where:
+            mask = np.ones(self.size, dtype=bool)
+            for clause in where["$and"]:
+                mask &= self._filter_mask(clause)
+            return mask
+        if "$or" in where:
+            mask = np.zeros(self.size, dtype=bool)
+            for clause in where["$or"]:
+                mask |= self._filter_mask(clause)
+            return mask
+
+        mask = np.ones(self.size, dtype=bool)
+        for field, condition in where.items():
+            column = self._column(field)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                if op == "$eq":
+                    mask &= column == value
+                elif op == "$ne":
+                    mask &= column != value
+                elif op == "$in":
+                    mask &= np.isin(column, list(value))
+                elif op == "$nin":
+                    mask &= ~np.isin(column, list(value))
+                elif op in ("$gt", "$gte", "$lt", "$lte"):
+                    numeric = np.array([v if isinstance(v, (int, float)) else np.nan for v in column], dtype=float)
+                    with np.errstate(invalid="ignore"):
+                        mask &= {"$gt": numeric > value, "$gte": numeric >= value,
+                                 "$lt": numeric < value, "$lte": numeric <= value}[op]
+                else:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    def _column(self, field):
+        column = self._columns.get(field)
+        if column is None:
+            column = np.empty(self.size, dtype=object)
+            column[:] = [metadata.get(field) for metadata in self.metadatas[:self.size]]
+            self._columns[field] = column
+        return column
+
+    def _maybe_train(self):
+        """(Re)build the IVF quantizer once the index is large enough or has doubled since training"""
+        if self.mode != "ivf" or len(self.rows) < self.ivf_min_rows or len(self.rows) < 2 * self.trained_size:
+            return
+        live = np.flatnonzero(self.alive[:self.size])
+        nlist = self.nlist or max(1, int(np.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+        sample = self.vectors[rng.choice(live, size=min(len(live), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(10):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+
+        self.centroids = centroids
+        self.assignments = np.zeros(self.capacity, dtype=np.int32)
+        for start in range(0, self.size, 65536):
+            stop = min(start + 65536, self.size)
+            self.assignments[start:stop] = self._assign(self.vectors[start:stop])
+        self.trained_size = len(self.rows)
+        print(f"Vector index trained {nlist} IVF lists over {len(live)} vectors")
+
+    def _assign(self, embeddings):
+        return np.argmax(embeddings @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _append_row(self):
+        row = self.size
+        self.size += 1
+        return row
+
+    def _reserve(self, rows):
+        """Grow the memory-mapped matrix (by doubling) so it can hold at least rows vectors"""
+        if rows <= self.capacity:
+            return
+        capacity = max(1024, self.capacity)
+        while capacity < rows:
+            capacity *= 2
+        vectors = np.memmap(self._vectors_path(".tmp"), dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        if self.vectors is not None:
+            vectors[:self.size] = self.vectors[:self.size]
+            del self.vectors
+        vectors.flush()
+        del vectors
+        os.replace(self._vectors_path(".tmp"), self._vectors_path())
+        self.vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        self.norms = np.concatenate([self.norms, np.zeros(capacity - len(self.norms), dtype=np.float32)])
+        self.ids.extend([None] * (capacity - len(self.ids)))
+        self.metadatas.extend([{}] * (capacity - len(self.metadatas)))
+        if self.assignments is not None:
+            self.assignments = np.concatenate([self.assignments, np.zeros(capacity - len(self.assignments), dtype=np.int32)])
+        self.capacity = capacity
+        self._set_info("capacity", capacity)
+
+    def _load(self):
+        info = dict(self.db.execute("SELECT key, value FROM info").fetchall())
+        # Indexes written before the space was recorded were cosine and kept no norms
+        if "dim" in info and info.get("space", "cosine") != self.space:
+            print(f"Vector index at {self.path} used the {info.get('space', 'cosine')} space, starting empty")
+            self.db.execute("DELETE FROM rows")
+            self.db.execute("DELETE FROM info")
+            info = {}
+        self._set_info("space", self.space)
+        self.db.commit()
+        if "dim" not in info or not os.path.exists(self._vectors_path()):
+            return
+        self.dim = int(info["dim"])
+        self.capacity = int(info.get("capacity", 0))
+        self.size = int(info.get("size", 0))
+        self.vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.norms = np.zeros(self.capacity, dtype=np.float32)
+        self.ids = [None] * self.capacity
+        self.metadatas = [{}] * self.capacity
+        for row, doc_id, metadata, norm in self.db.execute("SELECT row, id, metadata, norm FROM rows"):
+            self.ids[row] = doc_id
+            self.metadatas[row] = json.loads(metadata)
+            self.norms[row] = norm or 0.0
+            self.alive[row] = True
+            self.rows[doc_id] = row
+        self.free_rows = [row for row in range(self.size) if not self.alive[row]]
+        self._maybe_train()
+
+    def _set_info(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _vectors_path(self, suffix=""):
+        return os.path.join(self.path, "vectors.f32" + suffix)
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
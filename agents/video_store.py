@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# videos().list parts, each with its own freshness window: titles rarely change, counts do, durations never
+PARTS = ("snippet", "statistics", "contentDetails")
+
+
+class VideoStore:
+    """Local YouTube metadata keyed by videoId, plus a search query -> videoIds cache.
+
+    Each part of a video (snippet, statistics, contentDetails) is stored with the
+    time it was fetched, so callers only refresh the parts that went stale. Ids
+    the API no longer returns are stored empty, so deleted videos are not looked
+    up again on every request.
+    """
+
+    def __init__(self, path=None, ttls=None, search_ttl=None):
+        if path is None:
+            path = os.getenv("VIDEO_STORE_PATH", "./cache/videos.sqlite3")
+        path = path or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.ttls = ttls or {
+            "snippet": float(os.getenv("VIDEO_SNIPPET_TTL_SECONDS", str(7 * 24 * 3600))),
+            "statistics": float(os.getenv("VIDEO_STATS_TTL_SECONDS", str(6 * 3600))),
+            "contentDetails": float(os.getenv("VIDEO_DETAILS_TTL_SECONDS", str(30 * 24 * 3600)))
+        }
+        self.search_ttl = float(search_ttl or os.getenv("VIDEO_SEARCH_TTL_SECONDS", str(24 * 3600)))
+        self.counts = {"search_hits": 0, "search_misses": 0, "fresh": 0, "stale": 0, "missing": 0}
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS videos (id TEXT PRIMARY KEY, "
+            + ", ".join(f"{part} TEXT, {part}_at REAL" for part in PARTS) + ")"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, video_ids TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def search_key(query: str, max_results: int) -> str:
+        return f"{' '.join(query.lower().split())}|{max_results}"
+
+    def get_search(self, query: str, max_results: int):
+        """Video ids of a fresh cached search, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT video_ids, stored_at FROM searches WHERE key = ?", (self.search_key(query, max_results),)
+            ).fetchone()
+            fresh = row is not None and time.time() - row[1] < self.search_ttl
+            self.counts["search_hits" if fresh else "search_misses"] += 1
+        return json.loads(row[0]) if fresh else None
+
+    def put_search(self, query: str, max_results: int, video_ids):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO searches (key, video_ids, stored_at) VALUES (?, ?, ?)",
+                (self.search_key(query, max_results), json.dumps(video_ids), time.time())
+            )
+            self.conn.commit()
+
+    def get_many(self, video_ids):
+        """{id: {part: data or None, part + "_at": fetched_at}} for every stored id"""
+        video_ids = list(video_ids)
+        if not video_ids:
+            return {}
+        columns = ", ".join(f"{part}, {part}_at" for part in PARTS)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, {columns} FROM videos WHERE id IN ({','.join('?' * len(video_ids))})", video_ids
+            ).fetchall()
+
+        records = {}
+        for row in rows:
+            record = {}
+            for i, part in enumerate(PARTS):
+                data, fetched_at = row[1 + 2 * i], row[2 + 2 * i]
+                record[part] = json.loads(data) if data else None
+                record[part + "_at"] = fetched_at
+            records[row[0]] = record
+        return records
+
+    def stale_parts(self, records, video_ids, parts=PARTS):
+        """{id: [parts to refetch]} for ids that are unknown or have a part older than its ttl"""
+        now = time.time()
+        stale = {}
+        for video_id in video_ids:
+            record = records.get(video_id)
+            if record is None:
+                stale[video_id] = list(parts)
+                continue
+            expired = [part for part in parts
+                       if record[part + "_at"] is None or now - record[part + "_at"] >= self.ttls[part]]
+            if expired:
+                stale[video_id] = expired
+        with self.lock:
+            self.counts["missing"] += sum(1 for video_id in stale if video_id not in records)
+            self.counts["stale"] += sum(1 for video_id in stale if video_id in records)
+            self.counts["fresh"] += len(video_ids) - len(stale)
+        return stale
+
+    def put_items(self, items, parts, requested_ids):
+        """Store the given parts of videos().list items; requested ids without an item are stored empty"""
+        now = time.time()
+        found = {item["id"]: item for item in items}
+        assignments = ", ".join(f"{part} = excluded.{part}, {part}_at = excluded.{part}_at" for part in parts)
+        columns = ", ".join(f"{part}, {part}_at" for part in parts)
+        rows = []
+        for video_id in requested_ids:
+            item = found.get(video_id)
+            row = [video_id]
+            for part in parts:
+                data = item.get(part) if item else None
+                row += [json.dumps(data) if data is not None else None, now]
+            rows.append(row)
+        with self.lock:
+            self.conn.executemany(
+                f"INSERT INTO videos (id, {columns}) VALUES ({','.join('?' * (1 + 2 * len(parts)))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {assignments}",
+                rows
+            )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            (videos,) = self.conn.execute("SELECT COUNT(*) FROM videos").fetchone()
+            (searches,) = self.conn.execute("SELECT COUNT(*) FROM searches").fetchone()
+            return dict(self.counts, videos=videos, searches=searches)
@@ -1,60 +1,198 @@
 from googleapiclient.discovery import build
 import os
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import timed, count
+from video_store import VideoStore, PARTS
+
+# API quota cost per call (units); the default daily quota is 10,000
+QUOTA_COST = {"search.list": 100, "videos.list": 1}
+
+
+class VideoDetailBatcher:
+    """Coalesces videos().list lookups from concurrent requests into calls of up to 50 ids.
+
+    A few sender threads make the calls. While one is idle an id is sent right
+    away; ids that arrive while every sender is busy go out together in the next
+    call, which asks for the union of the parts its ids need. The API client's
+    httplib2 transport is not thread-safe, so each sender builds its own
+    service with service_factory.
+    """
+
+    MAX_IDS = 50
+
+    def __init__(self, service_factory, store, senders=None):
+        self.service_factory = service_factory
+        self.store = store
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.counts = {"calls": 0, "ids": 0, "coalesced": 0}
+        self.threads = [
+            threading.Thread(target=self._loop, name=f"youtube-details-{i}", daemon=True)
+            for i in range(int(senders or os.getenv("YOUTUBE_DETAIL_SENDERS", "4")))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def refresh(self, stale):
+        """Queue {id: parts} for fetching into the store; returns futures that resolve once their call finished"""
+        futures = []
+        with self.ready:
+            for video_id, parts in stale.items():
+                entry = self.pending.get(video_id)
+                if entry is not None:
+                    entry[0].update(parts)
+                    self.counts["coalesced"] += 1
+                else:
+                    entry = self.pending[video_id] = (set(parts), Future())
+                futures.append(entry[1])
+            self.ready.notify()
+        return futures
+
+    def _loop(self):
+        service = None
+        while True:
+            with self.ready:
+                while not self.pending:
+                    self.ready.wait()
+                ids = list(self.pending)[:self.MAX_IDS]
+                batch = {video_id: self.pending.pop(video_id) for video_id in ids}
+            try:
+                service = service or self.service_factory()
+            except Exception as e:
+                self._resolve(batch, e)
+                continue
+            self._send(service, batch)
+
+    def _send(self, service, batch):
+        ids = list(batch)
+        parts = [part for part in PARTS if any(part in batch[video_id][0] for video_id in ids)]
+        try:
+            response = service.videos().list(part=",".join(parts), id=",".join(ids),
+                                                  maxResults=self.MAX_IDS).execute()
+            count("youtube_quota_units_total", QUOTA_COST["videos.list"], method="videos.list")
+            self.store.put_items(response.get("items", []), parts, ids)
+            error = None
+        except Exception as e:
+            error = e
+        with self.lock:
+            self.counts["calls"] += 1
+            self.counts["ids"] += len(ids)
+        self._resolve(batch, error)
+
+    @staticmethod
+    def _resolve(batch, error):
+        for _, future in batch.values():
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, ids_per_call=round(self.counts["ids"] / self.counts["calls"], 2)
+                        if self.counts["calls"] else 0.0)
+
 
 class YouTubeAgent:
-    def __init__(self, api_key: str | None = None):
-        self.api_key = api_key or os.getenv("YOUTUBE_API_KEY")
-        if not self.api_key:
-            raise ValueError("Missing YouTube API key. Provide via parameter or YOUTUBE_API_KEY env var.")
-        self.service = build("youtube", "v3", developerKey=self.api_key)
+    def __init__(self, api_key: str | None = None, service=None, store=None):
+        # An already-built service (e.g. a local stand-in) skips the API key check and is shared by all threads
+        if service is None:
+            self.api_key = api_key or os.getenv("YOUTUBE_API_KEY")
+            if not self.api_key:
+                raise ValueError("Missing YouTube API key. Provide via parameter or YOUTUBE_API_KEY env var.")
+            self.service_factory = lambda: build("youtube", "v3", developerKey=self.api_key)
+        else:
+            self.service_factory = lambda: service
+        # googleapiclient services are not thread-safe: each thread gets its own
+        self.local = threading.local()
+        self.service = self.service_factory()
+        self.local.service = self.service
+        self.details_timeout = float(os.getenv("YOUTUBE_DETAIL_TIMEOUT_SECONDS", "10"))
 
+        # Video details and search results are kept locally; only stale parts go back to the API
+        self.store = store or VideoStore()
+        self.batcher = VideoDetailBatcher(self.service_factory, self.store)
+
+    def _thread_service(self):
+        service = getattr(self.local, "service", None)
+        if service is None:
+            service = self.local.service = self.service_factory()
+        return service
+
+    @timed("youtube.fetch")
     def fetch(self, query: str, max_results: int = 10):
         """Fetch best educational videos sorted by view count and relevance"""
-        # Add educational keywords to get tutorial/teaching videos
-        educational_query = f"{query} tutorial OR {query} explained OR {query} course OR {query} lecture"
-        
-        # Search for videos with relevance and view count ordering
-        req = self.service.search().list(
-            q=educational_query,
-            part="snippet",
-            type="video",
-            maxResults=max_results * 2,  # Get more to filter
-            order="viewCount",  # Sort by most viewed
-            videoDuration="medium",  # Prefer medium/long videos (better content)
-            relevanceLanguage="en"
-        )
-        resp = req.execute()
-        
-        video_ids = [item["id"]["videoId"] for item in resp.get("items", [])]
-        
+        video_ids = self.store.get_search(query, max_results * 2)
+        if video_ids is None:
+            video_ids = self._search(query, max_results)
+            self.store.put_search(query, max_results * 2, video_ids)
+
         if not video_ids:
             return []
-        
-        # Get detailed video statistics
-        stats_req = self.service.videos().list(
-            part="snippet,statistics,contentDetails",
-            id=",".join(video_ids)
-        )
-        stats_resp = stats_req.execute()
-        
+
+        # Refresh stale or unknown details, batched with concurrent requests
+        records = self.store.get_many(video_ids)
+        stale = self.store.stale_parts(records, video_ids)
+        if stale:
+            deadline = time.monotonic() + self.details_timeout
+            try:
+                for future in self.batcher.refresh(stale):
+                    future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                # Serve what we have (possibly stale) rather than nothing
+                if not records:
+                    raise
+                print(f"YouTube details refresh failed, serving stored data: {e}")
+            records = self.store.get_many(video_ids)
+
         videos = []
-        for item in stats_resp.get("items", []):
-            stats = item.get("statistics", {})
-            snippet = item.get("snippet", {})
-            
+        for video_id in video_ids:
+            record = records.get(video_id)
+            if not record or record["snippet"] is None:
+                continue
+            stats = record["statistics"] or {}
+            snippet = record["snippet"]
+
             videos.append({
-                "id": item["id"],
+                "id": video_id,
                 "title": snippet.get("title", ""),
-                "url": f"https://www.youtube.com/watch?v={item['id']}",
+                "url": f"https://www.youtube.com/watch?v={video_id}",
                 "description": snippet.get("description", ""),
                 "channel": snippet.get("channelTitle", ""),
                 "viewCount": int(stats.get("viewCount", 0)),
                 "likeCount": int(stats.get("likeCount", 0)),
-                "duration": item.get("contentDetails", {}).get("duration", "")
+                "duration": (record["contentDetails"] or {}).get("duration", "")
             })
-        
+
         # Sort by view count (already sorted, but ensure it)
         videos.sort(key=lambda x: x["viewCount"], reverse=True)
-        
+
         # Return top max_results
-        return videos[:max_results]
\ No newline at end of file
+        return videos[:max_results]
+
+    def _search(self, query: str, max_results: int):
+        """Video ids for a topic from search().list"""
+        # Add educational keywords to get tutorial/teaching videos
+        educational_query = f"{query} tutorial OR {query} explained OR {query} course OR {query} lecture"
+
+        # Search for videos with relevance and view count ordering
+        req = self._thread_service().search().list(
+            q=educational_query,
+            part="snippet",
+            type="video",
+            maxResults=max_results * 2,  # Get more to filter
+            order="viewCount",  # Sort by most viewed
+            videoDuration="medium",  # Prefer medium/long videos (better content)
+            relevanceLanguage="en"
+        )
+        resp = req.execute()
+        count("youtube_quota_units_total", QUOTA_COST["search.list"], method="search.list")
+
+        return [item["id"]["videoId"] for item in resp.get("items", [])]
+
+    def stats(self):
+        return {"store": self.store.stats(), "batcher": self.batcher.stats()}
@@ -1,8 +1,10 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import sys
 import os
-import uuid
+import time
+import json
+import hmac
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,194 +13,42 @@ load_dotenv()
 # Add agents directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'agents'))
 
-from query_agent import QueryAgent
-from youtube_agent import YouTubeAgent
-from pdf_agent import PDFAgent
-from embedding_agent import EmbeddingAgent
-
-class Orchestrator:
-    def __init__(self, model_name="llama3:instruct"):
-        """Initialize all agents with error handling"""
-        self.model_name = model_name
-        
-        try:
-            self.query_agent = QueryAgent(model_name)
-            print("✓ Query agent initialized")
-        except Exception as e:
-            print(f"✗ Query agent failed: {e}")
-            self.query_agent = None
-
-        try:
-            self.youtube_agent = YouTubeAgent(os.getenv("YOUTUBE_API_KEY"))
-            print("✓ YouTube agent initialized")
-        except Exception as e:
-            print(f"✗ YouTube agent failed: {e}")
-            self.youtube_agent = None
-
-        try:
-            self.pdf_agent = PDFAgent(model_name)
-            print("✓ PDF agent initialized")
-        except Exception as e:
-            print(f"✗ PDF agent failed: {e}")
-            self.pdf_agent = None
-
-        try:
-            self.embedding_agent = EmbeddingAgent(model_name)
-            print("✓ Embedding agent initialized")
-        except Exception as e:
-            print(f"✗ Embedding agent failed: {e}")
-            self.embedding_agent = None
-
-    def run(self, topic: str):
-        """Main orchestration method with fallback handling"""
-        try:
-            # Use the original topic directly without query agent processing
-            clean_topic = topic.strip()
-            print(f"Searching for: {clean_topic}")
-
-            # Fetch resources using live APIs only
-            videos = []
-            pdfs = []
-
-            if self.youtube_agent:
-                try:
-                    videos = self.youtube_agent.fetch(clean_topic, 10)
-                    print(f"Found {len(videos)} YouTube videos")
-                except Exception as e:
-                    print(f"YouTube fetch error: {e}")
-                    videos = []
-            else:
-                videos = []
-
-            if self.pdf_agent:
-                try:
-                    pdfs = self.pdf_agent.fetch(clean_topic, 10)
-                    print(f"Found {len(pdfs)} PDF papers")
-                except Exception as e:
-                    print(f"PDF fetch error: {e}")
-                    pdfs = []
-            else:
-                pdfs = []
-
-            # Prepare docs for embeddings if embedding agent is available
-            if self.embedding_agent and (videos or pdfs):
-                try:
-                    docs = []
-                    for v in videos:
-                        docs.append({
-                            "id": str(uuid.uuid4()),
-                            "text": v["title"] + " " + v["description"],
-                            "metadata": {"type": "video", "url": v["url"], "title": v["title"]}
-                        })
-                    
-                    for p in pdfs:
-                        # Extract some text from PDF if possible
-                        pdf_text = ""
-                        if hasattr(self.pdf_agent, 'extract_text'):
-                            try:
-                                pdf_text = self.pdf_agent.extract_text(p["pdf_url"])
-                            except:
-                                pdf_text = "[Could not extract text]"
-                        
-                        docs.append({
-                            "id": str(uuid.uuid4()),
-                            "text": p["title"] + " " + p["summary"] + " " + pdf_text,
-                            "metadata": {"type": "pdf", "url": p["pdf_url"], "title": p["title"]}
-                        })
-
-                    # Store embeddings
-                    if docs:
-                        self.embedding_agent.add(docs)
-                        print(f"Added {len(docs)} documents to embedding store")
-                        
-                except Exception as e:
-                    print(f"Embedding storage error: {e}")
-
-            return {"topic": clean_topic, "videos": videos, "pdfs": pdfs}
-
-        except Exception as e:
-            print(f"Orchestrator run error: {e}")
-            return {
-                "topic": topic,
-                "videos": [],
-                "pdfs": [],
-                "error": str(e)
-            }
-
-    def semantic_search(self, query: str):
-        """Perform semantic search with fallback"""
-        if self.embedding_agent:
-            try:
-                return self.embedding_agent.search(query)
-            except Exception as e:
-                print(f"Semantic search error: {e}")
-                return {"documents": [[]], "metadatas": [[]]}
-        else:
-            return {"documents": [[]], "metadatas": [[]]}
-
-    def _get_fallback_videos(self, topic: str):
-        """Fallback video data when YouTube API is unavailable"""
-        return [
-            {
-                "id": "fallback1",
-                "title": f"{topic} - Introduction and Overview",
-                "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
-                "description": f"A comprehensive introduction to {topic} covering fundamental concepts and practical applications.",
-                "thumbnail": "https://img.youtube.com/vi/dQw4w9WgXcQ/maxresdefault.jpg",
-                "channel": "Educational Channel",
-                "published_at": "2024-01-01T00:00:00Z"
-            },
-            {
-                "id": "fallback2", 
-                "title": f"Advanced {topic} Techniques",
-                "url": "https://www.youtube.com/watch?v=jNQXAC9IVRw",
-                "description": f"Deep dive into advanced {topic} methodologies and best practices.",
-                "thumbnail": "https://img.youtube.com/vi/jNQXAC9IVRw/maxresdefault.jpg",
-                "channel": "Tech Academy",
-                "published_at": "2024-01-02T00:00:00Z"
-            }
-        ]
-
-    def _get_fallback_pdfs(self, topic: str):
-        """Fallback PDF data when arXiv API is unavailable"""
-        return [
-            {
-                "id": "fallback-pdf-1",
-                "title": f"A Comprehensive Survey of {topic}",
-                "pdf_url": "https://arxiv.org/pdf/1706.03762.pdf",
-                "summary": f"This paper provides a comprehensive overview of {topic}, covering theoretical foundations and practical implementations.",
-                "authors": ["Research Team", "Academic Institution"]
-            },
-            {
-                "id": "fallback-pdf-2",
-                "title": f"Recent Advances in {topic}",
-                "pdf_url": "https://arxiv.org/pdf/1512.03385.pdf", 
-                "summary": f"An analysis of recent developments and breakthrough techniques in {topic} research.",
-                "authors": ["Leading Researcher", "University Lab"]
-            }
-        ]
-
-    def _get_fallback_semantic_results(self, query: str):
-        """Fallback semantic search results"""
-        return {
-            "documents": [[
-                f"Semantic search result for '{query}': This is a comprehensive overview of the topic.",
-                f"Related concept to '{query}': Key principles and methodologies explained.",
-                f"Advanced topics in '{query}': Latest research and developments."
-            ]],
-            "metadatas": [[
-                {"url": "https://example.com/resource1", "title": f"{query} - Overview", "type": "article"},
-                {"url": "https://example.com/resource2", "title": f"{query} - Concepts", "type": "tutorial"},
-                {"url": "https://example.com/resource3", "title": f"{query} - Advanced", "type": "research"}
-            ]]
-        }
+from orchestrator import Orchestrator
+from metrics import registry, count, request_timings, stats_gauges
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
-# Initialize orchestrator
+# Initialize orchestrator; agents are created on first use, or in the background when AGENT_WARMUP=1
 orchestrator = Orchestrator()
+# The PDF page pool's forkserver imports this file as __mp_main__ when it is run directly; it serves no requests
+serving = __name__ != '__mp_main__'
+if serving and os.getenv("AGENT_WARMUP", "1") == "1":
+    orchestrator.warm_up()
+# Hot topics are refreshed in the background while traffic is low (PREFETCH=0 disables it)
+if serving and os.getenv("PREFETCH", "1") == "1":
+    orchestrator.start_prefetch()
+
+def with_timings(fn, *args):
+    """Call fn; if the request sent X-Timing: 1, attach a per-stage timing breakdown to its result"""
+    if request.headers.get('X-Timing', '').lower() not in ('1', 'true', 'yes'):
+        return fn(*args)
+    with request_timings() as timings:
+        result = fn(*args)
+    return dict(result, timings=timings)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if request.endpoint and request.endpoint not in ('metrics', 'static'):
+        registry.observe("http_request_duration_seconds", time.perf_counter() - g.request_start,
+                         endpoint=request.endpoint)
+        count("http_requests_total", endpoint=request.endpoint, status=response.status_code)
+    return response
 
 @app.route('/')
 def index():
@@ -213,11 +63,61 @@ def search():
         if not topic:
             return jsonify({"error": "Topic is required"}), 400
         
-        result = orchestrator.run(topic)
+        result = with_timings(orchestrator.search, topic)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/search/stream', methods=['GET', 'POST'])
+def search_stream():
+    """Server-Sent Events variant of /api/search that emits results as each stage completes"""
+    if request.method == 'POST':
+        topic = (request.get_json(silent=True) or {}).get('topic', '')
+    else:
+        topic = request.args.get('topic', '')
+
+    if not topic:
+        return jsonify({"error": "Topic is required"}), 400
+
+    def events():
+        for event, data in orchestrator.stream(topic):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+SUMMARY_MAX_TEXT_CHARS = int(os.getenv("SUMMARY_MAX_TEXT_CHARS", "20000"))
+
+@app.route('/api/summarize/stream', methods=['GET', 'POST'])
+def summarize_stream():
+    """Server-Sent Events: LLM summary of a paper (pdf_url) or of posted text, token by token"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
+    pdf_url = data.get('pdf_url', '')
+    text = data.get('text', '')
+
+    if not pdf_url and not text:
+        return jsonify({"error": "pdf_url or text is required"}), 400
+    if len(text) > SUMMARY_MAX_TEXT_CHARS:
+        return jsonify({"error": f"text is limited to {SUMMARY_MAX_TEXT_CHARS} characters"}), 413
+    if pdf_url and not text and not orchestrator.summary_pdf_allowed(pdf_url):
+        return jsonify({"error": "pdf_url must be a paper returned by a search"}), 400
+
+    def events():
+        for event, payload in orchestrator.stream_summary(pdf_url=pdf_url or None, text=text or None):
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/semantic_search', methods=['POST'])
 def semantic_search():
     try:
@@ -227,14 +127,120 @@ def semantic_search():
         if not query:
             return jsonify({"error": "Query is required"}), 400
         
-        result = orchestrator.semantic_search(query)
+        result = with_timings(orchestrator.semantic_search, query, data.get('mode'))
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/ingestion/status')
+def ingestion_status():
+    if not orchestrator.ingestion:
+        return jsonify({"running": False, "error": "Embedding agent unavailable"}), 503
+    return jsonify(orchestrator.ingestion.stats())
+
+@app.route('/api/prefetch/status')
+def prefetch_status():
+    return jsonify(orchestrator.prefetch.status())
+
+@app.route('/api/embeddings')
+def embeddings_status():
+    if not orchestrator.embedding_agent:
+        return jsonify({"error": "Embedding agent unavailable"}), 503
+    status = orchestrator.embedding_agent.embedding_info()
+    if orchestrator.migration and "migration" not in status:
+        status["migration"] = orchestrator.migration.status()
+    return jsonify(status)
+
+# Admin endpoints (re-embedding migrations) are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def admin_authorized():
+    """Bearer ADMIN_TOKEN (or X-Admin-Token) on the request"""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get('X-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        supplied = authorization[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/api/embeddings/migrate', methods=['POST'])
+def embeddings_migrate():
+    if not admin_authorized():
+        return jsonify({"error": "Admin token required (or run: python manage.py migrate)"}), 403
+    try:
+        data = request.get_json() or {}
+        model = data.get('model', '')
+
+        if not model:
+            return jsonify({"error": "Model is required"}), 400
+
+        return jsonify(orchestrator.start_migration(data.get('backend', 'ollama'), model)), 202
+    except (RuntimeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def upstream_stats():
+    """Per-host HTTP stats, without importing the HTTP stack before any agent has used it"""
+    # The warm-up thread may still be importing it (then get_client is not defined yet)
+    get_client = getattr(sys.modules.get('http_client'), 'get_client', None)
+    return get_client().stats() if get_client else {}
+
+def llm_stats():
+    """LLM gateway stats, once an agent has made a model call"""
+    gateway = getattr(sys.modules.get('llm_gateway'), '_gateway', None)
+    return gateway.stats() if gateway else {}
+
 @app.route('/api/health')
 def health():
-    return jsonify({"status": "healthy", "message": "Smart Learning Agent is running"})
+    # Reports readiness without creating agents, so it answers as soon as the process is up
+    status = {
+        "status": "healthy",
+        "message": "Smart Learning Agent is running",
+        "ready": orchestrator.agents.ready(),
+        "agents": orchestrator.agents.status()
+    }
+    embedding_agent = orchestrator.agents.peek("embedding")
+    if embedding_agent:
+        status["embedding_cache"] = embedding_agent.cache_stats()
+        status["embedding"] = {
+            "backend": embedding_agent.backend.name,
+            "model": embedding_agent.model_name,
+            "collection": embedding_agent.collection.name
+        }
+    youtube_agent = orchestrator.agents.peek("youtube")
+    if youtube_agent:
+        status["youtube"] = youtube_agent.stats()
+    if orchestrator.retention:
+        status["retention"] = orchestrator.retention.stats()
+    status["topic_cache"] = orchestrator.topic_cache.stats()
+    status["upstream"] = upstream_stats()
+    status["llm"] = llm_stats()
+    return jsonify(status)
+
+@app.route('/api/metrics')
+def metrics():
+    """Prometheus text format: stage histograms and counters plus component stats as gauges"""
+    gauges = list(stats_gauges("topic_cache", orchestrator.topic_cache.stats()))
+    gauges += stats_gauges("prefetch", orchestrator.prefetch.stats())
+    for host, host_stats in upstream_stats().items():
+        gauges += stats_gauges("upstream", host_stats, host=host)
+    for name, state in orchestrator.agents.status().items():
+        gauges.append(("agent_ready", {"agent": name}, 1 if state["status"] == "ready" else 0))
+    embedding_agent = orchestrator.agents.peek("embedding")
+    if embedding_agent:
+        gauges += stats_gauges("embedding_cache", embedding_agent.cache_stats())
+    ingestion = orchestrator.agents.peek("ingestion")
+    if ingestion:
+        gauges += stats_gauges("ingestion", ingestion.stats())
+    youtube_agent = orchestrator.agents.peek("youtube")
+    if youtube_agent:
+        gauges += stats_gauges("youtube", youtube_agent.stats())
+    if orchestrator.retention:
+        gauges += stats_gauges("retention", orchestrator.retention.stats())
+    gauges += stats_gauges("llm", llm_stats())
+    return Response(registry.render(gauges), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,62 @@
+"""Micro-benchmark: embedding throughput (docs/sec) at different batch sizes.
+
+Usage:
+    python benchmarks/embedding_batch.py --docs 64 --batch-sizes 1,4,8,16,32
+    python benchmarks/embedding_batch.py --backend sentence-transformers --model all-MiniLM-L6-v2
+
+The ollama backend needs a running Ollama server with the chosen model pulled.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'agents'))
+
+from embedding_agent import EmbeddingAgent
+from embedding_backends import create_backend
+from embedding_cache import EmbeddingCache
+
+
+def make_texts(count: int, words: int = 120):
+    """Synthetic documents roughly the size of a video description or abstract"""
+    vocab = ("learning model data neural network gradient attention transformer "
+             "tutorial lecture course survey review analysis method result").split()
+    return [
+        " ".join(vocab[(i * 7 + j) % len(vocab)] for j in range(words)) + f" doc-{i}"
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "ollama"))
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", os.getenv("OLLAMA_MODEL", "llama3:instruct")))
+    parser.add_argument("--docs", type=int, default=64)
+    parser.add_argument("--batch-sizes", default="1,4,8,16,32")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = make_texts(args.docs)
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = EmbeddingAgent(args.model, persist_directory=tmp, max_workers=args.workers,
+                               cache=EmbeddingCache(path=":memory:"), backend=create_backend(args.backend, args.model))
+        agent.get_embeddings(texts[:1])  # warm the model
+
+        print(f"{'batch':>6} {'docs/sec':>10} {'best s':>8}")
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                # Bypass the embedding cache so every run hits the model
+                matrix = agent._compute_embeddings(texts, batch_size=batch_size)
+                timings.append(time.perf_counter() - start)
+            assert matrix.shape[0] == len(texts)
+            best = min(timings)
+            print(f"{batch_size:>6} {len(texts) / best:>10.1f} {best:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Local stand-ins for Semantic Scholar, arXiv, PDF hosts, Ollama and the YouTube Data API.
+
+FakeUpstream serves every HTTP dependency from one threaded server on 127.0.0.1.
+Each service has its own Behaviour (latency, jitter, failure injection), so a
+benchmark can e.g. make Semantic Scholar slow and flaky while PDFs stay fast.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from fixtures import WORDS, make_pdf
+
+
+class Behaviour:
+    """Latency (seconds, +/- jitter) and failure injection for one fake service"""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=503):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def fails(self):
+        return self.failure_rate > 0 and random.random() < self.failure_rate
+
+
+def fake_embedding(text, dim):
+    """Deterministic unit vector for text, so repeated runs embed identically"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_papers(query, count, base_url, pdf_pages):
+    rng = random.Random(query)
+    papers = []
+    for i in range(count):
+        slug = hashlib.sha1(f"{query}:{i}".encode()).hexdigest()[:12]
+        papers.append({
+            "id": slug,
+            "title": f"{query.title()} study {i}: " + " ".join(rng.choice(WORDS) for _ in range(5)),
+            "abstract": " ".join(rng.choice(WORDS) for _ in range(80)),
+            "authors": [f"Author {rng.randint(1, 500)}" for _ in range(3)],
+            "year": rng.randint(2010, 2024),
+            "citationCount": rng.randint(0, 5000),
+            "pdf_url": f"{base_url}/pdfs/{slug}.pdf?pages={pdf_pages}"
+        })
+    return papers
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients abandoning connections (deadlines, hedged losers) are expected here
+        pass
+
+
+class FakeUpstream:
+    """Threaded HTTP server answering the Semantic Scholar, arXiv, PDF and Ollama endpoints the agents call"""
+
+    SERVICES = ("s2", "arxiv", "pdf", "ollama")
+
+    def __init__(self, behaviours=None, embedding_dim=384, pdf_pages=10, port=0):
+        self.behaviours = {name: Behaviour() for name in self.SERVICES}
+        self.behaviours.update(behaviours or {})
+        self.embedding_dim = embedding_dim
+        self.pdf_pages = pdf_pages
+        self.requests = {name: 0 for name in self.SERVICES}
+        self.lock = threading.Lock()
+        self.pdf_cache = {}
+        self.server = _QuietServer(("127.0.0.1", port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables that point the agents at this server"""
+        return {
+            "SEMANTIC_SCHOLAR_API_URL": f"{self.url}/graph/v1/paper/search",
+            "ARXIV_API_URL": f"{self.url}/api/query",
+            "OLLAMA_HOST": self.url
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-upstream", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def pdf(self, name, pages):
+        key = (name, pages)
+        with self.lock:
+            data = self.pdf_cache.get(key)
+        if data is None:
+            data = make_pdf(pages, seed=name)
+            with self.lock:
+                # Bounded, since the fakes share the benchmarked process and its memory numbers
+                if len(self.pdf_cache) >= 256:
+                    self.pdf_cache.clear()
+                self.pdf_cache[key] = data
+        return data
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                if parts.path == "/graph/v1/paper/search":
+                    self._serve("s2", lambda: self._s2(query))
+                elif parts.path == "/api/query":
+                    self._serve("arxiv", lambda: self._arxiv(query))
+                elif parts.path.startswith("/pdfs/"):
+                    self._serve("pdf", lambda: self._pdf(parts.path, query))
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                routes = {"/api/embeddings": self._embeddings, "/api/embed": self._embed, "/api/chat": self._chat}
+                route = routes.get(urlsplit(self.path).path)
+                if route is None:
+                    self._send(404, b"not found", "text/plain")
+                else:
+                    self._serve("ollama", lambda: route(body))
+
+            def _serve(self, service, respond):
+                with upstream.lock:
+                    upstream.requests[service] += 1
+                behaviour = upstream.behaviours[service]
+                behaviour.delay()
+                if behaviour.fails():
+                    self._send(behaviour.failure_status, b'{"error": "injected failure"}', "application/json")
+                    return
+                status, body, content_type, headers = respond()
+                self._send(status, body, content_type, headers)
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, payload):
+                return 200, json.dumps(payload).encode(), "application/json", None
+
+            def _s2(self, query):
+                papers = fake_papers(query.get("query", ""), int(query.get("limit", 10)), upstream.url,
+                                     upstream.pdf_pages)
+                return self._json({"total": len(papers), "data": [{
+                    "paperId": p["id"],
+                    "title": p["title"],
+                    "abstract": p["abstract"],
+                    "url": f"{upstream.url}/paper/{p['id']}",
+                    "authors": [{"name": name} for name in p["authors"]],
+                    "year": p["year"],
+                    "citationCount": p["citationCount"],
+                    "openAccessPdf": {"url": p["pdf_url"]},
+                    "externalIds": {"ArXiv": f"2101.{p['id'][:5]}"}
+                } for p in papers]})
+
+            def _arxiv(self, query):
+                topic = query.get("search_query", "").replace("all:", "")
+                papers = fake_papers(topic, int(query.get("max_results", 10)), upstream.url, upstream.pdf_pages)
+                entries = "".join(
+                    f"<entry><id>http://arxiv.org/abs/2101.{p['id'][:5]}v1</id>"
+                    f"<title>{escape(p['title'])}</title><summary>{escape(p['abstract'])}</summary>"
+                    f"<published>{p['year']}-01-01T00:00:00Z</published>"
+                    + "".join(f"<author><name>{escape(a)}</name></author>" for a in p["authors"])
+                    + f'<link title="pdf" href="{escape(p["pdf_url"])}" rel="related" type="application/pdf"/>'
+                    "</entry>"
+                    for p in papers
+                )
+                feed = f'<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+                return 200, feed.encode(), "application/atom+xml", None
+
+            def _pdf(self, path, query):
+                name = path.rsplit("/", 1)[-1]
+                data = upstream.pdf(name, int(query.get("pages", upstream.pdf_pages)))
+                etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    return 304, b"", "application/pdf", {"ETag": etag}
+                return 200, data, "application/pdf", {"ETag": etag}
+
+            def _embeddings(self, body):
+                return self._json({"embedding": fake_embedding(body.get("prompt", ""), upstream.embedding_dim)})
+
+            def _embed(self, body):
+                texts = body.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                return self._json({"embeddings": [fake_embedding(t, upstream.embedding_dim) for t in texts]})
+
+            def _chat(self, body):
+                prompt = (body.get("messages") or [{}])[-1].get("content", "")
+                # Batched summary prompts number their texts "[n]"; answer one "[n] ..." line per text
+                sections = re.findall(r"^\[(\d+)\]\n(.*)$", prompt, re.M)
+                if sections:
+                    content = "\n".join(f"[{n}] Summary: " + " ".join(text.split()[:30]) for n, text in sections)
+                else:
+                    content = "Summary: " + " ".join(prompt.split()[:40])
+                words = content.split(" ")
+                if not body.get("stream"):
+                    return self._json({
+                        "model": body.get("model", ""),
+                        "message": {"role": "assistant", "content": content},
+                        "done": True,
+                        "eval_count": len(words)
+                    })
+                # Streaming: newline-delimited JSON, one word per chunk
+                chunks = [{"model": body.get("model", ""), "message": {"role": "assistant", "content": word + " "},
+                           "done": False} for word in words]
+                chunks.append({"model": body.get("model", ""), "message": {"role": "assistant", "content": ""},
+                               "done": True, "eval_count": len(words)})
+                return 200, "".join(json.dumps(c) + "\n" for c in chunks).encode(), "application/x-ndjson", None
+
+        return Handler
+
+
+class _Request:
+    def __init__(self, behaviour, respond):
+        self.behaviour = behaviour
+        self.respond = respond
+
+    def execute(self):
+        self.behaviour.delay()
+        if self.behaviour.fails():
+            raise RuntimeError(f"injected YouTube failure ({self.behaviour.failure_status})")
+        return self.respond()
+
+
+class _Resource:
+    def __init__(self, behaviour, respond):
+        self.behaviour = behaviour
+        self.respond = respond
+
+    def list(self, **params):
+        return _Request(self.behaviour, lambda: self.respond(params))
+
+
+class FakeYouTubeService:
+    """Drop-in for googleapiclient's youtube v3 service: search().list() and videos().list()"""
+
+    def __init__(self, behaviour=None):
+        self.behaviour = behaviour or Behaviour()
+        self.calls = 0
+
+    def search(self):
+        return _Resource(self.behaviour, self._search)
+
+    def videos(self):
+        return _Resource(self.behaviour, self._videos)
+
+    def _search(self, params):
+        self.calls += 1
+        query = params.get("q", "")
+        count = int(params.get("maxResults", 10))
+        ids = [hashlib.sha1(f"{query}:{i}".encode()).hexdigest()[:11] for i in range(count)]
+        return {"items": [{"id": {"kind": "youtube#video", "videoId": video_id}} for video_id in ids]}
+
+    def _videos(self, params):
+        self.calls += 1
+        parts = params.get("part", "snippet,statistics,contentDetails").split(",")
+        items = []
+        for video_id in params.get("id", "").split(","):
+            rng = random.Random(video_id)
+            item = {
+                "id": video_id,
+                "snippet": {
+                    "title": "Lecture: " + " ".join(rng.choice(WORDS) for _ in range(6)),
+                    "description": " ".join(rng.choice(WORDS) for _ in range(60)),
+                    "channelTitle": f"Channel {rng.randint(1, 50)}"
+                },
+                "statistics": {"viewCount": str(rng.randint(100, 10 ** 7)), "likeCount": str(rng.randint(0, 10 ** 5))},
+                "contentDetails": {"duration": f"PT{rng.randint(5, 90)}M"}
+            }
+            # Like the real API, only the requested parts are returned
+            items.append({key: value for key, value in item.items() if key == "id" or key in parts})
+        return {"items": items}
@@ -0,0 +1,45 @@
+"""Synthetic PDF fixtures for the offline benchmarks (no third-party PDF writer needed)."""
+import random
+
+WORDS = ("learning model data neural network gradient attention transformer optimization "
+         "representation training inference benchmark dataset evaluation architecture layer "
+         "embedding retrieval language vision supervised unsupervised reinforcement policy").split()
+
+
+def page_lines(seed, page, lines=40, words=12):
+    """Deterministic pseudo-text for one page"""
+    rng = random.Random(f"{seed}:{page}")
+    return [" ".join(rng.choice(WORDS) for _ in range(words)) for _ in range(lines)]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages=10, seed="fixture", lines_per_page=40):
+    """Build a valid text PDF with the given number of pages; different seeds give different bytes"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    font_id = 3 + 2 * pages
+    for page in range(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * page} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        body = " ".join(f"({_escape(line)}) Tj T*" for line in page_lines(seed, page, lines_per_page))
+        stream = f"BT /F1 10 Tf 12 TL 50 760 Td {body} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
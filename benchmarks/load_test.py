@@ -0,0 +1,204 @@
+"""Load test: throughput of the gunicorn deployment (gunicorn.conf.py) as the worker count grows.
+
+Usage:
+    python benchmarks/load_test.py --workers 1,2,4 --concurrency 32 --requests 200
+    python benchmarks/load_test.py --endpoint semantic --workers 1,4 --output load.json
+
+For each worker count a fresh gunicorn server is started on the real app, with
+Semantic Scholar, arXiv, PDF hosts and Ollama served by the local fakes
+(benchmarks/fakes.py) and all state in a temporary directory. Clients then send
+requests with unique topics, so every "stream" request runs the full fetch ->
+PDF extract -> index pipeline. YouTube is not faked across processes, so the
+servers run without it. The fakes share the machine with the servers; scaling
+is bounded by the available cores.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, '..')
+
+from fakes import Behaviour, FakeUpstream
+from fixtures import WORDS
+
+ENDPOINTS = ("stream", "search", "semantic")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env(upstream, workdir, workers, args):
+    """Environment for one gunicorn run: fakes for every upstream, all state inside workdir"""
+    env = dict(os.environ, **upstream.env())
+    env.pop("YOUTUBE_API_KEY", None)
+    env.update({
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_THREADS": str(args.threads),
+        "INGESTION_SHARED_QUEUE": "1",
+        "SHARED_QUEUE_PATH": os.path.join(workdir, "ingestion_queue.sqlite3"),
+        "WRITER_LOCK_PATH": os.path.join(workdir, "index_writer.lock"),
+        "CHROMA_PERSIST_DIRECTORY": os.path.join(workdir, "chroma_db"),
+        "EMBEDDING_BACKEND": "ollama",
+        "EMBEDDING_MODEL": "fake-embed",
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "TOPIC_CACHE_PATH": os.path.join(workdir, "topics.sqlite3"),
+        "VIDEO_STORE_PATH": os.path.join(workdir, "videos.sqlite3"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm.sqlite3"),
+        "PREFETCH": "0",
+        "PREFETCH_STATE_PATH": "",
+        "PDF_TEXT_CACHE_PATH": os.path.join(workdir, "pdf_text.sqlite3"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical"),
+        "VECTOR_INDEX": "0",
+        "HTTP_PER_HOST_LIMIT": "64",
+        "HTTP_BACKOFF_SECONDS": "0.05",
+        "AGENT_WARMUP": "1"
+    })
+    return env
+
+
+def wait_ready(url, timeout):
+    """Poll /api/health until every agent in the answering worker is ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/api/health", timeout=5) as response:
+                if json.load(response).get("ready"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} not ready after {timeout}s")
+
+
+def request_for(endpoint, url, topic):
+    if endpoint == "stream":
+        return urllib.request.Request(f"{url}/api/search/stream?topic={urllib.request.quote(topic)}")
+    path = "/api/search" if endpoint == "search" else "/api/semantic_search"
+    key = "topic" if endpoint == "search" else "query"
+    return urllib.request.Request(url + path, data=json.dumps({key: topic}).encode(),
+                                  headers={"Content-Type": "application/json"})
+
+
+def drive(url, args, run_id):
+    """Send args.requests requests at args.concurrency; returns (wall seconds, latencies, errors)"""
+    def call(i):
+        topic = f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} {run_id} {i}"
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request_for(args.endpoint, url, topic), timeout=args.timeout) as response:
+                response.read()
+            return time.perf_counter() - start, False
+        except OSError:
+            return time.perf_counter() - start, True
+
+    # A few untimed requests so every worker has created its agents and connections
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(call, range(-args.concurrency, 0)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(call, range(args.requests)))
+    wall = time.perf_counter() - start
+    return wall, [latency for latency, _ in results], sum(failed for _, failed in results)
+
+
+def run(workers, upstream, args):
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = server_env(upstream, workdir, workers, args)
+    env["BIND"] = f"127.0.0.1:{port}"
+    log = open(os.path.join(workdir, "gunicorn.log"), "w")
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:application"],
+                              cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_ready(url, args.startup_timeout)
+        wall, latencies, errors = drive(url, args, f"w{workers}")
+        with urllib.request.urlopen(url + "/api/ingestion/status", timeout=10) as response:
+            ingestion = json.load(response)
+    except Exception:
+        log.flush()
+        with open(log.name) as f:
+            print(f.read()[-3000:])
+        raise
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ms = np.array(latencies) * 1000
+    return {
+        "workers": workers,
+        "requests": args.requests,
+        "errors": errors,
+        "throughput_rps": round(args.requests / wall, 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "shared_queue": ingestion.get("shared_queue")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated gunicorn worker counts")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="stream")
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=8, help="gthread threads per worker")
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated upstream latency")
+    parser.add_argument("--pdf-pages", type=int, default=6)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    upstream = FakeUpstream(
+        behaviours={name: Behaviour(latency, latency / 4) for name in FakeUpstream.SERVICES},
+        pdf_pages=args.pdf_pages
+    ).start()
+    try:
+        runs = [run(int(w), upstream, args) for w in args.workers.split(",")]
+    finally:
+        upstream.stop()
+
+    base = runs[0]
+    for result in runs:
+        speedup = result["throughput_rps"] / base["throughput_rps"]
+        result["speedup"] = round(speedup, 2)
+        result["efficiency"] = round(speedup / (result["workers"] / base["workers"]), 2)
+
+    print(f"endpoint: {args.endpoint}, {args.requests} requests at concurrency {args.concurrency}, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'req/s':>8} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for r in runs:
+        print(f"{r['workers']:>7} {r['throughput_rps']:>8.2f} {r['speedup']:>8.2f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['errors']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"endpoint": args.endpoint, "cpus": os.cpu_count(), "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
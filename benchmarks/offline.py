@@ -0,0 +1,310 @@
+"""Offline benchmark suite: drives the real agents against local stand-ins for every upstream.
+
+Usage:
+    python benchmarks/offline.py --output results.json
+    python benchmarks/offline.py --scenarios pdf_extract,embedding_search --concurrency 16 --requests 200
+    python benchmarks/offline.py --latency-ms 80 --failure-rate 0.05 --baseline results.json
+
+Semantic Scholar, arXiv, PDF hosts and Ollama are served by a local HTTP server
+(benchmarks/fakes.py) and YouTube by an in-process fake service, so runs are
+reproducible and need no network, API key or GPU. Every scenario reports
+throughput, p50/p95/p99 latency, peak memory and time per instrumented stage.
+The fakes run in the benchmarked process, so memory figures include them.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCH_DIR, '..'))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'agents'))
+
+from fakes import Behaviour, FakeUpstream, FakeYouTubeService
+from fixtures import WORDS
+
+SCENARIOS = ("pdf_extract", "embedding_add", "embedding_search", "orchestrator_run")
+
+
+def configure_environment(upstream, workdir, args):
+    """Point every agent at the fakes and keep all state inside workdir; must run before agents are imported"""
+    os.environ.update(upstream.env())
+    os.environ.update({
+        "CHROMA_PERSIST_DIRECTORY": os.path.join(workdir, "chroma_db"),
+        "EMBEDDING_BACKEND": "ollama",
+        "EMBEDDING_MODEL": args.embedding_model,
+        "EMBEDDING_CACHE_PATH": "",
+        "TOPIC_CACHE_PATH": "",
+        "VIDEO_STORE_PATH": "",
+        "PREFETCH": "0",
+        "PREFETCH_STATE_PATH": "",
+        "PDF_TEXT_CACHE_PATH": os.path.join(workdir, "pdf_text.sqlite3"),
+        "VECTOR_INDEX_PATH": os.path.join(workdir, "vector_index"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical"),
+        # Every fake shares one host, so the per-host connection limit would serialize unrelated services
+        "HTTP_PER_HOST_LIMIT": os.getenv("HTTP_PER_HOST_LIMIT", "64"),
+        "HTTP_BACKOFF_SECONDS": os.getenv("HTTP_BACKOFF_SECONDS", "0.05"),
+        # Agents are created by the scenarios themselves, not by a warm-up thread racing them
+        "AGENT_WARMUP": "0"
+    })
+
+
+def synthetic_text(i, words=200):
+    return " ".join(WORDS[(i * 7 + j * 3) % len(WORDS)] for j in range(words)) + f" document {i}"
+
+
+def percentile_ms(samples, p):
+    return round(float(np.percentile(samples, p)) * 1000, 3) if samples else 0.0
+
+
+def stage_breakdown():
+    from metrics import registry
+
+    stages = {}
+    for labels, (count, total) in registry.totals("stage_duration_seconds").items():
+        stages[labels] = {"count": count, "total_ms": round(total * 1000, 2),
+                          "mean_ms": round(total * 1000 / count, 3) if count else 0.0}
+    return dict(sorted(stages.items()))
+
+
+def run_scenario(name, operation, requests, concurrency, trace_memory):
+    """Run operation(i) for i in range(requests) on a pool of concurrency threads and summarize"""
+    from metrics import registry
+
+    registry.reset()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    latencies = []
+    errors = []
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            operation(i)
+        except Exception as e:
+            errors.append(f"{e.__class__.__name__}: {e}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    memory = {"rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    if trace_memory:
+        memory["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "throughput_per_sec": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile_ms(latencies, 50),
+            "p95": percentile_ms(latencies, 95),
+            "p99": percentile_ms(latencies, 99),
+            "mean": round(float(np.mean(latencies)) * 1000, 3) if latencies else 0.0,
+            "max": round(max(latencies) * 1000, 3) if latencies else 0.0
+        },
+        "memory": memory,
+        "stages": stage_breakdown()
+    }
+    if errors:
+        result["sample_errors"] = sorted(set(errors))[:5]
+    print(f"{name:<18} {result['throughput_per_sec']:>9.2f}/s  p50 {result['latency_ms']['p50']:>9.1f}ms  "
+          f"p95 {result['latency_ms']['p95']:>9.1f}ms  p99 {result['latency_ms']['p99']:>9.1f}ms  "
+          f"errors {len(errors)}  rss {memory['rss_peak_mb']}MB")
+    return result
+
+
+def build_scenarios(upstream, args):
+    """Map scenario name -> operation(i), constructing only the agents the selected scenarios need"""
+    operations = {}
+    selected = args.scenarios
+
+    # The orchestrator owns its own agents; reuse them so all scenarios share one Chroma store
+    orchestrator = None
+    if "orchestrator_run" in selected:
+        import app
+        from youtube_agent import YouTubeAgent
+
+        orchestrator = app.orchestrator
+        orchestrator.youtube_agent = YouTubeAgent(service=FakeYouTubeService(
+            Behaviour(args.latency_ms / 1000, args.jitter_ms / 1000, args.failure_rate)
+        ))
+        # Unique topics bypass the topic cache, so every call runs the full pipeline
+        operations["orchestrator_run"] = lambda i: orchestrator.run(f"benchmark topic {i}")
+
+    if "pdf_extract" in selected:
+        from pdf_agent import PDFAgent
+
+        pdf_agent = orchestrator.pdf_agent if orchestrator else PDFAgent()
+        max_pages = args.extract_pages or None
+        # Unique names make every request a download + parse rather than a text-cache hit
+        operations["pdf_extract"] = lambda i: pdf_agent.extract_text(
+            f"{upstream.url}/pdfs/bench-{i}.pdf?pages={args.pdf_pages}", max_pages=max_pages, max_chars=None
+        )
+
+    if "embedding_add" in selected or "embedding_search" in selected:
+        from embedding_agent import EmbeddingAgent
+        from chunker import chunk_document
+
+        agent = orchestrator.embedding_agent if orchestrator else EmbeddingAgent()
+
+        def add(i):
+            docs = []
+            for j in range(args.docs_per_add):
+                n = i * args.docs_per_add + j
+                docs += chunk_document({
+                    "id": f"bench:{n}",
+                    "text": synthetic_text(n, args.doc_words),
+                    "metadata": {"type": "paper", "title": f"Benchmark document {n}"}
+                })
+            agent.add(docs)
+
+        operations["embedding_add"] = add
+
+        if "embedding_search" in selected:
+            if "embedding_add" not in selected:
+                for i in range(max(1, args.search_corpus // args.docs_per_add)):
+                    add(i)
+
+            def search(i):
+                words = " ".join(WORDS[(i * 5 + j) % len(WORDS)] for j in range(4))
+                agent.search(f"{words} {i}", n=5, mode=args.search_mode)
+
+            operations["embedding_search"] = search
+
+    return operations
+
+
+def drain_ingestion():
+    """Let the orchestrator's background indexing finish inside the work dir; returns its stats"""
+    import app
+
+    ingestion = app.orchestrator.ingestion
+    if ingestion is None:
+        return None
+    start = time.perf_counter()
+    ingestion.shutdown()
+    return dict(ingestion.stats(), drain_seconds=round(time.perf_counter() - start, 3))
+
+
+def compare(results, baseline, tolerance):
+    """Print per-scenario deltas against a baseline run; returns the names of regressed scenarios"""
+    regressions = []
+    print(f"\n{'scenario':<18} {'throughput':>12} {'p95':>10} {'p99':>10}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            print(f"{name:<18} (not in baseline)")
+            continue
+
+        def change(new, old):
+            return (new - old) / old if old else 0.0
+
+        throughput = change(current["throughput_per_sec"], previous["throughput_per_sec"])
+        p95 = change(current["latency_ms"]["p95"], previous["latency_ms"]["p95"])
+        p99 = change(current["latency_ms"]["p99"], previous["latency_ms"]["p99"])
+        regressed = throughput < -tolerance or p95 > tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<18} {throughput:>+11.1%} {p95:>+9.1%} {p99:>+9.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--requests", type=int, default=50, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="added latency per upstream call")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--failure-status", type=int, default=503)
+    parser.add_argument("--ollama-latency-ms", type=float, default=None, help="defaults to --latency-ms")
+    parser.add_argument("--pdf-pages", type=int, default=10)
+    parser.add_argument("--extract-pages", type=int, default=0, help="pages to extract per PDF (0 = all)")
+    parser.add_argument("--embedding-model", default="bench-embed")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--docs-per-add", type=int, default=8)
+    parser.add_argument("--doc-words", type=int, default=400)
+    parser.add_argument("--search-corpus", type=int, default=400, help="docs indexed before a search-only run")
+    parser.add_argument("--search-mode", default="hybrid")
+    parser.add_argument("--trace-memory", action="store_true", help="also report Python heap peaks (slower)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput/p95 regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    behaviour = dict(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                     failure_rate=args.failure_rate, failure_status=args.failure_status)
+    ollama_latency = args.latency_ms if args.ollama_latency_ms is None else args.ollama_latency_ms
+    upstream = FakeUpstream(
+        behaviours={
+            "s2": Behaviour(**behaviour),
+            "arxiv": Behaviour(**behaviour),
+            "pdf": Behaviour(**behaviour),
+            "ollama": Behaviour(**dict(behaviour, latency=ollama_latency / 1000))
+        },
+        embedding_dim=args.embedding_dim,
+        pdf_pages=args.pdf_pages
+    ).start()
+
+    with tempfile.TemporaryDirectory(prefix="slabench-") as workdir:
+        configure_environment(upstream, workdir, args)
+        if args.trace_memory:
+            tracemalloc.start()
+
+        operations = build_scenarios(upstream, args)
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "scenarios": {}
+        }
+        for name in args.scenarios:
+            results["scenarios"][name] = run_scenario(
+                name, operations[name], args.requests, args.concurrency, args.trace_memory
+            )
+        if "orchestrator_run" in operations:
+            results["scenarios"]["orchestrator_run"]["ingestion"] = drain_ingestion()
+        results["upstream_requests"] = dict(upstream.requests)
+        upstream.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark: cold start of app.py, i.e. how soon a fresh worker can answer /api/health.
+
+Usage:
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --runs 5 --eager --output startup.json
+
+Each run starts a new interpreter and reports the time to import app, the time to
+the first /api/health response and, with --wait-ready, the time until every agent
+has been created by the background warm-up. --eager creates all agents before
+serving, which is what app.py did before agents were created lazily.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+if {eager}:
+    app.orchestrator.warm_up(background=False)
+client = app.app.test_client()
+health = client.get('/api/health')
+served = time.perf_counter()
+ready = None
+if {wait_ready}:
+    while not app.orchestrator.agents.ready():
+        time.sleep(0.01)
+    ready = (time.perf_counter() - start) * 1000
+print("STARTUP " + json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_health_ms": (served - start) * 1000,
+    "ready_ms": ready,
+    "status": health.status_code,
+    "agents": app.orchestrator.agents.status()
+}}))
+"""
+
+
+def run_once(args):
+    env = dict(os.environ, AGENT_WARMUP="0" if args.eager else ("1" if args.warmup else "0"), PREFETCH="0")
+    code = PROBE.format(root=ROOT, eager=args.eager, wait_ready=args.wait_ready)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True,
+                          timeout=args.timeout)
+    wall = (time.perf_counter() - start) * 1000
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            result = json.loads(line[len("STARTUP "):])
+            result["process_ms"] = wall
+            return result
+    raise RuntimeError(f"startup probe failed:\n{proc.stderr[-2000:]}")
+
+
+def summarize(samples):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None
+    return {"p50": round(float(np.percentile(samples, 50)), 1), "p95": round(float(np.percentile(samples, 95)), 1),
+            "min": round(min(samples), 1), "max": round(max(samples), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="create every agent before serving")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="disable the background warm-up (AGENT_WARMUP=0)")
+    parser.add_argument("--wait-ready", action="store_true", help="also time until all agents are ready")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    runs = [run_once(args) for _ in range(args.runs)]
+    results = {
+        "mode": "eager" if args.eager else ("lazy+warmup" if args.warmup else "lazy"),
+        "runs": args.runs,
+        "import_ms": summarize([r["import_ms"] for r in runs]),
+        "first_health_ms": summarize([r["first_health_ms"] for r in runs]),
+        "process_ms": summarize([r["process_ms"] for r in runs]),
+        "ready_ms": summarize([r["ready_ms"] for r in runs]),
+        "agents": runs[-1]["agents"]
+    }
+
+    print(f"mode: {results['mode']} ({args.runs} runs)")
+    for key in ("import_ms", "first_health_ms", "process_ms", "ready_ms"):
+        if results[key]:
+            print(f"{key:<16} p50 {results[key]['p50']:>8.1f}  p95 {results[key]['p95']:>8.1f}")
+    for name, state in results["agents"].items():
+        print(f"  {name:<10} {state['status']:<12} {state.get('init_ms', '')}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: in-process VectorIndex (exact and IVF) vs Chroma collection.query.
+
+Usage:
+    python benchmarks/vector_search.py --sizes 10000,100000,1000000 --dim 384
+
+Chroma inserts are slow at 1M rows; pass --chroma-max 100000 to skip Chroma above that size.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'agents'))
+
+from vector_index import VectorIndex
+
+
+def percentiles(samples):
+    ordered = np.sort(np.asarray(samples)) * 1000
+    return {p: float(np.percentile(ordered, p)) for p in (50, 95, 99)}
+
+
+def time_queries(search, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def build_index(path, mode, ids, vectors, metadatas, batch):
+    index = VectorIndex(path, mode=mode, ivf_min_rows=1)
+    start = time.perf_counter()
+    for offset in range(0, len(ids), batch):
+        index.upsert(ids[offset:offset + batch], vectors[offset:offset + batch], metadatas[offset:offset + batch])
+    return index, time.perf_counter() - start
+
+
+def build_chroma(path, ids, vectors, metadatas):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    # Same distance function as the index (and the app's collections)
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    batch = getattr(client, "max_batch_size", 5000) or 5000
+    start = time.perf_counter()
+    for offset in range(0, len(ids), batch):
+        collection.add(ids=ids[offset:offset + batch], embeddings=vectors[offset:offset + batch].tolist(),
+                       metadatas=metadatas[offset:offset + batch])
+    return collection, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chroma-max", type=int, default=1000000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>9} {'backend':>14} {'build s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'filtered p50':>13}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        vectors = rng.normal(size=(size, args.dim)).astype(np.float32)
+        ids = [f"doc-{i}" for i in range(size)]
+        metadatas = [{"type": "pdf" if i % 3 else "video"} for i in range(size)]
+        queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+        pdf_only = {"type": "pdf"}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in ("exact", "ivf"):
+                index, build = build_index(os.path.join(tmp, mode), mode, ids, vectors, metadatas, 10000)
+                plain = time_queries(lambda q: index.search(q, args.k), queries)
+                filtered = time_queries(lambda q: index.search(q, args.k, pdf_only), queries)
+                print(f"{size:>9} {'index/' + mode:>14} {build:>9.2f} {plain[50]:>8.2f} {plain[95]:>8.2f} "
+                      f"{plain[99]:>8.2f} {filtered[50]:>13.2f}")
+
+            if size <= args.chroma_max:
+                collection, build = build_chroma(os.path.join(tmp, "chroma"), ids, vectors, metadatas)
+                plain = time_queries(
+                    lambda q: collection.query(query_embeddings=[q.tolist()], n_results=args.k), queries)
+                filtered = time_queries(
+                    lambda q: collection.query(query_embeddings=[q.tolist()], n_results=args.k, where=pdf_only), queries)
+                print(f"{size:>9} {'chroma':>14} {build:>9.2f} {plain[50]:>8.2f} {plain[95]:>8.2f} "
+                      f"{plain[99]:>8.2f} {filtered[50]:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""Gunicorn settings for serving the app with several worker processes.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Each worker is a separate process with its own agents. They share the SQLite
+caches under ./cache and the Chroma store; writes to the store go through a
+shared ingestion queue that only one worker (the holder of the writer lock) drains.
+"""
+import multiprocessing
+import os
+
+# Must be set before the workers import app.py
+os.environ.setdefault("INGESTION_SHARED_QUEUE", "1")
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# Requests mostly wait on upstream APIs and Ollama, so each worker also runs a thread pool
+worker_class = "gthread"
+# Page-parallel PDF extraction pools are per worker; split the cores between them
+os.environ.setdefault("PDF_EXTRACT_PROCESSES", str(max(1, multiprocessing.cpu_count() // workers)))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Agents (Chroma clients, SQLite connections, thread pools) must be created after the fork
+preload_app = False
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
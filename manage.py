@@ -0,0 +1,125 @@
+"""Maintenance commands for the Smart Learning Agent.
+
+Usage:
+    python manage.py compact [--dry-run]
+    python manage.py migrate --backend sentence-transformers --model all-MiniLM-L6-v2
+    python manage.py retention [--dry-run]
+    python manage.py snapshot export ./snapshots/resources
+    python manage.py snapshot load ./snapshots/resources [--replace]
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'agents'))
+
+
+def compact(args):
+    """Remove duplicate rows from the resources collection"""
+    from embedding_agent import EmbeddingAgent
+
+    agent = EmbeddingAgent(os.getenv("OLLAMA_MODEL", "llama3:instruct"))
+    stats = agent.compact(dry_run=args.dry_run)
+    prefix = "Would compact" if args.dry_run else "Compacted"
+    print(f"{prefix} {stats['rows']} rows into {stats['resources']} resources: "
+          f"{stats['rekeyed']} re-keyed, {stats['deleted']} deleted")
+
+
+def migrate(args):
+    """Re-embed the resources collection with another model (resumable)"""
+    from embedding_agent import EmbeddingAgent
+    from embedding_backends import create_backend
+    from embedding_migration import EmbeddingMigration
+
+    agent = EmbeddingAgent(os.getenv("OLLAMA_MODEL", "llama3:instruct"))
+    migration = EmbeddingMigration(agent, create_backend(args.backend, args.model), batch_size=args.batch_size)
+    status = migration.run(switch=not args.no_switch)
+    print(f"Copied {status['copied']} rows from {status['source']} into {status['target']}")
+    if not args.no_switch:
+        print(f"Active embedding model is now {args.backend}:{args.model} (restart the app to pick it up)")
+
+
+def retention(args):
+    """Run one retention pass (RETENTION_* policies) over the resources collection"""
+    from embedding_agent import EmbeddingAgent
+    from retention import RetentionJob
+
+    agent = EmbeddingAgent(os.getenv("OLLAMA_MODEL", "llama3:instruct"))
+    summary = RetentionJob(agent, step_pause=0).run_pass(dry_run=args.dry_run)
+    prefix = "Would delete" if args.dry_run else "Deleted"
+    deleted = summary["deleted"]
+    print(f"{prefix} {sum(deleted.values())} of {summary['scanned']} rows "
+          f"({deleted['age']} by age, {deleted['hits']} by hits, {deleted['rows']} over the row cap) "
+          f"in {summary['seconds']}s")
+
+
+def snapshot(args):
+    """Export the active collection to a snapshot directory, or bulk-load one"""
+    if args.action == "export":
+        from embedding_agent import EmbeddingAgent
+        from snapshot import export_snapshot
+
+        agent = EmbeddingAgent(os.getenv("OLLAMA_MODEL", "llama3:instruct"))
+        manifest = export_snapshot(agent.collection, args.path, page_size=args.batch_size)
+        print(f"Exported {manifest['rows']} rows ({manifest['dim']} dims) from {manifest['collection']} "
+              f"to {args.path} in {manifest['seconds']}s")
+        return
+
+    import time
+    import chromadb
+    from embedding_agent import EmbeddingAgent
+    from embedding_backends import create_backend
+    from snapshot import load_snapshot
+
+    start = time.perf_counter()
+    client = chromadb.PersistentClient(path=os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db"))
+    collection, manifest = load_snapshot(client, args.path, replace=args.replace, batch_size=args.batch_size)
+    print(f"Loaded {manifest['rows']} rows into {collection.name} in {time.perf_counter() - start:.1f}s")
+
+    # Open the loaded collection as the active one; this rebuilds the search indexes from it
+    metadata = manifest["collection_metadata"]
+    if metadata.get("embedding_backend"):
+        agent = EmbeddingAgent(backend=create_backend(metadata["embedding_backend"], metadata["embedding_model"]))
+        agent.save_active_model()
+        print(f"Active embedding model is now {agent.backend.name}:{agent.model_name} "
+              f"(restart the app to pick it up)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart Learning Agent maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compact_parser = commands.add_parser("compact", help=compact.__doc__)
+    compact_parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    compact_parser.set_defaults(func=compact)
+
+    migrate_parser = commands.add_parser("migrate", help=migrate.__doc__)
+    migrate_parser.add_argument("--backend", default="ollama", help="ollama or sentence-transformers")
+    migrate_parser.add_argument("--model", required=True, help="embedding model, e.g. nomic-embed-text")
+    migrate_parser.add_argument("--batch-size", type=int, default=None, help="rows re-embedded per checkpoint")
+    migrate_parser.add_argument("--no-switch", action="store_true",
+                                help="fill the new collection but keep serving from the current one")
+    migrate_parser.set_defaults(func=migrate)
+
+    retention_parser = commands.add_parser("retention", help=retention.__doc__)
+    retention_parser.add_argument("--dry-run", action="store_true", help="report what would be deleted")
+    retention_parser.set_defaults(func=retention)
+
+    snapshot_parser = commands.add_parser("snapshot", help=snapshot.__doc__)
+    snapshot_parser.add_argument("action", choices=["export", "load"])
+    snapshot_parser.add_argument("path", help="snapshot directory")
+    snapshot_parser.add_argument("--replace", action="store_true",
+                                 help="load over an existing collection of the same name")
+    snapshot_parser.add_argument("--batch-size", type=int, default=5000, help="rows per read or write")
+    snapshot_parser.set_defaults(func=snapshot)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,489 @@
 import sys
 import os
+import time
+import queue
+import atexit
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import urlsplit
+
 sys.path.append(os.path.join(os.path.dirname(__file__), 'agents'))
 
-from query_agent import QueryAgent
-from youtube_agent import YouTubeAgent
-from pdf_agent import PDFAgent
-from embedding_agent import EmbeddingAgent
+from agent_registry import AgentRegistry
+from topic_cache import TopicCache
+from ingestion import IngestionWorker, summary_budget
+from shared_queue import SharedQueue
+from file_lock import FileLock
+from metrics import span, bind
+from prefetch import PrefetchScheduler
+from retention import RetentionJob, retention_configured
+
+
+def _agent(name):
+    """Orchestrator attribute backed by the lazy agent registry"""
+    return property(
+        lambda self: self.agents.get(name),
+        lambda self, agent: self.agents.set(name, agent)
+    )
 
-import uuid
 
 class Orchestrator:
-    def __init__(self, model_path="./models/llama-2-7b-chat-hf"):
-        self.query_agent = QueryAgent(model_path)
-        self.youtube_agent = YouTubeAgent()
-        self.pdf_agent = PDFAgent(model_path)
-        self.embedding_agent = EmbeddingAgent(model_path)
+    query_agent = _agent("query")
+    youtube_agent = _agent("youtube")
+    pdf_agent = _agent("pdf")
+    embedding_agent = _agent("embedding")
+    ingestion = _agent("ingestion")
+
+    def __init__(self, model_name="llama3:instruct", concurrent=None, deadline=None, max_workers=None):
+        """Register agents; each one is imported and created on first use (or by warm_up)"""
+        self.model_name = model_name
+
+        # Concurrent fan-out is on by default; ORCHESTRATOR_CONCURRENT=0 restores sequential runs
+        if concurrent is None:
+            concurrent = os.getenv("ORCHESTRATOR_CONCURRENT", "1") != "0"
+        self.concurrent = concurrent
+        self.deadline = float(deadline or os.getenv("SEARCH_DEADLINE_SECONDS", "15"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(max_workers or os.getenv("ORCHESTRATOR_MAX_WORKERS", "16")),
+            thread_name_prefix="orchestrator"
+        )
+        self.topic_cache = TopicCache()
+
+        # Under a multi-process server (gunicorn.conf.py) ingestion goes through a queue shared by
+        # all workers and only the worker holding the writer lock writes to the vector store
+        self.shared_queue = None
+        self.writer_lock = None
+        if os.getenv("INGESTION_SHARED_QUEUE", "0") == "1":
+            if os.getenv("VECTOR_INDEX", "0") == "1":
+                raise RuntimeError("VECTOR_INDEX=1 keeps a per-process index that other workers cannot see; "
+                                   "it needs a single server process (INGESTION_SHARED_QUEUE=0)")
+            self.shared_queue = SharedQueue()
+            self.writer_lock = FileLock(os.getenv("WRITER_LOCK_PATH", "./cache/index_writer.lock"))
+        # Counts every search (across workers through the shared queue); start_prefetch() runs the
+        # background refresh of hot topics
+        self.prefetch = PrefetchScheduler(self, shared=self.shared_queue)
+        self.prefetch_enabled = False
+        
+        # Heavy imports (chromadb, googleapiclient, ollama) happen inside the factories
+        self.agents = AgentRegistry()
+        self.agents.register("embedding", self._create_embedding_agent)
+        self.agents.register("youtube", self._create_youtube_agent, "YouTube")
+        self.agents.register("pdf", self._create_pdf_agent, "PDF")
+        self.agents.register("query", self._create_query_agent)
+        # Extraction, embedding and upserts happen off the request path
+        self.agents.register("ingestion", self._create_ingestion, "Ingestion worker")
+        # Expires and caps stored rows when a RETENTION_* policy is set; runs in the index writer only
+        self.retention = None
+
+        # /api/summarize/stream only fetches PDFs from these hosts (and their subdomains) or of indexed papers
+        self.summary_pdf_hosts = [
+            host.strip().lower() for host in
+            os.getenv("SUMMARY_PDF_HOSTS", "arxiv.org,semanticscholar.org").split(",") if host.strip()
+        ]
+
+        # Last re-embedding migration started from the API, kept for its status
+        self.migration = None
+
+    def _create_query_agent(self):
+        from query_agent import QueryAgent
+        return QueryAgent(self.model_name)
+
+    def _create_youtube_agent(self):
+        from youtube_agent import YouTubeAgent
+        return YouTubeAgent(os.getenv("YOUTUBE_API_KEY"))
+
+    def _create_pdf_agent(self):
+        from pdf_agent import PDFAgent
+        return PDFAgent(self.model_name)
+
+    def _create_embedding_agent(self):
+        from embedding_agent import EmbeddingAgent
+        if self.shared_queue is None:
+            agent = EmbeddingAgent(self.model_name)
+            agent.track_hits = retention_configured()
+            self._start_retention(agent)
+            return agent
+        # The ingestion worker starts retention once this process holds the writer lock
+        writer = self.writer_lock.acquire()
+        agent = EmbeddingAgent(self.model_name, sync_indexes=writer)
+        agent.track_hits = retention_configured()
+        if not writer:
+            agent.store_generation = self.shared_queue.generation
+            agent.seen_generation = self.shared_queue.generation()
+        return agent
+
+    def _create_ingestion(self):
+        embedding_agent = self.embedding_agent
+        if not embedding_agent:
+            raise RuntimeError("Embedding agent unavailable")
+        worker = IngestionWorker(self.pdf_agent, embedding_agent, shared_queue=self.shared_queue,
+                                 writer_lock=self.writer_lock, on_writer=self._on_writer).start()
+        atexit.register(worker.shutdown)
+        return worker
+
+    def _on_writer(self, embedding_agent):
+        """Start the writer-only background jobs once this process takes the writer lock"""
+        self._start_retention(embedding_agent)
+        if self.prefetch_enabled:
+            self._run_prefetch()
+
+    def _start_retention(self, embedding_agent):
+        """Run the retention job on the embedding agent, if a RETENTION_* policy is set"""
+        if self.retention is None and retention_configured():
+            self.retention = RetentionJob(embedding_agent).start()
+            atexit.register(self.retention.stop)
+        return self.retention
+
+    def warm_up(self, background=True):
+        """Create every agent ahead of the first request"""
+        return self.agents.warm_up(background=background)
+
+    def start_prefetch(self):
+        """Keep the hot topics' cached results and index entries warm in the background"""
+        self.prefetch_enabled = True
+        if self.writer_lock is not None:
+            # With several server processes only the index writer prefetches; the ingestion worker
+            # starts it in whichever process takes the writer lock, now or after the current writer exits
+            ingestion = self.agents.peek("ingestion")
+            if ingestion is None or not ingestion.is_writer:
+                return None
+        return self._run_prefetch()
+
+    def _run_prefetch(self):
+        if self.prefetch.thread is None:
+            atexit.register(self.prefetch.stop)
+        return self.prefetch.start()
+
+    def search(self, topic: str):
+        """Serve a topic from the result cache, running the pipeline on a miss"""
+        self.prefetch.record(topic)
+        return self.topic_cache.get_or_compute(topic, self.run)
 
     def run(self, topic: str):
-        clean_topic = self.query_agent.process(topic)
-
-        # Fetch resources
-        videos = self.youtube_agent.fetch(clean_topic, 10)
-        pdfs = self.pdf_agent.fetch(clean_topic, 10)
-
-        # Prepare docs for embeddings
-        docs = []
-        for v in videos:
-            docs.append({
-                "id": str(uuid.uuid4()),
-                "text": v["title"] + " " + v["description"],
-                "metadata": {"type": "video", "url": v["url"], "title": v["title"]}
-            })
-        for p in pdfs:
-            # extract some text from PDF
-            pdf_text = self.pdf_agent.extract_text(p["pdf_url"])
-            docs.append({
-                "id": str(uuid.uuid4()),
-                "text": p["title"] + " " + p["summary"] + " " + pdf_text,
-                "metadata": {"type": "pdf", "url": p["pdf_url"], "title": p["title"]}
-            })
-
-        # Store embeddings
-        if docs:
-            self.embedding_agent.add(docs)
-
-        return {"topic": clean_topic, "videos": videos, "pdfs": pdfs}
-
-    def semantic_search(self, query: str):
-        return self.embedding_agent.search(query)
+        """Main orchestration method with fallback handling"""
+        try:
+            # Use the original topic directly without query agent processing
+            clean_topic = topic.strip()
+            print(f"Searching for: {clean_topic}")
+
+            with span("search.pipeline"):
+                if self.concurrent:
+                    return self._run_concurrent(clean_topic)
+                return self._run_sequential(clean_topic)
+
+        except Exception as e:
+            print(f"Orchestrator run error: {e}")
+            return {
+                "topic": topic,
+                "videos": [],
+                "pdfs": [],
+                "error": str(e)
+            }
+
+    def _run_sequential(self, clean_topic: str):
+        """Fetch, extract and embed one source after another"""
+        # Fetch resources using live APIs only
+        videos = []
+        pdfs = []
+        failed = []
+
+        if self.youtube_agent:
+            try:
+                videos = self.youtube_agent.fetch(clean_topic, 10)
+                print(f"Found {len(videos)} YouTube videos")
+            except Exception as e:
+                print(f"YouTube fetch error: {e}")
+                videos = []
+                failed.append("YouTube")
+        else:
+            failed.append("YouTube")
+
+        if self.pdf_agent:
+            try:
+                pdfs = self.pdf_agent.fetch(clean_topic, 10)
+                print(f"Found {len(pdfs)} PDF papers")
+            except Exception as e:
+                print(f"PDF fetch error: {e}")
+                pdfs = []
+                failed.append("PDF")
+        else:
+            failed.append("PDF")
+
+        # Hand resources to the background ingestion worker for extraction and indexing
+        if self.ingestion and (videos or pdfs):
+            self.ingestion.submit_resources(videos, pdfs)
+
+        return self._result(clean_topic, videos, pdfs, failed)
+
+    @staticmethod
+    def _result(clean_topic, videos, pdfs, failed, partial=False):
+        """Search result; failed sources make it partial, or an error when none succeeded.
+
+        The topic cache keeps partial results only until the next request and never stores errors,
+        so an upstream outage is not served from the cache as "no results".
+        """
+        result = {"topic": clean_topic, "videos": videos, "pdfs": pdfs}
+        if len(failed) >= 2:
+            result["error"] = "All sources failed"
+        elif failed or partial:
+            result["partial"] = True
+        return result
+
+    def _run_concurrent(self, clean_topic: str):
+        """Run the concurrent pipeline to completion and return its final result"""
+        result = {"topic": clean_topic, "videos": [], "pdfs": []}
+        for event, data in self._iter_pipeline(clean_topic, extract=False):
+            if event == "done":
+                result = data
+        return result
+
+    def stream(self, topic: str):
+        """Yield (event, data) pairs as videos, papers, PDF excerpts and indexing complete"""
+        clean_topic = topic.strip()
+        self.prefetch.record(topic)
+        cached = self.topic_cache.get(topic, self.run)
+        if cached is None:
+            # Share the upstream fetch with concurrent searches and streams of the same topic
+            future, leader = self.topic_cache.begin(topic)
+            if not leader:
+                try:
+                    cached = future.result()
+                except Exception as e:
+                    yield "error", {"error": str(e)}
+                    return
+        if cached is not None:
+            yield "videos", cached["videos"]
+            yield "pdfs", cached["pdfs"]
+            yield "done", cached
+            return
+
+        result = None
+        try:
+            for event, data in self._iter_pipeline(clean_topic):
+                if event == "done":
+                    result = data
+                yield event, data
+        except Exception as e:
+            print(f"Orchestrator stream error: {e}")
+            result = {"topic": clean_topic, "videos": [], "pdfs": [], "error": str(e)}
+            yield "error", {"error": str(e)}
+        finally:
+            if result is None:
+                # The client went away before the pipeline finished
+                self.topic_cache.finish(topic, future, error=RuntimeError("Search was interrupted"))
+            else:
+                self.topic_cache.finish(topic, future, result)
+
+    def _iter_pipeline(self, clean_topic: str, extract=True):
+        """Fan out source fetches and PDF downloads on the shared pool under one deadline.
+
+        Yields ("videos", list), ("pdfs", list), ("summary", dict) per extracted paper,
+        ("indexed", dict) once the ingestion worker has indexed them, and finally ("done", result).
+        With extract=False papers are handed to the ingestion worker as soon as they are
+        fetched and the pipeline finishes with the upstream searches.
+        """
+        deadline = time.monotonic() + self.deadline
+        completed = queue.Queue()
+        outstanding = set()
+
+        def submit(stage, key, fn, *args):
+            future = self.executor.submit(bind(fn), *args)
+            outstanding.add(future)
+            future.add_done_callback(lambda f: completed.put((stage, key, f)))
+
+        if self.youtube_agent:
+            submit("videos", None, self.youtube_agent.fetch, clean_topic, 10)
+        if self.pdf_agent:
+            submit("pdfs", None, self.pdf_agent.fetch, clean_topic, 10)
+
+        videos = []
+        pdfs = []
+        # A source counts as failed until its fetch returns
+        failed = {"videos", "pdfs"}
+        partial = False
+        labels = {"videos": "YouTube fetch", "pdfs": "PDF fetch", "summary": "PDF extraction"}
+
+        while outstanding:
+            try:
+                stage, key, future = completed.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                print("Search exceeded request deadline, returning partial results")
+                for future in outstanding:
+                    future.cancel()
+                partial = True
+                break
+
+            outstanding.discard(future)
+            try:
+                value = future.result()
+            except Exception as e:
+                print(f"{labels[stage]} error: {e}")
+                value = "" if stage == "summary" else []
+            else:
+                failed.discard(stage)
+
+            if stage == "videos":
+                videos = value
+                print(f"Found {len(videos)} YouTube videos")
+                yield "videos", videos
+            elif stage == "pdfs":
+                pdfs = value
+                print(f"Found {len(pdfs)} PDF papers")
+                yield "pdfs", pdfs
+                # Start PDF downloads as soon as the paper list is known, while YouTube may still be running
+                if self.ingestion and extract:
+                    for index, paper in enumerate(pdfs):
+                        submit("summary", index, self._extract_pdf_text, paper)
+            else:
+                yield "summary", {
+                    "index": key,
+                    "pdf_url": pdfs[key]["pdf_url"],
+                    "excerpt": value[:400] if value and not value.startswith("[") else ""
+                }
+
+        if self.ingestion and (videos or pdfs):
+            # The worker extracts papers with the full index budget; the excerpts above only read the first pages
+            ticket = self.ingestion.submit_resources(videos, pdfs)
+            if extract:
+                # Report indexing if it finishes in time; a slow write keeps running in the background
+                try:
+                    indexed = ticket.future.result(timeout=max(0.0, deadline - time.monotonic()))
+                    yield "indexed", {"documents": len(videos) + len(pdfs), "indexed": indexed}
+                except FutureTimeoutError:
+                    print("Indexing still running in background after request deadline")
+
+        yield "done", self._result(clean_topic, videos, pdfs, failed, partial)
+
+    def stream_summary(self, pdf_url=None, text=None):
+        """Yield ("token", {"text": ...}) pieces of an LLM summary, then ("done", {"summary": ...})"""
+        if not self.pdf_agent:
+            yield "error", {"error": "PDF agent unavailable"}
+            return
+        try:
+            if text is None:
+                text = self._extract_pdf_text({"pdf_url": pdf_url})
+                if not text or text.startswith("["):
+                    yield "error", {"error": "Could not extract text from the PDF"}
+                    return
+            parts = []
+            for piece in self.pdf_agent.stream_summary(text):
+                parts.append(piece)
+                yield "token", {"text": piece}
+            yield "done", {"summary": "".join(parts).strip()}
+        except Exception as e:
+            print(f"Summary stream error: {e}")
+            yield "error", {"error": str(e)}
+
+    def summary_pdf_allowed(self, pdf_url):
+        """Whether a client-supplied PDF URL may be fetched: a known paper host, or a paper this server indexed"""
+        parts = urlsplit(pdf_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return False
+        host = parts.hostname.lower()
+        if any(host == allowed or host.endswith("." + allowed) for allowed in self.summary_pdf_hosts):
+            return True
+        if not self.embedding_agent:
+            return False
+        try:
+            return bool(self.embedding_agent.collection.get(where={"url": pdf_url}, limit=1, include=[])["ids"])
+        except Exception as e:
+            print(f"PDF URL lookup error: {e}")
+            return False
+
+    def _extract_pdf_text(self, paper):
+        """Extract the first pages of a paper's PDF for excerpts and summaries, if possible"""
+        if not hasattr(self.pdf_agent, 'extract_text'):
+            return ""
+        try:
+            return self.pdf_agent.extract_text(paper["pdf_url"], **summary_budget())
+        except:
+            return ""
+
+    def semantic_search(self, query: str, mode=None):
+        """Perform semantic search with fallback"""
+        if self.embedding_agent:
+            try:
+                return self.embedding_agent.search(query, mode=mode)
+            except Exception as e:
+                print(f"Semantic search error: {e}")
+                return {"documents": [[]], "metadatas": [[]]}
+        else:
+            return {"documents": [[]], "metadatas": [[]]}
+
+    def start_migration(self, backend_name: str, model: str):
+        """Re-embed the resources collection with another model in the background"""
+        if not self.embedding_agent:
+            raise RuntimeError("Embedding agent unavailable")
+        if self.migration and self.migration.status()["running"]:
+            raise RuntimeError("A migration is already running")
+        on_switch = None
+        if self.shared_queue is not None:
+            # Only the writer sees every write (to mirror into the new collection) and may write the store
+            ingestion = self.agents.peek("ingestion")
+            if ingestion is None or not ingestion.is_writer:
+                raise RuntimeError(f"Process {os.getpid()} is not the index writer; retry (another worker "
+                                   f"may answer) or run: python manage.py migrate")
+            # Readers reopen the store on the next generation and pick up the new model
+            on_switch = self.shared_queue.bump_generation
+        from embedding_backends import create_backend
+        from embedding_migration import EmbeddingMigration
+
+        backend = create_backend(backend_name, model)
+        self.migration = EmbeddingMigration(self.embedding_agent, backend, on_switch=on_switch).start()
+        return self.migration.status()
+
+    def _get_fallback_videos(self, topic: str):
+        """Fallback video data when YouTube API is unavailable"""
+        return [
+            {
+                "id": "fallback1",
+                "title": f"{topic} - Introduction and Overview",
+                "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                "description": f"A comprehensive introduction to {topic} covering fundamental concepts and practical applications.",
+                "thumbnail": "https://img.youtube.com/vi/dQw4w9WgXcQ/maxresdefault.jpg",
+                "channel": "Educational Channel",
+                "published_at": "2024-01-01T00:00:00Z"
+            },
+            {
+                "id": "fallback2", 
+                "title": f"Advanced {topic} Techniques",
+                "url": "https://www.youtube.com/watch?v=jNQXAC9IVRw",
+                "description": f"Deep dive into advanced {topic} methodologies and best practices.",
+                "thumbnail": "https://img.youtube.com/vi/jNQXAC9IVRw/maxresdefault.jpg",
+                "channel": "Tech Academy",
+                "published_at": "2024-01-02T00:00:00Z"
+            }
+        ]
+
+    def _get_fallback_pdfs(self, topic: str):
+        """Fallback PDF data when arXiv API is unavailable"""
+        return [
+            {
+                "id": "fallback-pdf-1",
+                "title": f"A Comprehensive Survey of {topic}",
+                "pdf_url": "https://arxiv.org/pdf/1706.03762.pdf",
+                "summary": f"This paper provides a comprehensive overview of {topic}, covering theoretical foundations and practical implementations.",
+                "authors": ["Research Team", "Academic Institution"]
+            },
+            {
+                "id": "fallback-pdf-2",
+                "title": f"Recent Advances in {topic}",
+                "pdf_url": "https://arxiv.org/pdf/1512.03385.pdf", 
+                "summary": f"An analysis of recent developments and breakthrough techniques in {topic} research.",
+                "authors": ["Leading Researcher", "University Lab"]
+            }
+        ]
+
+    def _get_fallback_semantic_results(self, query: str):
+        """Fallback semantic search results"""
+        return {
+            "documents": [[
+                f"Semantic search result for '{query}': This is a comprehensive overview of the topic.",
+                f"Related concept to '{query}': Key principles and methodologies explained.",
+                f"Advanced topics in '{query}': Latest research and developments."
+            ]],
+            "metadatas": [[
+                {"url": "https://example.com/resource1", "title": f"{query} - Overview", "type": "article"},
+                {"url": "https://example.com/resource2", "title": f"{query} - Concepts", "type": "tutorial"},
+                {"url": "https://example.com/resource3", "title": f"{query} - Advanced", "type": "research"}
+            ]]
+        }
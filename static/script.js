@@ -30,21 +30,28 @@ async function handleSearchSubmit(e) {
     hideResults();
 
     try {
-        const response = await fetch('/api/search', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ topic: topic })
-        });
+        if (window.ReadableStream && window.TextDecoder) {
+            currentResults = await streamSearch(topic);
+        } else {
+            const response = await fetch('/api/search', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ topic: topic })
+            });
 
-        const data = await response.json();
+            const data = await response.json();
 
-        if (data.error) {
-            showError(data.error);
-        } else {
-            currentResults = data;
-            displayResults(data);
+            if (data.error) {
+                showError(data.error);
+            } else {
+                currentResults = data;
+                displayResults(data);
+                if (data.partial) {
+                    showError(PARTIAL_RESULTS_NOTICE);
+                }
+            }
         }
     } catch (error) {
         showError('Failed to connect to the server. Please try again.');
@@ -54,6 +61,92 @@ async function handleSearchSubmit(e) {
     }
 }
 
+// Stream results from /api/search/stream, rendering each section as soon as it arrives
+async function streamSearch(topic) {
+    const response = await fetch('/api/search/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ topic: topic })
+    });
+
+    if (!response.ok || !response.body) {
+        const data = await response.json();
+        throw new Error(data.error || 'Search failed');
+    }
+
+    const results = { topic: topic, videos: [], pdfs: [] };
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    setQueryTopic(topic);
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = parseStreamEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            handleStreamEvent(message.event, message.data, results);
+        }
+    }
+
+    return results;
+}
+
+// Parse one Server-Sent Events message into { event, data }
+function parseStreamEvent(raw) {
+    let event = 'message';
+    let data = '';
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    });
+    return { event: event, data: data ? JSON.parse(data) : null };
+}
+
+// Shown alongside results when a source failed and only part of the search came back
+const PARTIAL_RESULTS_NOTICE = 'Some sources could not be reached, so these results may be incomplete.';
+
+function handleStreamEvent(event, data, results) {
+    if (event === 'videos') {
+        results.videos = data;
+        renderVideos(data);
+        hideLoading();
+        showResults();
+    } else if (event === 'pdfs') {
+        results.pdfs = data;
+        renderPdfs(data);
+        hideLoading();
+        showResults();
+    } else if (event === 'summary') {
+        const excerpt = document.querySelector(`[data-pdf-index="${data.index}"] .card-excerpt`);
+        if (excerpt && data.excerpt) {
+            excerpt.textContent = data.excerpt;
+        }
+    } else if (event === 'indexed') {
+        console.log(`Indexed ${data.indexed} of ${data.documents} documents`);
+    } else if (event === 'done') {
+        Object.assign(results, data);
+        if (data.error) {
+            hideResults();
+            showError(data.error);
+        } else if (data.partial) {
+            showError(PARTIAL_RESULTS_NOTICE);
+        }
+    } else if (event === 'error') {
+        showError(data.error);
+    }
+}
+
 // Alternative search handler (for your custom implementation)
 function handleSearch() {
     const query = document.getElementById('searchInput')?.value || document.getElementById('topic')?.value;
@@ -93,15 +186,23 @@ if (searchInput) {
 
 // Display search results
 function displayResults(data) {
+    setQueryTopic(data.topic);
+    renderVideos(data.videos);
+    renderPdfs(data.pdfs);
+    showResults();
+}
+
+function setQueryTopic(topic) {
     const queryTopicElement = document.getElementById('queryTopic');
     if (queryTopicElement) {
-        queryTopicElement.textContent = data.topic;
+        queryTopicElement.textContent = topic;
     }
+}
 
-    // Display videos
+function renderVideos(videos) {
     if (videosGrid) {
-        if (data.videos && data.videos.length > 0) {
-            videosGrid.innerHTML = data.videos.map(video => `
+        if (videos && videos.length > 0) {
+            videosGrid.innerHTML = videos.map(video => `
                 <div class="result-card">
                     <div class="card-header video-header">
                         <div class="video-thumb">▶</div>
@@ -121,12 +222,13 @@ function displayResults(data) {
             videosGrid.innerHTML = '<p class="no-results">No videos found.</p>';
         }
     }
+}
 
-    // Display PDFs
+function renderPdfs(pdfs) {
     if (pdfsGrid) {
-        if (data.pdfs && data.pdfs.length > 0) {
-            pdfsGrid.innerHTML = data.pdfs.map(pdf => `
-                <div class="result-card">
+        if (pdfs && pdfs.length > 0) {
+            pdfsGrid.innerHTML = pdfs.map((pdf, index) => `
+                <div class="result-card" data-pdf-index="${index}">
                     <div class="card-header paper-header">
                         <div class="paper-icon">📄</div>
                         <span class="card-badge">Paper</span>
@@ -134,6 +236,7 @@ function displayResults(data) {
                     <div class="card-body">
                         <h4 class="card-title">${pdf.title}</h4>
                         <p class="card-desc">${pdf.summary || 'Foundational text on key concepts and algorithms.'}</p>
+                        <p class="card-excerpt"></p>
                         <div class="card-meta">
                             <span class="meta-item">Authors: ${pdf.authors ? pdf.authors.slice(0,2).join(', ') : 'Christopher Bishop'}</span>
                             ${pdf.year ? `<span class="meta-item">${pdf.year}</span>` : ''}
@@ -147,8 +250,6 @@ function displayResults(data) {
             pdfsGrid.innerHTML = '<p class="no-results">No research papers found.</p>';
         }
     }
-
-    showResults();
 }
 
 // UI helper functions
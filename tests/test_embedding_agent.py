@@ -0,0 +1,60 @@
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'agents'))
+
+from chunker import chunk_document
+from embedding_cache import EmbeddingCache
+from ingestion import paper_doc
+
+
+class FakeBackend:
+    """Deterministic 8-dimensional embeddings, so no model server is needed"""
+
+    name = "fake"
+    model_name = "fake"
+    key = "fake:fake"
+
+    def embed(self, texts):
+        return [np.frombuffer(hashlib.sha256(text.encode()).digest()[:8], dtype=np.uint8).astype(np.float32) + 1
+                for text in texts]
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setenv("VECTOR_INDEX", "0")
+    monkeypatch.setenv("LEXICAL_INDEX_PATH", str(tmp_path / "lexical"))
+    from embedding_agent import EmbeddingAgent
+    return EmbeddingAgent(persist_directory=str(tmp_path / "chroma"), cache=EmbeddingCache(""),
+                          backend=FakeBackend())
+
+
+PAPER = {"title": "Attention Is All You Need", "summary": "Transformers.", "pdf_url": "https://arxiv.org/pdf/1706.03762",
+         "arxiv_id": "1706.03762"}
+
+
+def chunk_ids(agent, doc):
+    return sorted(agent.rows_for_parents([doc["id"]])["ids"])
+
+
+def test_failed_extraction_keeps_indexed_chunks(agent):
+    full_text = " ".join(f"Sentence {i} about attention layers." for i in range(300))
+    doc = paper_doc(PAPER, full_text)
+    chunks = chunk_document(doc, chunk_tokens=64, overlap=8)
+    assert len(chunks) > 1
+    agent.add(chunks)
+    before = chunk_ids(agent, doc)
+
+    # The PDF could not be read this time: the paper comes back with no text
+    assert agent.add(chunk_document(paper_doc(PAPER, ""), chunk_tokens=64, overlap=8)) == 0
+    assert chunk_ids(agent, doc) == before
+
+
+def test_missing_text_indexes_new_paper(agent):
+    doc = paper_doc(PAPER, "")
+    assert agent.add(chunk_document(doc)) == 1
+    assert chunk_ids(agent, doc) == [doc["id"] + "#0"]
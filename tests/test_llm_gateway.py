@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'agents'))
+
+from llm_cache import LLMCache
+from llm_gateway import LLMGateway
+
+
+class FakeClient:
+    """Ollama chat stand-in that answers numbered batch prompts line by line"""
+
+    def __init__(self, skip=()):
+        self.prompts = []
+        self.skip = set(skip)
+        self.lock = threading.Lock()
+
+    def chat(self, model, messages, options=None, stream=False):
+        prompt = messages[-1]["content"]
+        with self.lock:
+            self.prompts.append(prompt)
+        sections = re.findall(r"^\[(\d+)\]\n(.*)$", prompt, re.M)
+        if sections:
+            content = "\n".join(f"[{n}] summary of {text}" for n, text in sections if n not in self.skip)
+        else:
+            content = "single summary of " + prompt.rsplit("\n", 1)[-1]
+        return {"message": {"content": content}, "eval_count": 1}
+
+
+def gateway(client, batch_size):
+    return LLMGateway(cache=LLMCache(""), client=client, batch_size=batch_size, batch_wait=0.05)
+
+
+def test_summarize_many_shares_one_prompt():
+    client = FakeClient()
+    llm = gateway(client, batch_size=4)
+
+    summaries = llm.summarize_many(["alpha", "beta", "gamma", "delta"], "m")
+
+    assert summaries == [f"summary of {t}" for t in ("alpha", "beta", "gamma", "delta")]
+    assert len(client.prompts) == 1
+    assert llm.stats()["batches"] == 1
+    # Answers are cached per text, so a later single summary makes no call
+    assert llm.summarize("beta", "m") == "summary of beta"
+    assert len(client.prompts) == 1
+
+
+def test_concurrent_summaries_are_batched():
+    client = FakeClient()
+    llm = gateway(client, batch_size=3)
+    results = {}
+
+    def run(text):
+        results[text] = llm.summarize(text, "m")
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in ("one", "two", "three")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {t: f"summary of {t}" for t in ("one", "two", "three")}
+    assert len(client.prompts) == 1
+
+
+def test_unparsed_answers_fall_back_to_single_calls():
+    client = FakeClient(skip={"2"})
+    llm = gateway(client, batch_size=2)
+
+    summaries = llm.summarize_many(["first", "second"], "m")
+
+    assert summaries[0] == "summary of first"
+    assert summaries[1].startswith("single summary")
+    assert len(client.prompts) == 2
+    assert llm.stats()["batch_fallbacks"] == 1
+
+
+def test_batch_size_one_sends_each_text_alone():
+    client = FakeClient()
+    llm = gateway(client, batch_size=1)
+
+    assert len(llm.summarize_many(["a", "b"], "m")) == 2
+    assert len(client.prompts) == 2
+    assert llm.stats()["batches"] == 0